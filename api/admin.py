@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MoneyTrade, BarterTrade, TradeHistory, TradeReport
+from .models import MoneyTrade, BarterTrade, TradeHistory, TradeReport, ModerationAudit
 from django.utils import timezone
 
 def admin_action(description):
@@ -11,6 +11,7 @@ def admin_action(description):
 @admin.register(MoneyTrade)
 class MoneyTradeAdmin(admin.ModelAdmin):
     list_display = ('pokemon', 'owner', 'amount_asked', 'status', 'is_flagged', 'created_at')
+    list_select_related = ('pokemon__user',)
     list_filter = ('status', 'is_flagged', 'created_at')
     search_fields = ('pokemon__name', 'pokemon__user__username')
     readonly_fields = ('created_at', 'updated_at')
@@ -31,6 +32,7 @@ class MoneyTradeAdmin(admin.ModelAdmin):
 @admin.register(BarterTrade)
 class BarterTradeAdmin(admin.ModelAdmin):
     list_display = ('pokemon', 'owner', 'status', 'is_flagged', 'created_at')
+    list_select_related = ('pokemon__user',)
     list_filter = ('status', 'is_flagged', 'created_at')
     search_fields = ('pokemon__name', 'pokemon__user__username', 'trade_preferences')
     readonly_fields = ('created_at', 'updated_at')
@@ -51,6 +53,7 @@ class BarterTradeAdmin(admin.ModelAdmin):
 @admin.register(TradeHistory)
 class TradeHistoryAdmin(admin.ModelAdmin):
     list_display = ('pokemon', 'buyer', 'seller', 'amount', 'timestamp', 'is_flagged')
+    list_select_related = ('pokemon', 'buyer', 'seller')
     list_filter = ('timestamp', 'is_flagged')
     search_fields = ('pokemon__name', 'buyer__username', 'seller__username')
     readonly_fields = ('timestamp',)
@@ -67,6 +70,7 @@ class TradeHistoryAdmin(admin.ModelAdmin):
 @admin.register(TradeReport)
 class TradeReportAdmin(admin.ModelAdmin):
     list_display = ('get_trade_info', 'reporter', 'status', 'created_at', 'resolved_at')
+    list_select_related = ('reporter', 'money_trade__pokemon', 'barter_trade__pokemon')
     list_filter = ('status', 'created_at')
     search_fields = ('reporter__username', 'reason', 'admin_notes')
     readonly_fields = ('created_at',)
@@ -87,3 +91,11 @@ class TradeReportAdmin(admin.ModelAdmin):
     @admin_action("Mark selected reports as dismissed")
     def mark_dismissed(self, request, queryset):
         queryset.update(status='dismissed', resolved_by=request.user, resolved_at=timezone.now())
+
+@admin.register(ModerationAudit)
+class ModerationAuditAdmin(admin.ModelAdmin):
+    list_display = ('action', 'moderator', 'money_trades_updated', 'barter_trades_updated', 'reports_updated', 'created_at')
+    list_select_related = ('moderator',)
+    list_filter = ('action', 'created_at')
+    search_fields = ('moderator__username', 'reason', 'admin_notes')
+    readonly_fields = ('created_at',)
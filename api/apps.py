@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from pokemon.db import apply_sqlite_pragmas
+
+        from .cache import invalidate_saved_profile, invalidate_saved_user
+        from .models import Profile
+        from .sharding import mirror_saved_user
+
+        connection_created.connect(apply_sqlite_pragmas)
+        post_save.connect(mirror_saved_user, sender=User)
+        for signal in (post_save, post_delete):
+            signal.connect(invalidate_saved_user, sender=User)
+            signal.connect(invalidate_saved_profile, sender=Profile)
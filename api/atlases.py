@@ -0,0 +1,128 @@
+"""
+Sprite sheets for collections, so a profile page loads one image per
+ATLAS_MAX_TILES species instead of one per Pokemon.
+
+A sheet is named after a hash of the species on it and their source
+images, so its URL changes with any tile. Profile views only look for
+sheets already on disk and never write or fetch anything: species without
+one are left out of "tiles", and clients show their per-species
+thumbnails instead. The render_atlases command renders the missing sheets
+from the per-species thumbnails. When a collection changes, only
+thumbnails for new species are fetched.
+"""
+
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.urls import reverse
+from PIL import Image
+
+from .thumbnails import (
+    DEFAULT_THUMBNAIL_SIZE,
+    ensure_thumbnail,
+    species_source_urls,
+    thumbnail_root,
+    write_atomic,
+)
+
+ATLAS_TILE_SIZE = DEFAULT_THUMBNAIL_SIZE
+ATLAS_COLUMNS = 16
+ATLAS_MAX_TILES = ATLAS_COLUMNS * 16
+ATLAS_VERSION = re.compile(r"[0-9a-f]{16}")
+# Tiles fetched and rendered in parallel per sheet
+ATLAS_WORKERS = 8
+
+
+def atlas_root():
+    return thumbnail_root() / "atlases"
+
+
+def atlas_version(tiles: list[list]) -> str:
+    """
+    Hash of the tile size and each tile's [pokeapi_id, source URL]. A tile
+    is named after the digest of its source's bytes, and each source URL is
+    downloaded once, so the source URLs pin every tile's digest.
+    """
+    key = json.dumps([ATLAS_TILE_SIZE, tiles])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _pages(species_ids) -> list[tuple[str, list[list]]]:
+    """(version, [[pokeapi_id, source URL], ...]) for each sheet of species."""
+    species_ids = sorted(set(species_ids))
+    sources = species_source_urls(species_ids)
+    pages = []
+    for start in range(0, len(species_ids), ATLAS_MAX_TILES):
+        page = [
+            [pokeapi_id, sources[pokeapi_id]]
+            for pokeapi_id in species_ids[start : start + ATLAS_MAX_TILES]
+        ]
+        pages.append((atlas_version(page), page))
+    return pages
+
+
+def atlas_path(version: str):
+    return atlas_root() / f"{version}.webp"
+
+
+def collection_atlas(species_ids) -> dict:
+    """
+    Rendered sheet URLs for a set of species and each species' tile on
+    them, as {"tile_size", "sheets": [url], "tiles": {pokeapi_id: [sheet,
+    x, y]}}. Species whose sheet is not rendered yet have no tile.
+    """
+    sheets = []
+    tiles = {}
+    for version, page in _pages(species_ids):
+        if not atlas_path(version).exists():
+            continue
+        for i, (pokeapi_id, _) in enumerate(page):
+            tiles[pokeapi_id] = [
+                len(sheets),
+                i % ATLAS_COLUMNS * ATLAS_TILE_SIZE,
+                i // ATLAS_COLUMNS * ATLAS_TILE_SIZE,
+            ]
+        sheets.append(reverse("atlas", kwargs={"version": version}))
+    return {"tile_size": ATLAS_TILE_SIZE, "sheets": sheets, "tiles": tiles}
+
+
+def render_atlases(species_ids) -> int:
+    """
+    Renders the sheets of a set of species that are not on disk yet,
+    fetching missing thumbnails. Returns the number rendered.
+    """
+    rendered = 0
+    for version, page in _pages(species_ids):
+        if not atlas_path(version).exists():
+            write_atomic(atlas_path(version), _render_sheet(page))
+            rendered += 1
+    return rendered
+
+
+def _render_sheet(page) -> bytes:
+    def tile(entry):
+        # From the source the version was computed from. Lossless tiles, so
+        # the sheet is only compressed once.
+        _, source_url = entry
+        name = ensure_thumbnail(source_url, ATLAS_TILE_SIZE, "png")
+        return Image.open(thumbnail_root() / name)
+
+    with ThreadPoolExecutor(max_workers=ATLAS_WORKERS) as pool:
+        images = list(pool.map(tile, page))
+
+    rows = -(-len(page) // ATLAS_COLUMNS)
+    columns = min(len(page), ATLAS_COLUMNS)
+    sheet = Image.new(
+        "RGBA", (columns * ATLAS_TILE_SIZE, rows * ATLAS_TILE_SIZE), (0, 0, 0, 0)
+    )
+    for i, image in enumerate(images):
+        # Thumbnails keep their aspect ratio; centre them in the tile
+        x = i % ATLAS_COLUMNS * ATLAS_TILE_SIZE + (ATLAS_TILE_SIZE - image.width) // 2
+        y = i // ATLAS_COLUMNS * ATLAS_TILE_SIZE + (ATLAS_TILE_SIZE - image.height) // 2
+        sheet.paste(image, (x, y))
+    out = BytesIO()
+    sheet.save(out, "WEBP", quality=80, method=4)
+    return out.getvalue()
@@ -0,0 +1,187 @@
+"""
+Timed auctions.
+
+Bids are AuctionBid rows, and the Auction row carries the leading bid, so
+placing a bid locks and reads one row however many bids came before. The
+leader's bid is held from Profile.money and handed back when they are
+outbid, so the winner has already paid when the auction closes.
+
+The top bids shown on an auction are read down the (auction, -amount, id)
+index on AuctionBid, so showing them reads only those rows however long
+its history is.
+
+close_expired_auctions settles ended auctions in batches through
+sales.settle_sale, the same path fixed-price sales take.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import record_event
+from .factories import notification_factory
+from .models import Auction, AuctionBid, BarterTrade, MoneyTrade, Notification
+from .sales import hold_funds, release_funds, settle_sale
+
+MIN_DURATION = timedelta(hours=1)
+MAX_DURATION = timedelta(days=7)
+MIN_BID_INCREMENT = 1
+TOP_BIDS_SHOWN = 10
+
+
+class AuctionError(ValueError):
+    """The auction or bid is not valid."""
+
+
+def top_bids(auction, n=TOP_BIDS_SHOWN) -> list[dict]:
+    """The auction's `n` highest bids; earlier bids win ties."""
+    return [
+        {"amount": amount, "bidder": bidder, "created_at": created_at}
+        for amount, bidder, created_at in AuctionBid.objects.filter(auction=auction)
+        .order_by("-amount", "id")
+        .values_list("amount", "bidder__username", "created_at")[:n]
+    ]
+
+
+def create_auction(pokemon, data: dict) -> Auction:
+    """Validates {starting_price, duration_hours} and opens an auction."""
+    starting_price = data.get("starting_price")
+    duration_hours = data.get("duration_hours")
+    if not isinstance(starting_price, int) or starting_price <= 0:
+        raise AuctionError("starting_price must be a positive integer")
+    if not isinstance(duration_hours, int | float) or not (
+        MIN_DURATION <= timedelta(hours=duration_hours) <= MAX_DURATION
+    ):
+        raise AuctionError(
+            f"duration_hours must be between {MIN_DURATION // timedelta(hours=1)} "
+            f"and {MAX_DURATION // timedelta(hours=1)}"
+        )
+    if (
+        MoneyTrade.objects.filter(pokemon=pokemon, status="active").exists()
+        or BarterTrade.objects.filter(pokemon=pokemon, status="active").exists()
+        or Auction.objects.filter(pokemon=pokemon, status="active").exists()
+    ):
+        raise AuctionError("Pokemon is already listed in an active trade")
+
+    with transaction.atomic():
+        auction = Auction.objects.create(
+            pokemon=pokemon,
+            seller_id=pokemon.user_id,
+            starting_price=starting_price,
+            ends_at=timezone.now() + timedelta(hours=duration_hours),
+        )
+        record_event(
+            "ListingCreated",
+            [pokemon.user_id],
+            pokemon_id=pokemon.id,
+            trade_type="auction",
+            trade_id=auction.id,
+        )
+    return auction
+
+
+def place_bid(auction_id, bidder, amount) -> AuctionBid:
+    """
+    Bids `amount` on an auction, holding it from the bidder's balance and
+    giving the previous leader's bid back. Raises Auction.DoesNotExist for
+    an unknown auction and AuctionError for a bid that is not accepted.
+    """
+    if not isinstance(amount, int) or amount <= 0:
+        raise AuctionError("amount must be a positive integer")
+
+    with transaction.atomic():
+        auction = (
+            Auction.objects.select_for_update()
+            .select_related("pokemon")
+            .get(id=auction_id)
+        )
+        if auction.status != "active" or auction.ends_at <= timezone.now():
+            raise AuctionError("This auction has ended")
+        if auction.pokemon.user_id != auction.seller_id:
+            raise AuctionError("This auction has been withdrawn")
+        if auction.seller_id == bidder.id:
+            raise AuctionError("You cannot bid on your own auction")
+        minimum = (
+            auction.starting_price
+            if auction.leader_id is None
+            else auction.current_bid + MIN_BID_INCREMENT
+        )
+        if amount < minimum:
+            raise AuctionError(f"Bids must be at least ${minimum}")
+
+        # A leader raising their own bid only needs the difference
+        already_held = auction.current_bid if auction.leader_id == bidder.id else 0
+        if not hold_funds(bidder.id, amount - already_held):
+            raise AuctionError("You don't have enough money for this bid")
+        if auction.leader_id not in (None, bidder.id):
+            release_funds(auction.leader_id, auction.current_bid)
+            Notification.objects.create(
+                user_id=auction.leader_id,
+                message=(
+                    f"You were outbid on {auction.pokemon.name}; your "
+                    f"${auction.current_bid} is back in your balance."
+                ),
+                link=f"/auctions/{auction.id}",
+            )
+
+        bid = AuctionBid.objects.create(auction=auction, bidder=bidder, amount=amount)
+        Auction.objects.filter(id=auction.id).update(
+            current_bid=amount, leader=bidder, bid_count=F("bid_count") + 1
+        )
+    return bid
+
+
+def _close(auction, notifications):
+    """Settles one ended auction (locked, with pokemon, seller and leader loaded)."""
+    pokemon = auction.pokemon
+    if auction.leader_id is None:
+        auction.status = "unsold"
+        notifications.append(
+            notification_factory.create_notification(
+                user=auction.seller,
+                message=f"Your auction of {pokemon.name} ended without bids.",
+                link=f"/pokemon/{pokemon.id}",
+            )
+        )
+    elif pokemon.user_id != auction.seller_id:
+        # Traded away while the auction ran
+        auction.status = "cancelled"
+        release_funds(auction.leader_id, auction.current_bid)
+        notifications.append(
+            notification_factory.create_notification(
+                user=auction.leader,
+                message=(
+                    f"The auction of {pokemon.name} was withdrawn; your "
+                    f"${auction.current_bid} is back in your balance."
+                ),
+            )
+        )
+    else:
+        auction.status = "sold"
+        settle_sale(pokemon, auction.leader, auction.current_bid, "auction", auction.id)
+
+
+def close_expired_auctions(batch_size=100) -> int:
+    """
+    Closes auctions whose time is up, `batch_size` per transaction, selling
+    each to its leader. Returns the number closed.
+    """
+    closed = 0
+    while True:
+        with transaction.atomic():
+            auctions = list(
+                Auction.objects.select_for_update()
+                .filter(status="active", ends_at__lte=timezone.now())
+                .select_related("pokemon__user", "seller", "leader")
+                .order_by("ends_at")[:batch_size]
+            )
+            if not auctions:
+                return closed
+            notifications = []
+            for auction in auctions:
+                _close(auction, notifications)
+            Auction.objects.bulk_update(auctions, ["status"])
+            Notification.objects.bulk_create(notifications)
+        closed += len(auctions)
@@ -0,0 +1,21 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .cache import USER_TIMEOUT, user_key
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user lookup is served from the cache.
+    Entries are dropped whenever the user is saved or deleted (see
+    ApiConfig.ready), so password changes still end other sessions.
+    """
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_TIMEOUT)
+        return user
@@ -0,0 +1,267 @@
+"""
+Barter matching.
+
+A listing's free-text trade_preferences are parsed into wanted keys
+("type:fire", "species:pikachu") and its Pokemon gives the keys it offers.
+Both go into BarterIndexEntry, an inverted index from key to listings, so
+matches for a new listing are found by looking its own keys up rather than
+by scanning every listing.
+
+index_barter_listings runs when listings are created and records
+BarterProposals for direct swaps and for 3- and 4-way cycles, where each
+owner hands their Pokemon to the next and receives one they asked for.
+The search follows at most MAX_CANDIDATES listings per hop and
+MAX_BRANCHING from each listing, so its cost does not grow with the
+number of listings.
+"""
+
+import re
+from collections import defaultdict
+
+from .models import (
+    BarterIndexEntry,
+    BarterProposal,
+    BarterProposalLeg,
+    Pokemon,
+)
+
+POKEMON_TYPES = frozenset(
+    {
+        "normal",
+        "fire",
+        "water",
+        "grass",
+        "electric",
+        "ice",
+        "fighting",
+        "poison",
+        "ground",
+        "flying",
+        "psychic",
+        "bug",
+        "rock",
+        "ghost",
+        "dragon",
+        "dark",
+        "steel",
+        "fairy",
+    }
+)
+# Species names are lowercase and may contain hyphens ("mr-mime")
+PREFERENCE_WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+# Species words indexed per listing, so a long description stays cheap
+MAX_WANTED_SPECIES = 20
+MAX_CYCLE_LENGTH = 4
+# Listings fetched per hop of the search, newest first
+MAX_CANDIDATES = 200
+# Listings followed from each listing while searching
+MAX_BRANCHING = 20
+# Proposals recorded for one new listing
+MAX_PROPOSALS = 10
+
+
+def offered_keys(pokemon: Pokemon) -> set[str]:
+    return {f"species:{pokemon.name.lower()}"} | {
+        f"type:{pokemon_type}" for pokemon_type in pokemon.types
+    }
+
+
+def wanted_keys(trade_preferences: str) -> set[str]:
+    """
+    Type names become type keys and every other word a species key. Words
+    that name no species are kept too; nothing offers them, so they never
+    match.
+    """
+    words = {
+        word.removesuffix("-type")
+        for word in PREFERENCE_WORD.findall(trade_preferences.lower())
+    }
+    return {f"type:{word}" for word in words & POKEMON_TYPES} | {
+        f"species:{word}" for word in sorted(words - POKEMON_TYPES)[:MAX_WANTED_SPECIES]
+    }
+
+
+class _Graph:
+    """The slice of the index a search has loaded, with edges computed in memory."""
+
+    def __init__(self):
+        self.owners = {}
+        self.offers = defaultdict(set)
+        self.wants = defaultdict(set)
+        self.wanted_by = defaultdict(set)
+
+    def add(self, listing_id, owner_id, role, key):
+        self.owners[listing_id] = owner_id
+        if role == "offer":
+            self.offers[listing_id].add(key)
+        else:
+            self.wants[listing_id].add(key)
+            self.wanted_by[key].add(listing_id)
+
+    def load(self, listing_ids):
+        missing = set(listing_ids) - set(self.owners)
+        if missing:
+            for entry in BarterIndexEntry.objects.filter(
+                listing_id__in=missing
+            ).values_list("listing_id", "owner_id", "role", "key"):
+                self.add(*entry)
+
+    def gives_to(self, giver, receiver) -> bool:
+        """Whether `receiver`'s owner asked for what `giver` offers."""
+        return not self.offers[giver].isdisjoint(self.wants[receiver])
+
+    def successors(self, listing_id) -> list[int]:
+        """Loaded listings whose owners asked for this one's Pokemon, newest first."""
+        found = set()
+        for key in self.offers[listing_id]:
+            found |= self.wanted_by[key]
+        return sorted(found, reverse=True)[:MAX_BRANCHING]
+
+
+def _matching(role, keys, exclude) -> list[int]:
+    """Active listings with an index entry of `role` for any of `keys`."""
+    if not keys:
+        return []
+    return list(
+        BarterIndexEntry.objects.filter(
+            role=role, key__in=keys, listing__status="active"
+        )
+        .exclude(listing_id__in=exclude)
+        .order_by("-listing_id")
+        .values_list("listing_id", flat=True)
+        .distinct()[:MAX_CANDIDATES]
+    )
+
+
+def _cycles(graph, start) -> list[list[int]]:
+    """
+    Cycles through `start`, shortest first. Listing i's Pokemon goes to the
+    owner of listing i + 1, and the last one's to the owner of `start`.
+    """
+    found = []
+
+    def extend(path, owners, length):
+        last = path[-1]
+        if len(path) == length:
+            if graph.gives_to(last, start):
+                found.append(list(path))
+            return
+        for listing_id in graph.successors(last):
+            if len(found) >= MAX_PROPOSALS:
+                return
+            owner_id = graph.owners[listing_id]
+            if owner_id not in owners:
+                path.append(listing_id)
+                owners.add(owner_id)
+                extend(path, owners, length)
+                path.pop()
+                owners.discard(owner_id)
+
+    for length in range(2, MAX_CYCLE_LENGTH + 1):
+        extend([start], {graph.owners[start]}, length)
+    return found[:MAX_PROPOSALS]
+
+
+def _cycle_key(cycle) -> str:
+    smallest = cycle.index(min(cycle))
+    return ",".join(map(str, cycle[smallest:] + cycle[:smallest]))
+
+
+def index_barter_listings(listings) -> list[BarterProposal]:
+    """
+    Indexes new active listings (with their Pokemon loaded) and records the
+    swaps and cycles they complete. Returns the new proposals. Call inside
+    the transaction that creates the listings.
+    """
+    listings = [listing for listing in listings if listing.status == "active"]
+    if not listings:
+        return []
+
+    graph = _Graph()
+    entries = []
+    for listing in listings:
+        owner_id = listing.pokemon.user_id
+        for role, keys in (
+            ("offer", offered_keys(listing.pokemon)),
+            ("want", wanted_keys(listing.trade_preferences)),
+        ):
+            for key in keys:
+                entries.append(
+                    BarterIndexEntry(
+                        listing=listing, owner_id=owner_id, role=role, key=key
+                    )
+                )
+                graph.add(listing.id, owner_id, role, key)
+
+    BarterIndexEntry.objects.bulk_create(entries)
+
+    # A cycle through a new listing runs new -> first hop -> ... -> a
+    # listing offering what the new one wants. Load the first two hops
+    # forward and the last one backward.
+    new_ids = [listing.id for listing in listings]
+    first_hop = _matching(
+        "want", set().union(*(graph.offers[i] for i in new_ids)), new_ids
+    )
+    last_hop = _matching(
+        "offer", set().union(*(graph.wants[i] for i in new_ids)), new_ids
+    )
+    graph.load(first_hop + last_hop)
+    second_hop = _matching(
+        "want", set().union(*(graph.offers[i] for i in first_hop)), new_ids
+    )
+    graph.load(second_hop)
+
+    cycles = {}
+    for listing_id in new_ids:
+        for cycle in _cycles(graph, listing_id):
+            cycles.setdefault(_cycle_key(cycle), cycle)
+    if not cycles:
+        return []
+
+    existing = set(
+        BarterProposal.objects.filter(cycle_key__in=cycles).values_list(
+            "cycle_key", flat=True
+        )
+    )
+    proposals = BarterProposal.objects.bulk_create(
+        [
+            BarterProposal(cycle_key=key, size=len(cycle))
+            for key, cycle in cycles.items()
+            if key not in existing
+        ]
+    )
+    BarterProposalLeg.objects.bulk_create(
+        [
+            BarterProposalLeg(proposal=proposal, listing_id=listing_id, position=i)
+            for proposal in proposals
+            for i, listing_id in enumerate(cycles[proposal.cycle_key])
+        ]
+    )
+    return proposals
+
+
+def proposals_for_user(user, limit=50) -> list[tuple[BarterProposal, list]]:
+    """
+    Open proposals involving the user's listings, newest first, each with its
+    legs in order. Proposals with a leg no longer active are left out.
+    """
+    proposal_ids = list(
+        BarterProposal.objects.filter(legs__listing__pokemon__user=user)
+        .order_by("-created_at", "-id")
+        .values_list("id", flat=True)
+        .distinct()[:limit]
+    )
+    legs = defaultdict(list)
+    proposals = {}
+    for leg in BarterProposalLeg.objects.filter(
+        proposal_id__in=proposal_ids
+    ).select_related("proposal", "listing__pokemon__user"):
+        proposals[leg.proposal_id] = leg.proposal
+        legs[leg.proposal_id].append(leg)
+    return [
+        (proposals[proposal_id], legs[proposal_id])
+        for proposal_id in proposal_ids
+        if proposal_id in proposals
+        and len(legs[proposal_id]) == proposals[proposal_id].size
+        and all(leg.listing.status == "active" for leg in legs[proposal_id])
+    ]
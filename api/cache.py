@@ -0,0 +1,102 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .factories import format_user_data
+from .models import User
+
+VALUATION_TIMEOUT = 60 * 60
+PROFILE_PAGE_TIMEOUT = 10 * 60
+# Users and their snapshots are dropped on every save, so this only bounds
+# how long an idle user's entries take up space
+USER_TIMEOUT = 15 * 60
+
+
+def valuation_key(user_id: int) -> str:
+    return f"valuation:{user_id}"
+
+
+def invalidate_valuations(*user_ids: int):
+    """Drops cached collection values so they are recomputed on next read."""
+    cache.delete_many([valuation_key(user_id) for user_id in user_ids])
+
+
+def species_price_version_key(pokeapi_id: int) -> str:
+    return f"species_price_version:{pokeapi_id}"
+
+
+def bump_species_price_version(pokeapi_id: int):
+    """
+    Marks every cached valuation holding this species as stale, however
+    many users own it. The version is the time of the change, so a
+    valuation is current if it was started after every species' version.
+    """
+    cache.set(species_price_version_key(pokeapi_id), time.time(), None)
+
+
+def profile_page_key(username: str) -> str:
+    return f"profile_page:{username}"
+
+
+def invalidate_profile_pages(*user_ids: int):
+    """
+    Drops rendered profile pages once the current transaction commits, so
+    a page re-rendered in the meantime cannot keep the old state.
+    """
+
+    def drop():
+        usernames = User.objects.filter(id__in=user_ids).values_list(
+            "username", flat=True
+        )
+        cache.delete_many([profile_page_key(username) for username in usernames])
+
+    transaction.on_commit(drop)
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def user_snapshot_key(user_id) -> str:
+    return f"user_snapshot:{user_id}"
+
+
+def user_snapshot(user) -> dict:
+    """Cached format_user_data: id, username and money."""
+    key = user_snapshot_key(user.id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = format_user_data(user)
+        cache.set(key, snapshot, USER_TIMEOUT)
+    return snapshot
+
+
+def _delete_now_and_on_commit(keys):
+    """
+    Deletes now and again on commit, so a read made before the writing
+    transaction commits is not kept.
+    """
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user(user_id):
+    """Drops a user's cached row and snapshot."""
+    _delete_now_and_on_commit([user_key(user_id), user_snapshot_key(user_id)])
+
+
+def invalidate_balances(*user_ids):
+    """For Profile.money changed by update(), which sends no post_save."""
+    _delete_now_and_on_commit([user_snapshot_key(user_id) for user_id in user_ids])
+    invalidate_profile_pages(*user_ids)
+
+
+def invalidate_saved_user(sender, instance, **kwargs):
+    invalidate_user(instance.id)
+
+
+def invalidate_saved_profile(sender, instance, **kwargs):
+    # The cached User row does not include the profile
+    _delete_now_and_on_commit([user_snapshot_key(instance.user_id)])
+    invalidate_profile_pages(instance.user_id)
@@ -0,0 +1,134 @@
+"""
+Transactional outbox of domain events.
+
+Views record a DomainEvent (ListingCreated, PokemonSold, TradeAccepted, ...)
+in the same transaction as the change it describes, so an event exists if
+and only if the change committed. dispatch_events, run by the
+dispatch_events command, delivers new events in id order to every
+registered handler.
+
+Each handler has its own Checkpoint ("outbox:<name>"), advanced in the
+transaction that runs the handler on a batch. A handler that raises keeps
+its cursor and sees the same batch again on the next run, so delivery is
+at least once and handlers must be idempotent. SQLite has a single
+writer, so ids become visible in commit order and a cursor never skips an
+event committed late.
+"""
+
+import logging
+
+from django.db import router, transaction
+
+from .cache import invalidate_profile_pages
+from .fraud import detect_fraud
+from .models import Checkpoint, DomainEvent
+from .rollups import refresh_trade_rollups
+from .sharding import on_shard, shard_aliases
+
+logger = logging.getLogger("api.events")
+
+EVENT_TYPES = frozenset(event_type for event_type, _ in DomainEvent.EVENT_TYPES)
+# Handler name -> (event types it receives, or None for all, function)
+HANDLERS = {}
+
+
+def handles(name, *event_types):
+    """Registers a function taking a list of events as the handler `name`."""
+    unknown = set(event_types) - EVENT_TYPES
+    if unknown:
+        raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+
+    def register(handler):
+        HANDLERS[name] = (frozenset(event_types) or None, handler)
+        return handler
+
+    return register
+
+
+def record_events(event_type, payloads) -> list[DomainEvent]:
+    """
+    Appends one event per payload. Each payload must name the users the
+    change touched under "user_ids". Call inside the transaction making
+    the change.
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type: {event_type}")
+    if not transaction.get_connection(router.db_for_write(DomainEvent)).in_atomic_block:
+        raise RuntimeError("Domain events must be recorded inside transaction.atomic")
+    return DomainEvent.objects.bulk_create(
+        [DomainEvent(event_type=event_type, payload=payload) for payload in payloads]
+    )
+
+
+def record_event(event_type, user_ids, **data) -> DomainEvent:
+    (event,) = record_events(event_type, [{"user_ids": list(user_ids), **data}])
+    return event
+
+
+def _dispatch_to(event_types, handler, checkpoint_name, batch_size) -> int:
+    """Runs one handler over events past its cursor; returns events consumed."""
+    consumed = 0
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(
+                name=checkpoint_name
+            )
+            batch = list(
+                DomainEvent.objects.filter(id__gt=checkpoint.position).order_by("id")[
+                    :batch_size
+                ]
+            )
+            if not batch:
+                return consumed
+            events = [
+                event
+                for event in batch
+                if event_types is None or event.event_type in event_types
+            ]
+            if events:
+                handler(events)
+            checkpoint.position = batch[-1].id
+            checkpoint.save()
+            consumed += len(batch)
+
+
+def dispatch_events(batch_size=500) -> dict[str, int]:
+    """
+    Delivers new events to every handler in batches of `batch_size`.
+    Returns events consumed per handler. A failing handler is logged and
+    retried on the next run without holding the others back. With
+    DATABASE_SHARDS set, each shard's events have their own cursors.
+    """
+    consumed = {}
+    for alias in shard_aliases() or [None]:
+        suffix = f":{alias}" if alias else ""
+        with on_shard(alias):
+            for name, (event_types, handler) in HANDLERS.items():
+                try:
+                    count = _dispatch_to(
+                        event_types, handler, f"outbox:{name}{suffix}", batch_size
+                    )
+                except Exception:
+                    logger.exception("Event handler %s failed", name)
+                    count = 0
+                consumed[name] = consumed.get(name, 0) + count
+    return consumed
+
+
+@handles("profile_pages")
+def _invalidate_profile_pages(events):
+    # The views also drop these pages on commit; this covers a process
+    # that dies between its commit and the on_commit callback
+    invalidate_profile_pages(
+        *{user_id for event in events for user_id in event.payload["user_ids"]}
+    )
+
+
+@handles("trade_rollups", "PokemonSold", "TradeAccepted")
+def _refresh_trade_rollups(events):
+    refresh_trade_rollups()
+
+
+@handles("fraud_detection", "PokemonSold", "TradeAccepted")
+def _detect_fraud(events):
+    detect_fraud()
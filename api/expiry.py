@@ -0,0 +1,151 @@
+"""
+Expiry of abandoned trade requests and listings.
+
+A pending trade request older than settings.TRADE_REQUEST_EXPIRY_DAYS
+becomes "expired", and an active listing older than
+settings.LISTING_EXPIRY_DAYS is taken down as if its owner had cancelled
+it. expire_stale, run by the expire_stale command, does both in batches
+read oldest first down the (status, created_at) indexes: one UPDATE or
+DELETE and one bulk notification insert per batch, each batch in its own
+transaction, so a sweep never holds the write lock for long.
+
+The sweep keeps the pending set small for the conflict checks in
+send_trade_request and respond_trade_request. Between sweeps those views
+read live_trade_requests, which leaves out requests past their expiry, so
+an abandoned offer never locks a Pokemon for longer than the expiry.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_profile_pages
+from .events import record_events
+from .models import BarterTrade, MoneyTrade, Notification, TradeRequest
+from .sharding import on_shard, shard_aliases
+
+
+def _cutoff(days):
+    return timezone.now() - timedelta(days=days) if days else None
+
+
+def live_trade_requests():
+    """Pending trade requests that have not expired, swept or not."""
+    pending = TradeRequest.objects.filter(status="pending")
+    cutoff = _cutoff(settings.TRADE_REQUEST_EXPIRY_DAYS)
+    return pending if cutoff is None else pending.filter(created_at__gt=cutoff)
+
+
+def trade_request_expired(trade) -> bool:
+    cutoff = _cutoff(settings.TRADE_REQUEST_EXPIRY_DAYS)
+    return cutoff is not None and trade.created_at <= cutoff
+
+
+def expire_trade_requests(batch_size=500) -> int:
+    """
+    Expires pending trade requests past their expiry, telling each sender.
+    Returns the number expired.
+    """
+    cutoff = _cutoff(settings.TRADE_REQUEST_EXPIRY_DAYS)
+    if cutoff is None:
+        return 0
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                TradeRequest.objects.select_for_update()
+                .filter(status="pending", created_at__lte=cutoff)
+                .order_by("created_at")
+                .values_list(
+                    "id",
+                    "sender_id",
+                    "sender_pokemon__name",
+                    "receiver__username",
+                    "receiver_pokemon__name",
+                )[:batch_size]
+            )
+            if not batch:
+                return expired
+            TradeRequest.objects.filter(id__in=[row[0] for row in batch]).update(
+                status="expired"
+            )
+            Notification.objects.bulk_create(
+                Notification(
+                    user_id=sender_id,
+                    message=(
+                        f"Your offer of {offered} for {receiver}'s {wanted} "
+                        "expired without an answer."
+                    ),
+                )
+                for _, sender_id, offered, receiver, wanted in batch
+            )
+        expired += len(batch)
+
+
+def _expire_listings(model, cutoff, batch_size) -> int:
+    kind = "money" if model is MoneyTrade else "barter"
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                model.objects.select_for_update()
+                .filter(status="active", created_at__lte=cutoff)
+                .order_by("created_at")
+                .values_list("id", "pokemon_id", "pokemon__user_id", "pokemon__name")[
+                    :batch_size
+                ]
+            )
+            if not batch:
+                return expired
+            model.objects.filter(id__in=[row[0] for row in batch]).delete()
+            record_events(
+                "ListingCancelled",
+                [
+                    {
+                        "user_ids": [user_id],
+                        "pokemon_id": pokemon_id,
+                        "trades": {kind: listing_id},
+                        "reason": "expired",
+                    }
+                    for listing_id, pokemon_id, user_id, _ in batch
+                ],
+            )
+            Notification.objects.bulk_create(
+                Notification(
+                    user_id=user_id,
+                    message=f"Your listing of {name} expired and was taken down.",
+                    link=f"/pokemon/{pokemon_id}",
+                )
+                for _, pokemon_id, user_id, name in batch
+            )
+            invalidate_profile_pages(*{row[2] for row in batch})
+        expired += len(batch)
+
+
+def expire_listings(batch_size=500) -> int:
+    """
+    Takes down active money and barter listings past their expiry, telling
+    each owner. Returns the number taken down.
+    """
+    cutoff = _cutoff(settings.LISTING_EXPIRY_DAYS)
+    if cutoff is None:
+        return 0
+    return sum(
+        _expire_listings(model, cutoff, batch_size)
+        for model in (MoneyTrade, BarterTrade)
+    )
+
+
+def expire_stale(batch_size=500) -> dict[str, int]:
+    """
+    Runs both sweeps, on every shard when DATABASE_SHARDS is set. Returns
+    the number expired of each kind.
+    """
+    expired = {"trade_requests": 0, "listings": 0}
+    for alias in shard_aliases() or [None]:
+        with on_shard(alias):
+            expired["trade_requests"] += expire_trade_requests(batch_size)
+            expired["listings"] += expire_listings(batch_size)
+    return expired
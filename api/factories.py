@@ -2,7 +2,10 @@ import pokebase as pb
 from django.utils import timezone
 
 from .models import (
+    Auction,
+    BarterProposal,
     BarterTrade,
+    BuyOrder,
     MoneyTrade,
     Notification,
     Pokemon,
@@ -10,7 +13,9 @@ from .models import (
     TradeHistory,
     TradeRequest,
     User,
+    WishlistAlert,
 )
+from .thumbnails import species_thumbnail_url
 
 
 # --- Formatting Helpers (Factories for JSON data structures) ---
@@ -48,6 +53,18 @@ def format_money_trade_data(trade: MoneyTrade) -> dict | None:
     }
 
 
+def format_money_trade_sale_data(trade: MoneyTrade) -> dict:
+    """Formats a new MoneyTrade that a buy order filled at once (see api/orders.py)."""
+    return {
+        "id": trade.id,
+        "status": trade.status,
+        "sold": True,
+        "buyer": trade.sale.buyer.username,
+        "price": trade.sale.amount,
+        "history_id": trade.sale.id,
+    }
+
+
 def format_barter_trade_data(trade: BarterTrade) -> dict | None:
     """Formats BarterTrade data for JSON responses."""
     if not trade:
@@ -60,6 +77,28 @@ def format_barter_trade_data(trade: BarterTrade) -> dict | None:
     }
 
 
+def format_barter_proposal_data(proposal: BarterProposal, legs: list) -> dict:
+    """
+    Formats a BarterProposal; each leg's Pokemon goes to the owner of the
+    next leg, and the last one's to the first.
+    """
+    return {
+        "id": proposal.id,
+        "size": proposal.size,
+        "created_at": proposal.created_at.isoformat(),
+        "legs": [
+            {
+                "listing_id": leg.listing_id,
+                "pokemon_id": leg.listing.pokemon.id,
+                "pokemon_name": leg.listing.pokemon.name,
+                "owner": leg.listing.pokemon.user.username,
+                "gives_to": legs[(i + 1) % len(legs)].listing.pokemon.user.username,
+            }
+            for i, leg in enumerate(legs)
+        ],
+    }
+
+
 def format_pokemon_data(pokemon: Pokemon, request_user: User = None) -> dict:
     """Formats Pokemon data for JSON responses, including trade info."""
     data = {
@@ -68,6 +107,7 @@ def format_pokemon_data(pokemon: Pokemon, request_user: User = None) -> dict:
         "name": pokemon.name,
         "rarity": pokemon.rarity,
         "image_url": pokemon.image_url,
+        "thumbnail_url": species_thumbnail_url(pokemon.pokeapi_id),
         "types": pokemon.types,
         "owner": format_simple_user_data(pokemon.user),
         "money_trade": None,
@@ -116,6 +156,55 @@ def format_trade_history_data(history: TradeHistory) -> dict:
     }
 
 
+def format_wishlist_alert_data(alert: WishlistAlert) -> dict:
+    """Formats WishlistAlert data for JSON responses."""
+    return {
+        "id": alert.id,
+        "pokeapi_id": alert.pokeapi_id,
+        "pokemon_type": alert.pokemon_type,
+        "min_rarity": alert.min_rarity,
+        "max_price": alert.max_price,
+        "created_at": alert.created_at.isoformat(),
+    }
+
+
+def format_auction_data(auction: Auction, top_bids: list | None = None) -> dict:
+    """Formats Auction data (with pokemon, seller and leader) for JSON responses."""
+    data = {
+        "id": auction.id,
+        "pokemon": {
+            "id": auction.pokemon.id,
+            "name": auction.pokemon.name,
+            "pokeapi_id": auction.pokemon.pokeapi_id,
+            "rarity": auction.pokemon.rarity,
+        },
+        "seller": auction.seller.username,
+        "starting_price": auction.starting_price,
+        "current_bid": auction.current_bid,
+        "leader": auction.leader.username if auction.leader else None,
+        "bid_count": auction.bid_count,
+        "ends_at": auction.ends_at.isoformat(),
+        "status": auction.status,
+    }
+    if top_bids is not None:
+        data["top_bids"] = [
+            bid | {"created_at": bid["created_at"].isoformat()} for bid in top_bids
+        ]
+    return data
+
+
+def format_buy_order_data(order: BuyOrder) -> dict:
+    """Formats BuyOrder data for JSON responses."""
+    return {
+        "id": order.id,
+        "pokeapi_id": order.pokeapi_id,
+        "price": order.price,
+        "status": order.status,
+        "history_id": order.history_id,
+        "created_at": order.created_at.isoformat(),
+    }
+
+
 def format_trade_request_data(trade: TradeRequest) -> dict:
     """Formats TradeRequest data for JSON responses."""
     return {
@@ -200,14 +289,17 @@ class TradeHistoryFactory:
         pokemon: Pokemon,
         amount: int,
         timestamp=None,
+        trade_type: str = "money",
     ) -> TradeHistory:
         """Creates a TradeHistory instance (without saving)."""
+        # By id: with sharding the Pokemon can be on another database
         return TradeHistory(
-            buyer=buyer,
-            seller=seller,
-            pokemon=pokemon,
+            buyer_id=buyer.id,
+            seller_id=seller.id,
+            pokemon_id=pokemon.id,
             amount=amount,
             timestamp=timestamp or timezone.now(),
+            trade_type=trade_type,
         )
 
     def create_money_trade_history(
@@ -223,11 +315,21 @@ class TradeHistoryFactory:
         now = timezone.now()
         # user1 receives pokemon2 from user2
         history1 = self.create_trade_history(
-            buyer=user1, seller=user2, pokemon=pokemon2, amount=0, timestamp=now
+            buyer=user1,
+            seller=user2,
+            pokemon=pokemon2,
+            amount=0,
+            timestamp=now,
+            trade_type="barter",
         )
         # user2 receives pokemon1 from user1
         history2 = self.create_trade_history(
-            buyer=user2, seller=user1, pokemon=pokemon1, amount=0, timestamp=now
+            buyer=user2,
+            seller=user1,
+            pokemon=pokemon1,
+            amount=0,
+            timestamp=now,
+            trade_type="barter",
         )
         return [history1, history2]
 
@@ -0,0 +1,264 @@
+"""
+Wash-trading and fraud detection over TradeHistory.
+
+detect_fraud consumes history rows added since its last run and keeps two
+derived tables up to date instead of rescanning history: TradeEdge, the
+seller -> buyer graph of money sales, and TradeVelocityBucket, per-user
+trade counts summed over a sliding window. A row is flagged when it closes
+a recent cycle of sales, its price is far from the species median, or one
+of its parties is trading in a burst.
+
+Every check on a row looks at a bounded slice of that state (at most
+MAX_GRAPH_EDGES edges per hop, VELOCITY_WINDOW / VELOCITY_BUCKET buckets
+per user), so the cost per trade does not grow with history.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import (
+    Checkpoint,
+    SpeciesPrice,
+    TradeEdge,
+    TradeHistory,
+    TradeVelocityBucket,
+)
+from .pricing import MIN_SALES_FOR_MEDIAN
+from .sharding import shard_aliases
+
+FRAUD_CHECKPOINT = "fraud_detection"
+# Longest cycle looked for, in sales (2 is a Pokemon sold straight back)
+MAX_CYCLE_LENGTH = 3
+# Only sales this recent count towards a cycle
+CYCLE_WINDOW = timedelta(days=7)
+# Edges loaded per hop of the cycle search, most recent first
+MAX_GRAPH_EDGES = 5000
+# Sales above this multiple of the species median, or below its inverse
+PRICE_JUMP_RATIO = 5
+VELOCITY_BUCKET = timedelta(minutes=5)
+VELOCITY_WINDOW = timedelta(hours=1)
+# Trades a user may take part in within VELOCITY_WINDOW before it is a burst
+VELOCITY_LIMIT = 30
+
+
+def _bucket_start(timestamp):
+    minutes = VELOCITY_BUCKET // timedelta(minutes=1)
+    return timestamp.replace(
+        minute=timestamp.minute - timestamp.minute % minutes, second=0, microsecond=0
+    )
+
+
+def _recent_edges(user_ids, since) -> dict[int, dict[int, object]]:
+    """
+    seller id -> {buyer id: last sale} for recent edges reachable from
+    `user_ids` within the hops a cycle search can take.
+    """
+    graph = {}
+    frontier, seen = set(user_ids), set()
+    for _ in range(MAX_CYCLE_LENGTH - 1):
+        frontier -= seen
+        if not frontier:
+            break
+        seen |= frontier
+        edges = (
+            TradeEdge.objects.filter(seller_id__in=frontier, last_trade_at__gte=since)
+            .order_by("-last_trade_at")
+            .values_list("seller_id", "buyer_id", "last_trade_at")[:MAX_GRAPH_EDGES]
+        )
+        frontier = set()
+        for seller_id, buyer_id, last_trade_at in edges:
+            graph.setdefault(seller_id, {})[buyer_id] = last_trade_at
+            frontier.add(buyer_id)
+    return graph
+
+
+def _cycle_length(graph, seller_id, buyer_id, since) -> int | None:
+    """Length of the shortest recent cycle a sale from seller to buyer closes."""
+    frontier, seen = {buyer_id}, {buyer_id}
+    for length in range(2, MAX_CYCLE_LENGTH + 1):
+        next_frontier = set()
+        for user_id in frontier:
+            for target, last_trade_at in graph.get(user_id, {}).items():
+                if last_trade_at < since:
+                    continue
+                if target == seller_id:
+                    return length
+                if target not in seen:
+                    seen.add(target)
+                    next_frontier.add(target)
+        frontier = next_frontier
+    return None
+
+
+def _scan_batch(batch) -> dict[int, list[str]]:
+    """Folds a batch into the graph and velocity tables; returns reasons by row id."""
+    reasons = {}
+    touched_edges, touched_buckets = set(), set()
+    # Barters are written as two rows swapping in both directions at once,
+    # so only money sales go into the graph and the price check
+    sales = [row for row in batch if row["trade_type"] != "barter"]
+    first_at = min(row["timestamp"] for row in batch)
+
+    edges = {
+        (seller_id, buyer_id): [trade_count, total_amount, last_trade_at]
+        for seller_id, buyer_id, trade_count, total_amount, last_trade_at in (
+            TradeEdge.objects.filter(
+                seller_id__in={row["seller_id"] for row in sales},
+                buyer_id__in={row["buyer_id"] for row in sales},
+            ).values_list(
+                "seller_id", "buyer_id", "trade_count", "total_amount", "last_trade_at"
+            )
+        )
+    }
+    graph = _recent_edges({row["buyer_id"] for row in sales}, first_at - CYCLE_WINDOW)
+    medians = dict(
+        SpeciesPrice.objects.filter(
+            pokeapi_id__in={
+                row["pokemon__pokeapi_id"]
+                for row in sales
+                if row["pokemon__pokeapi_id"] is not None
+            },
+            sale_count__gte=MIN_SALES_FOR_MEDIAN,
+        ).values_list("pokeapi_id", "median_price")
+    )
+    window_buckets = VELOCITY_WINDOW // VELOCITY_BUCKET
+    velocity = {
+        (user_id, bucket_start): trade_count
+        for user_id, bucket_start, trade_count in TradeVelocityBucket.objects.filter(
+            user_id__in={row["buyer_id"] for row in batch}
+            | {row["seller_id"] for row in batch},
+            bucket_start__gt=_bucket_start(first_at) - VELOCITY_WINDOW,
+        ).values_list("user_id", "bucket_start", "trade_count")
+    }
+
+    for row in batch:
+        row_reasons = []
+        timestamp, amount = row["timestamp"], row["amount"]
+        bucket_start = _bucket_start(timestamp)
+        for user_id in (row["seller_id"], row["buyer_id"]):
+            key = (user_id, bucket_start)
+            velocity[key] = velocity.get(key, 0) + 1
+            touched_buckets.add(key)
+            recent = sum(
+                velocity.get((user_id, bucket_start - i * VELOCITY_BUCKET), 0)
+                for i in range(window_buckets)
+            )
+            if recent > VELOCITY_LIMIT:
+                row_reasons.append(
+                    f"User {user_id} took part in {recent} trades within "
+                    f"{VELOCITY_WINDOW // timedelta(minutes=1)} minutes"
+                )
+
+        if row["trade_type"] != "barter":
+            seller_id, buyer_id = row["seller_id"], row["buyer_id"]
+            length = _cycle_length(graph, seller_id, buyer_id, timestamp - CYCLE_WINDOW)
+            if length is not None:
+                row_reasons.append(
+                    f"Closes a cycle of {length} sales within {CYCLE_WINDOW.days} days"
+                )
+            graph.setdefault(seller_id, {})[buyer_id] = timestamp
+            edge = edges.setdefault((seller_id, buyer_id), [0, 0, timestamp])
+            touched_edges.add((seller_id, buyer_id))
+            edge[0] += 1
+            edge[1] += amount
+            edge[2] = max(edge[2], timestamp)
+
+            median = medians.get(row["pokemon__pokeapi_id"])
+            if median and (
+                amount > median * PRICE_JUMP_RATIO or amount * PRICE_JUMP_RATIO < median
+            ):
+                row_reasons.append(
+                    f"Price ${amount} is {amount / median:.2f}x the species "
+                    f"median ${median}"
+                )
+
+        if row_reasons:
+            reasons[row["id"]] = row_reasons
+
+    TradeEdge.objects.bulk_create(
+        [
+            TradeEdge(
+                seller_id=seller_id,
+                buyer_id=buyer_id,
+                trade_count=edges[seller_id, buyer_id][0],
+                total_amount=edges[seller_id, buyer_id][1],
+                last_trade_at=edges[seller_id, buyer_id][2],
+            )
+            for seller_id, buyer_id in touched_edges
+        ],
+        update_conflicts=True,
+        unique_fields=["seller", "buyer"],
+        update_fields=["trade_count", "total_amount", "last_trade_at"],
+    )
+    TradeVelocityBucket.objects.bulk_create(
+        [
+            TradeVelocityBucket(
+                user_id=user_id,
+                bucket_start=bucket_start,
+                trade_count=velocity[user_id, bucket_start],
+            )
+            for user_id, bucket_start in touched_buckets
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "bucket_start"],
+        update_fields=["trade_count"],
+    )
+    # Buckets that have slid out of every future window
+    TradeVelocityBucket.objects.filter(
+        bucket_start__lte=_bucket_start(max(row["timestamp"] for row in batch))
+        - VELOCITY_WINDOW
+    ).delete()
+    return reasons
+
+
+def detect_fraud(batch_size=1000) -> int:
+    """
+    Checks TradeHistory rows added since the last run and flags suspicious
+    ones (is_flagged / flag_reason). Each shard's history has its own
+    checkpoint. Returns the number of rows consumed.
+    """
+    processed = 0
+    for alias in shard_aliases() or [None]:
+        name = f"{FRAUD_CHECKPOINT}:{alias}" if alias else FRAUD_CHECKPOINT
+        while True:
+            with transaction.atomic():
+                checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(
+                    name=name
+                )
+                batch = list(
+                    TradeHistory.objects.using(alias)
+                    .filter(id__gt=checkpoint.position)
+                    .order_by("id")
+                    .values(
+                        "id",
+                        "seller_id",
+                        "buyer_id",
+                        "amount",
+                        "trade_type",
+                        "timestamp",
+                        "pokemon__pokeapi_id",
+                    )[:batch_size]
+                )
+                if not batch:
+                    break
+
+                reasons = _scan_batch(batch)
+                # Outside this transaction when sharded; flagging a row again
+                # on a retried batch is harmless
+                TradeHistory.objects.using(alias).bulk_update(
+                    [
+                        TradeHistory(
+                            id=row_id,
+                            is_flagged=True,
+                            flag_reason="; ".join(row_reasons),
+                        )
+                        for row_id, row_reasons in reasons.items()
+                    ],
+                    ["is_flagged", "flag_reason"],
+                )
+
+                checkpoint.position = batch[-1]["id"]
+                checkpoint.save()
+                processed += len(batch)
+    return processed
@@ -0,0 +1,578 @@
+import asyncio
+import io
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from http.cookiejar import DefaultCookiePolicy
+from http.cookies import SimpleCookie
+
+import django
+import numpy as np
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.urls import Resolver404, resolve
+
+# Name fragments the marketplace search is exercised with
+MARKETPLACE_QUERIES = ["pi", "ka", "char", "saur", "bul", "dra", "mew", "ee", "chu"]
+POKEMON_TYPES = ["fire", "water", "grass", "electric", "psychic", "dragon"]
+
+# Flow name -> relative weight in the virtual user mix
+FLOW_WEIGHTS = {
+    "browse_marketplace": 35,
+    "view_pokemon": 25,
+    "poll_notifications": 20,
+    "send_trade": 8,
+    "respond_trades": 7,
+    "buy_pokemon": 5,
+}
+# Marketplace entries a virtual user remembers for later flows
+REMEMBERED_LISTINGS = 50
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> dict:
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return {}
+
+
+class SessionClient:
+    """Cookie jar for one simulated browser."""
+
+    def __init__(self):
+        self.cookies = {}
+
+    def cookie_header(self) -> str:
+        return "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+
+    def store_cookies(self, headers):
+        for name, value in headers:
+            if name.lower() != "set-cookie":
+                continue
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for key, morsel in cookie.items():
+                if morsel["max-age"] == "0":
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+
+
+class VirtualUser(SessionClient):
+    """
+    One logged-in client. Flows are generators that yield
+    (method, path, payload) and are sent back the Response, so the same
+    flow code runs under both the threaded WSGI and the asyncio ASGI driver.
+    """
+
+    def __init__(self, username, password, seed, peers):
+        super().__init__()
+        self.username = username
+        self.password = password
+        self.rng = random.Random(seed)
+        self.peers = peers
+        self.user_id = None
+        self.listings = []
+
+    def choose_flow(self):
+        return self.rng.choices(list(FLOW_WEIGHTS), weights=FLOW_WEIGHTS.values())[0]
+
+    # --- Flows ---
+
+    def login(self):
+        response = yield (
+            "POST",
+            "/api/login/",
+            {"username": self.username, "password": self.password},
+        )
+        self.user_id = response.json().get("user", {}).get("id")
+
+    def browse_marketplace(self):
+        params = []
+        if self.rng.random() < 0.8:
+            params.append(f"q={self.rng.choice(MARKETPLACE_QUERIES)}")
+        if self.rng.random() < 0.3:
+            params.append(f"rarity={self.rng.randint(1, 5)}")
+        if self.rng.random() < 0.3:
+            params.append(f"type={self.rng.choice(POKEMON_TYPES)}")
+        response = yield "GET", "/api/marketplace/filter/?" + "&".join(params), None
+        results = [
+            pokemon
+            for pokemon in response.json().get("results", [])
+            if not pokemon.get("is_owner")
+        ]
+        if results:
+            self.listings = self.rng.sample(
+                results, min(len(results), REMEMBERED_LISTINGS)
+            )
+        yield "GET", "/api/featured-pokemon/", None
+
+    def view_pokemon(self):
+        if not self.listings:
+            yield from self.browse_marketplace()
+            if not self.listings:
+                return
+        pokemon = self.rng.choice(self.listings)
+        yield "GET", f"/api/pokemon/{pokemon['id']}/", None
+        yield "GET", f"/api/species/{pokemon['pokeapi_id']}/price/", None
+        yield "GET", f"/api/profile/{pokemon['owner']['id']}/", None
+
+    def buy_pokemon(self):
+        for_sale = [pokemon for pokemon in self.listings if pokemon.get("money_trade")]
+        if not for_sale:
+            yield from self.browse_marketplace()
+            for_sale = [p for p in self.listings if p.get("money_trade")]
+            if not for_sale:
+                return
+        pokemon = self.rng.choice(for_sale)
+        self.listings.remove(pokemon)
+        yield "POST", f"/api/pokemon/{pokemon['id']}/buy/", {}
+
+    def send_trade(self):
+        peers = [peer for peer in self.peers if peer.user_id != self.user_id]
+        if not peers:
+            return
+        receiver = self.rng.choice(peers)
+        mine = (yield "GET", "/api/my-pokemon/", None).json().get("pokemon", [])
+        theirs = (yield "GET", f"/api/profile/{receiver.user_id}/", None).json()
+        theirs = theirs.get("collection", [])
+        if mine and theirs:
+            yield (
+                "POST",
+                "/api/send-trade/",
+                {
+                    "receiver_id": receiver.user_id,
+                    "sender_pokemon_id": self.rng.choice(mine)["id"],
+                    "receiver_pokemon_id": self.rng.choice(theirs)["id"],
+                },
+            )
+
+    def respond_trades(self):
+        response = yield "GET", "/api/incoming-trades/", None
+        trades = response.json().get("trades", [])
+        if trades:
+            trade = self.rng.choice(trades)
+            action = "accept" if self.rng.random() < 0.6 else "decline"
+            yield "POST", f"/api/respond-trade/{trade['id']}/", {"action": action}
+
+    def poll_notifications(self):
+        response = yield "GET", "/api/notifications/", None
+        notifications = response.json().get("notifications", [])
+        if any(not notification["is_read"] for notification in notifications):
+            yield "POST", "/api/notifications/read/", {}
+
+
+def virtual_users(count, prefix="synth", password="password", seed=0):
+    """Picks `count` seeded users (see generate_synthetic_data) to log in as."""
+    usernames = list(
+        User.objects.filter(username__startswith=prefix, is_active=True).values_list(
+            "username", flat=True
+        )
+    )
+    if len(usernames) < count:
+        raise ValueError(
+            f"Only {len(usernames)} users match prefix {prefix!r}; "
+            "run generate_synthetic_data first."
+        )
+    rng = random.Random(seed)
+    peers = []
+    for i, username in enumerate(sorted(rng.sample(usernames, count))):
+        peers.append(VirtualUser(username, password, seed + i, peers))
+    return peers
+
+
+class LatencyRecorder:
+    """Latency samples and status counts per URL name."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, url_name, status, seconds):
+        self.samples[url_name].append(seconds)
+        self.statuses[url_name][status] += 1
+
+    def merge(self, other: "LatencyRecorder"):
+        for url_name, samples in other.samples.items():
+            self.samples[url_name].extend(samples)
+            self.statuses[url_name].update(other.statuses[url_name])
+
+
+def url_name_for(path) -> str:
+    try:
+        return resolve(path.partition("?")[0]).url_name or path
+    except Resolver404:
+        return "unresolved"
+
+
+def _split(path, payload):
+    path, _, query = path.partition("?")
+    body = json.dumps(payload).encode() if payload is not None else b""
+    return path, query, body
+
+
+class WSGIDriver:
+    """Calls the WSGI application directly with a hand-built environ."""
+
+    def __init__(self, application):
+        self.application = application
+
+    def request(self, user, method, path, payload) -> Response:
+        path, query, body = _split(path, payload)
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "HTTP_HOST": "localhost",
+            "HTTP_COOKIE": user.cookie_header(),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            # Closing the response fires request_finished, as a server would
+            if hasattr(result, "close"):
+                result.close()
+        return Response(started["status"], started["headers"], content)
+
+
+class HTTPDriver:
+    """Sends requests to a running server, e.g. runserver or gunicorn."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.local = threading.local()
+
+    def _session(self):
+        # One keep-alive session per thread; cookies live on the SessionClient
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.cookies.set_policy(
+                DefaultCookiePolicy(allowed_domains=[])
+            )
+        return self.local.session
+
+    def request(self, user, method, path, payload) -> Response:
+        _, _, body = _split(path, payload)
+        response = self._session().request(
+            method,
+            self.base_url + path,
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "Cookie": user.cookie_header(),
+            },
+            allow_redirects=False,
+        )
+        return Response(
+            response.status_code, list(response.raw.headers.items()), response.content
+        )
+
+
+class ASGIDriver:
+    """Calls the ASGI application directly with an in-memory HTTP scope."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, user, method, path, payload) -> Response:
+        path, query, body = _split(path, payload)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cookie", user.cookie_header().encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"headers": [], "body": []}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client stays connected until the handler is done with it
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message["headers"]
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.application(scope, receive, send)
+        return Response(
+            response["status"], response["headers"], b"".join(response["body"])
+        )
+
+
+def _record(user, recorder, path, response, elapsed):
+    # Django turns view exceptions into 500 responses, so every request that
+    # reaches the application comes back with a status to record
+    user.store_cookies(response.headers)
+    recorder.record(url_name_for(path), response.status, elapsed)
+
+
+def run_flow(driver: WSGIDriver | HTTPDriver, user, flow, recorder):
+    steps = flow()
+    response = None
+    while True:
+        try:
+            method, path, payload = steps.send(response)
+        except StopIteration:
+            return
+        start = time.perf_counter()
+        response = driver.request(user, method, path, payload)
+        _record(user, recorder, path, response, time.perf_counter() - start)
+
+
+async def run_flow_async(driver: ASGIDriver, user, flow, recorder):
+    steps = flow()
+    response = None
+    while True:
+        try:
+            method, path, payload = steps.send(response)
+        except StopIteration:
+            return
+        start = time.perf_counter()
+        response = await driver.request(user, method, path, payload)
+        _record(user, recorder, path, response, time.perf_counter() - start)
+
+
+def _think(user, think_time):
+    return user.rng.expovariate(1 / think_time) if think_time else 0
+
+
+def run_wsgi(users, duration, think_time=0.0, max_flows=None):
+    """
+    Runs each virtual user on its own thread against the WSGI application
+    until `duration` seconds have passed (or each has run `max_flows`).
+    Logins happen before the clock starts and are not recorded. Returns the
+    recorder and the measured wall time.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    driver = WSGIDriver(get_wsgi_application())
+    recorder = LatencyRecorder()
+    for user in users:
+        run_flow(driver, user, user.login, LatencyRecorder())
+
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(users) + 1)
+    deadline = []
+
+    def worker(user):
+        own = LatencyRecorder()
+        barrier.wait()
+        flows = 0
+        try:
+            while time.perf_counter() < deadline[0] and flows != max_flows:
+                run_flow(driver, user, getattr(user, user.choose_flow()), own)
+                flows += 1
+                time.sleep(_think(user, think_time))
+        finally:
+            connections.close_all()
+            with lock:
+                recorder.merge(own)
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    deadline.append(start + duration)
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
+
+
+def run_asgi(users, duration, think_time=0.0, max_flows=None):
+    """
+    Runs every virtual user as a task on one event loop against the ASGI
+    application. Sync views are run by Django's thread-sensitive executor,
+    exactly as under an ASGI server. Returns the same as run_wsgi.
+    """
+    from django.core.asgi import get_asgi_application
+
+    driver = ASGIDriver(get_asgi_application())
+    recorder = LatencyRecorder()
+
+    async def worker(user, deadline):
+        flows = 0
+        while time.perf_counter() < deadline and flows != max_flows:
+            await run_flow_async(
+                driver, user, getattr(user, user.choose_flow()), recorder
+            )
+            flows += 1
+            await asyncio.sleep(_think(user, think_time))
+
+    async def main():
+        for user in users:
+            await run_flow_async(driver, user, user.login, LatencyRecorder())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(user, start + duration) for user in users))
+        return time.perf_counter() - start
+
+    return recorder, asyncio.run(main())
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def summarize(recorder: LatencyRecorder, elapsed, meta=None) -> dict:
+    """Builds the machine-readable result: percentiles and throughput per URL name."""
+    routes = {}
+    for url_name, samples in sorted(recorder.samples.items()):
+        statuses = recorder.statuses[url_name]
+        p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+        routes[url_name] = {
+            "requests": len(samples),
+            "server_errors": sum(
+                count for status, count in statuses.items() if status >= 500
+            ),
+            "client_errors": sum(
+                count for status, count in statuses.items() if 400 <= status < 500
+            ),
+            "throughput_rps": round(len(samples) / elapsed, 3),
+            "p50_ms": round(p50, 3),
+            "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+        }
+
+    commit, dirty = _git_commit()
+    total_requests = sum(route["requests"] for route in routes.values())
+    return {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "recorded_at": datetime.now(dt_timezone.utc).isoformat(),
+            "django": django.get_version(),
+            "python": sys.version.split()[0],
+            "database": connection.vendor,
+            "elapsed_s": round(elapsed, 3),
+            **(meta or {}),
+        },
+        "totals": {
+            "requests": total_requests,
+            "server_errors": sum(route["server_errors"] for route in routes.values()),
+            "throughput_rps": round(total_requests / elapsed, 3),
+        },
+        "routes": routes,
+    }
+
+
+def compare_results(baseline: dict, current: dict) -> list[dict]:
+    """Per-route p50/p95/p99 and throughput change from `baseline` to `current`."""
+    rows = []
+    for url_name in sorted(set(baseline["routes"]) | set(current["routes"])):
+        before = baseline["routes"].get(url_name)
+        after = current["routes"].get(url_name)
+        row = {"url_name": url_name}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old = before[key] if before else None
+            new = after[key] if after else None
+            row[key] = (old, new)
+            row[f"{key}_change"] = (
+                round((new - old) / old * 100, 1) if old and new is not None else None
+            )
+        rows.append(row)
+    return rows
+
+
+def format_results(results: dict) -> list[str]:
+    lines = [
+        f"{'url name':<28}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}"
+        f"{'p99':>9}{'5xx':>6}{'4xx':>6}"
+    ]
+    for url_name, route in results["routes"].items():
+        lines.append(
+            f"{url_name:<28}{route['requests']:>8}{route['throughput_rps']:>9.1f}"
+            f"{route['p50_ms']:>9.1f}{route['p95_ms']:>9.1f}{route['p99_ms']:>9.1f}"
+            f"{route['server_errors']:>6}{route['client_errors']:>6}"
+        )
+    return lines
+
+
+def format_comparison(baseline: dict, current: dict) -> list[str]:
+    def cell(row, key):
+        old, new = row[key]
+        if old is None or new is None:
+            return "only before" if new is None else "new"
+        return f"{new:>9.1f} ({row[f'{key}_change']:+.1f})"
+
+    lines = [f"{'url name':<28}{'p50':>18}{'p95':>18}{'p99':>18}"]
+    for row in compare_results(baseline, current):
+        lines.append(
+            f"{row['url_name']:<28}{cell(row, 'p50_ms'):>18}"
+            f"{cell(row, 'p95_ms'):>18}{cell(row, 'p99_ms'):>18}"
+        )
+    return lines
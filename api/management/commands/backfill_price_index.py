@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.pricing import backfill_price_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-species price index from all recorded money trades."
+
+    def handle(self, *args, **options):
+        species_count = backfill_price_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed prices for {species_count} species.")
+        )
@@ -0,0 +1,92 @@
+import copy
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.loadtest import (
+    format_comparison,
+    format_results,
+    run_wsgi,
+    summarize,
+    virtual_users,
+)
+from pokemon.db import DATABASE_PROFILES, copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the loadtest mix of reads and writes against a fresh copy of "
+        "the database under each SQLite profile in pokemon/db.py and "
+        "compares throughput, latency and lock errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            nargs="+",
+            default=["default", "production"],
+            choices=list(DATABASE_PROFILES),
+        )
+        parser.add_argument("--users", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=20)
+        parser.add_argument(
+            "--snapshot",
+            help="Seeded SQLite database to copy for each run (default: the "
+            "configured database)",
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file")
+
+    def handle(self, *args, **options):
+        database = connections["default"]
+        if database.vendor != "sqlite":
+            raise CommandError("bench_database compares SQLite profiles.")
+        snapshot = options["snapshot"] or str(database.settings_dict["NAME"])
+        base_settings = copy.deepcopy(database.settings_dict)
+
+        results = {}
+        for profile in options["profiles"]:
+            scratch = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+            scratch.close()
+            copy_sqlite_database(snapshot, scratch.name)
+
+            # Threads open their connections from this same settings dict
+            connections.close_all()
+            database.settings_dict.update(
+                copy.deepcopy(base_settings),
+                NAME=scratch.name,
+                **copy.deepcopy(DATABASE_PROFILES[profile]),
+            )
+            try:
+                users = virtual_users(options["users"])
+            except ValueError as e:
+                raise CommandError(e) from e
+
+            self.stdout.write(f"\n{profile} profile")
+            recorder, elapsed = run_wsgi(users, options["duration"])
+            connections.close_all()
+            results[profile] = summarize(
+                recorder, elapsed, meta={"profile": profile, "users": options["users"]}
+            )
+            for line in format_results(results[profile]):
+                self.stdout.write(line)
+
+        database.settings_dict.update(base_settings)
+        self.stdout.write("")
+        for profile, result in results.items():
+            totals = result["totals"]
+            self.stdout.write(
+                f"{profile:<12}{totals['throughput_rps']:>9.1f} req/s"
+                f"{totals['server_errors']:>7} server errors"
+            )
+        baseline, *others = options["profiles"]
+        for profile in others:
+            self.stdout.write(f"\n{profile} against {baseline} (ms, change in %)")
+            for line in format_comparison(results[baseline], results[profile]):
+                self.stdout.write(line)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import RateLimitBucket
+from api.ratelimit import take_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Times rate limit checks against the database, the overhead "
+        "each request to a limited URL pays."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        keys = {
+            # One client calling repeatedly, and a new client on every call
+            "same bucket": lambda i: "ratelimit:bench:same",
+            "new bucket": lambda i: f"ratelimit:bench:{i}",
+        }
+        for label, key in keys.items():
+            start = time.perf_counter()
+            for i in range(iterations):
+                # Room for every call, so each one takes a token
+                take_token(key(i), iterations, 3600)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{label:<12}{elapsed / iterations * 1e6:>9.1f} us/check")
+        RateLimitBucket.objects.filter(key__startswith="ratelimit:bench:").delete()
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.auctions import close_expired_auctions
+
+
+class Command(BaseCommand):
+    help = (
+        "Closes auctions whose time is up, selling each to its highest "
+        "bidder, once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between runs"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_expired_auctions(batch_size=options["batch_size"])
+            self.stdout.write(f"Closed {closed} auctions.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
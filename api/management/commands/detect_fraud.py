@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.fraud import detect_fraud
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks new TradeHistory rows for trade cycles, price jumps and "
+        "bursts of activity, flagging the suspicious ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = detect_fraud(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Checked {processed} trades."))
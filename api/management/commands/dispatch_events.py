@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.events import dispatch_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers new domain events to every registered handler, once or "
+        "every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between runs"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            consumed = dispatch_events(batch_size=options["batch_size"])
+            self.stdout.write(
+                ", ".join(f"{name}: {count}" for name, count in consumed.items())
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
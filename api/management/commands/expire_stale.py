@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.expiry import expire_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Expires pending trade requests and listings older than "
+        "TRADE_REQUEST_EXPIRY_DAYS and LISTING_EXPIRY_DAYS, once or every "
+        "--interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between runs"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_stale(batch_size=options["batch_size"])
+            self.stdout.write(
+                f"Expired {expired['trade_requests']} trade requests and "
+                f"{expired['listings']} listings."
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,503 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import (
+    BarterTrade,
+    MoneyTrade,
+    Notification,
+    Pokemon,
+    Profile,
+    TradeHistory,
+    TradeReport,
+    TradeRequest,
+)
+
+SPECIES_COUNT = 1025
+POKEMON_TYPES = [
+    "normal",
+    "fire",
+    "water",
+    "grass",
+    "electric",
+    "ice",
+    "fighting",
+    "poison",
+    "ground",
+    "flying",
+    "psychic",
+    "bug",
+    "rock",
+    "ghost",
+    "dragon",
+    "dark",
+    "steel",
+    "fairy",
+]
+SYLLABLES = [
+    "pi", "ka", "chu", "bul", "ba", "saur", "char", "man", "der", "squir",
+    "tle", "ee", "vee", "ge", "gar", "on", "dra", "ni", "te", "lu", "cario",
+    "mew", "tw", "zu", "bat", "mag", "ne", "mi", "ty", "sno", "lax", "ra",
+]  # fmt: skip
+ARTWORK_URL = (
+    "https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/"
+    "other/official-artwork/{}.png"
+)
+NOTIFICATION_MESSAGES = [
+    "Your Pokémon was sold.",
+    "You have a new trade offer!",
+    "Your trade offer was accepted.",
+    "Your trade offer was declined.",
+]
+REPORT_STATUSES = ["pending", "investigating", "resolved", "dismissed"]
+INSERT_BATCH_SIZE = 10000
+# Base asking price per rarity level (index 0 = rarity 1)
+RARITY_PRICES = np.array([40, 90, 200, 450, 1200])
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a realistic, production-sized dataset offline: users, "
+        "Pokemon, listings, trade requests, trade history, notifications "
+        "and reports. Output is reproducible for a given --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix", default="synth", help="Username prefix for generated users"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Users generated (and held in memory) per transaction",
+        )
+        parser.add_argument(
+            "--mean-pokemon", type=float, default=12, help="Mean collection size"
+        )
+        parser.add_argument(
+            "--ownership-alpha",
+            type=float,
+            default=1.6,
+            help="Pareto shape for collection sizes; lower is more skewed",
+        )
+        parser.add_argument("--max-pokemon", type=int, default=5000)
+        parser.add_argument(
+            "--rarity-skew",
+            type=float,
+            default=2.5,
+            help="Each rarity level is this many times less common than the last",
+        )
+        parser.add_argument("--listing-rate", type=float, default=0.08)
+        parser.add_argument("--barter-share", type=float, default=0.3)
+        parser.add_argument("--trades-per-user", type=float, default=4)
+        parser.add_argument("--requests-per-user", type=float, default=0.5)
+        parser.add_argument("--notifications-per-user", type=float, default=5)
+        parser.add_argument("--report-rate", type=float, default=0.01)
+        parser.add_argument(
+            "--days", type=int, default=180, help="Span of generated history"
+        )
+        parser.add_argument(
+            "--end",
+            type=datetime.fromisoformat,
+            help="Newest generated timestamp (ISO 8601), defaults to now. "
+            "Fix it to make timestamps reproducible too.",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = np.random.default_rng(options["seed"])
+        self.now = options["end"] or timezone.now()
+        if timezone.is_naive(self.now):
+            self.now = timezone.make_aware(self.now)
+        self.now_db = connection.ops.adapt_datetimefield_value(self.now)
+        self.password = make_password("password")
+        self.build_species_catalog()
+
+        # Ids of every generated user, kept as a compact array so later
+        # chunks can trade with earlier ones without reloading them.
+        self.user_ids = np.empty(0, dtype=np.int64)
+        totals = {}
+        started = time.perf_counter()
+
+        for start in range(0, options["users"], options["chunk_size"]):
+            count = min(options["chunk_size"], options["users"] - start)
+            with transaction.atomic():
+                created = self.generate_chunk(start, count)
+            for model, n in created.items():
+                totals[model] = totals.get(model, 0) + n
+            self.stdout.write(
+                f"{start + count}/{options['users']} users "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+
+        summary = ", ".join(f"{n} {model}" for model, n in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}."))
+
+    # --- Catalog ---
+
+    def build_species_catalog(self):
+        rng = self.rng
+        skew = self.options["rarity_skew"]
+        rarity_weights = skew ** -np.arange(5, dtype=float)
+        rarity_weights /= rarity_weights.sum()
+
+        self.species_rarity = rng.choice(
+            np.arange(1, 6), size=SPECIES_COUNT, p=rarity_weights
+        )
+        # Common species show up in collections far more than rare ones
+        weights = skew ** -(self.species_rarity - 1.0)
+        self.species_weights = weights / weights.sum()
+
+        self.species_names = []
+        seen = set()
+        for pokeapi_id in range(1, SPECIES_COUNT + 1):
+            parts = rng.choice(SYLLABLES, size=rng.integers(2, 4))
+            name = "".join(parts)
+            if name in seen:
+                name = f"{name}-{pokeapi_id}"
+            seen.add(name)
+            self.species_names.append(name)
+
+        first = rng.integers(0, len(POKEMON_TYPES), size=SPECIES_COUNT)
+        second = rng.integers(0, len(POKEMON_TYPES), size=SPECIES_COUNT)
+        dual = rng.random(SPECIES_COUNT) < 0.45
+        self.species_types = [
+            [POKEMON_TYPES[a]] + ([POKEMON_TYPES[b]] if has_two and a != b else [])
+            for a, b, has_two in zip(first, second, dual)
+        ]
+
+    # --- Helpers ---
+
+    def lock_tables(self, models):
+        """
+        Keeps other writers out of these tables until the chunk's transaction
+        commits, so the ids insert() reads back are all the chunk's own.
+        """
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                tables = ", ".join(quote(model._meta.db_table) for model in models)
+                cursor.execute(f"LOCK TABLE {tables} IN EXCLUSIVE MODE")
+            else:
+                # SQLite has one write lock for the whole database, taken by
+                # the first write statement even if it changes nothing
+                table = quote(models[0]._meta.db_table)
+                cursor.execute(f"UPDATE {table} SET id = id WHERE 0")
+
+    def insert(self, model, fields, rows, return_ids=False):
+        """
+        Inserts tuples with executemany, skipping per-object ORM overhead.
+
+        With return_ids, the new primary keys are read back in insertion
+        order; call lock_tables first in the same transaction so no other
+        writer's rows can land among them.
+        """
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = ", ".join(quote(model._meta.get_field(f).column) for f in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+
+        with connection.cursor() as cursor:
+            if return_ids:
+                cursor.execute(f"SELECT MAX(id) FROM {table}")
+                last_id = cursor.fetchone()[0] or 0
+            for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+                cursor.executemany(sql, rows[offset : offset + INSERT_BATCH_SIZE])
+            if return_ids:
+                cursor.execute(
+                    f"SELECT id FROM {table} WHERE id > %s ORDER BY id", [last_id]
+                )
+                return np.fromiter(
+                    (row[0] for row in cursor.fetchall()), dtype=np.int64
+                )
+        return None
+
+    def random_times(self, size):
+        seconds = self.rng.integers(0, self.options["days"] * 86400, size=size)
+        adapt = connection.ops.adapt_datetimefield_value
+        return [adapt(self.now - timedelta(seconds=int(s))) for s in seconds]
+
+    def price_for(self, pokeapi_ids):
+        base = RARITY_PRICES[self.species_rarity[pokeapi_ids - 1] - 1]
+        noise = self.rng.lognormal(mean=0.0, sigma=0.35, size=len(pokeapi_ids))
+        return np.maximum(1, (base * noise).round()).astype(np.int64)
+
+    def collection_sizes(self, count):
+        alpha = self.options["ownership_alpha"]
+        # Scale a Lomax (Pareto II) draw so its mean matches --mean-pokemon
+        scale = self.options["mean_pokemon"] * (alpha - 1) if alpha > 1 else 1
+        sizes = np.ceil(self.rng.pareto(alpha, size=count) * scale).astype(np.int64)
+        return np.clip(sizes, 1, self.options["max_pokemon"])
+
+    # --- Generation ---
+
+    def generate_chunk(self, start, count):
+        rng, options = self.rng, self.options
+        prefix = options["prefix"]
+        now = self.now_db
+
+        self.lock_tables([User, Pokemon, MoneyTrade, BarterTrade])
+        chunk_user_ids = self.insert(
+            User,
+            [
+                "username",
+                "email",
+                "password",
+                "first_name",
+                "last_name",
+                "is_superuser",
+                "is_staff",
+                "is_active",
+                "date_joined",
+            ],
+            [
+                (f"{prefix}{i}", f"{prefix}{i}@example.com", self.password, "", "")
+                + (False, False, True, now)
+                for i in range(start, start + count)
+            ],
+            return_ids=True,
+        )
+        self.user_ids = np.concatenate([self.user_ids, chunk_user_ids])
+
+        money = np.round(rng.lognormal(mean=6.0, sigma=1.0, size=count))
+        self.insert(
+            Profile,
+            ["user", "money"],
+            list(zip(chunk_user_ids.tolist(), money.astype(int).tolist())),
+        )
+
+        # Collections: power-law sizes, rarity-weighted species
+        sizes = self.collection_sizes(count)
+        owners = np.repeat(chunk_user_ids, sizes)
+        species = rng.choice(
+            np.arange(1, SPECIES_COUNT + 1),
+            size=int(sizes.sum()),
+            p=self.species_weights,
+        )
+        species_rows = [
+            (
+                name,
+                int(rarity),
+                ARTWORK_URL.format(pokeapi_id),
+                json.dumps(types),
+            )
+            for pokeapi_id, name, rarity, types in zip(
+                range(1, SPECIES_COUNT + 1),
+                self.species_names,
+                self.species_rarity,
+                self.species_types,
+            )
+        ]
+        pokemon_ids = self.insert(
+            Pokemon,
+            ["user", "pokeapi_id", "name", "rarity", "image_url", "types"],
+            [
+                (owner, pokeapi_id) + species_rows[pokeapi_id - 1]
+                for owner, pokeapi_id in zip(owners.tolist(), species.tolist())
+            ],
+            return_ids=True,
+        )
+        n_pokemon = len(pokemon_ids)
+
+        # Listings on a random subset, split between money and barter
+        listed = rng.random(n_pokemon) < options["listing_rate"]
+        barter = rng.random(n_pokemon) < options["barter_share"]
+        money_idx = np.flatnonzero(listed & ~barter)
+        barter_idx = np.flatnonzero(listed & barter)
+        money_times = self.random_times(len(money_idx))
+        money_trade_ids = self.insert(
+            MoneyTrade,
+            [
+                "pokemon",
+                "amount_asked",
+                "pokeapi_id",
+                "status",
+                "is_flagged",
+                "created_at",
+                "updated_at",
+            ],
+            [
+                (pokemon_id, price, pokeapi_id, "active", False, created_at, created_at)
+                for pokemon_id, price, pokeapi_id, created_at in zip(
+                    pokemon_ids[money_idx].tolist(),
+                    self.price_for(species[money_idx]).tolist(),
+                    species[money_idx].tolist(),
+                    money_times,
+                )
+            ],
+            return_ids=True,
+        )
+        barter_times = self.random_times(len(barter_idx))
+        wanted = rng.integers(0, SPECIES_COUNT, size=len(barter_idx))
+        barter_trade_ids = self.insert(
+            BarterTrade,
+            [
+                "pokemon",
+                "trade_preferences",
+                "status",
+                "is_flagged",
+                "created_at",
+                "updated_at",
+            ],
+            [
+                (
+                    pokemon_id,
+                    self.species_names[want],
+                    "active",
+                    False,
+                    created_at,
+                    created_at,
+                )
+                for pokemon_id, want, created_at in zip(
+                    pokemon_ids[barter_idx].tolist(), wanted.tolist(), barter_times
+                )
+            ],
+            return_ids=True,
+        )
+
+        # Trade history: the buyer owns the traded Pokemon now; the seller is
+        # any user generated so far.
+        n_history = int(rng.poisson(options["trades_per_user"] * count))
+        history_idx = rng.integers(0, n_pokemon, size=n_history)
+        sellers = rng.choice(self.user_ids, size=n_history)
+        is_barter = rng.random(n_history) < options["barter_share"]
+        amounts = np.where(is_barter, 0, self.price_for(species[history_idx]))
+        history_rows = [
+            (
+                buyer,
+                seller,
+                pokemon_id,
+                amount,
+                "barter" if amount == 0 else "money",
+                ts,
+            )
+            + (False,)
+            for buyer, seller, pokemon_id, amount, ts in zip(
+                owners[history_idx].tolist(),
+                sellers.tolist(),
+                pokemon_ids[history_idx].tolist(),
+                amounts.tolist(),
+                self.random_times(n_history),
+            )
+            if buyer != seller
+        ]
+        self.insert(
+            TradeHistory,
+            [
+                "buyer",
+                "seller",
+                "pokemon",
+                "amount",
+                "trade_type",
+                "timestamp",
+                "is_flagged",
+            ],
+            history_rows,
+        )
+
+        # Trade requests between owners in this chunk, mostly already resolved
+        n_requests = int(rng.poisson(options["requests_per_user"] * count))
+        senders_idx = rng.integers(0, n_pokemon, size=n_requests)
+        receivers_idx = rng.integers(0, n_pokemon, size=n_requests)
+        statuses = rng.choice(
+            ["pending", "accepted", "declined"], size=n_requests, p=[0.3, 0.3, 0.4]
+        )
+        request_rows = [
+            (sender, receiver, sender_pokemon, receiver_pokemon, str(status), ts)
+            for sender, receiver, sender_pokemon, receiver_pokemon, status, ts in zip(
+                owners[senders_idx].tolist(),
+                owners[receivers_idx].tolist(),
+                pokemon_ids[senders_idx].tolist(),
+                pokemon_ids[receivers_idx].tolist(),
+                statuses,
+                self.random_times(n_requests),
+            )
+            if sender != receiver
+        ]
+        self.insert(
+            TradeRequest,
+            [
+                "sender",
+                "receiver",
+                "sender_pokemon",
+                "receiver_pokemon",
+                "status",
+                "created_at",
+            ],
+            request_rows,
+        )
+
+        n_notifications = int(rng.poisson(options["notifications_per_user"] * count))
+        notified = rng.choice(chunk_user_ids, size=n_notifications)
+        read = rng.random(n_notifications) < 0.7
+        messages = rng.integers(0, len(NOTIFICATION_MESSAGES), size=n_notifications)
+        self.insert(
+            Notification,
+            ["user", "message", "link", "is_read", "created_at"],
+            [
+                (
+                    user_id,
+                    NOTIFICATION_MESSAGES[message],
+                    "/incoming-trades/",
+                    is_read,
+                    ts,
+                )
+                for user_id, message, is_read, ts in zip(
+                    notified.tolist(),
+                    messages.tolist(),
+                    read.tolist(),
+                    self.random_times(n_notifications),
+                )
+            ],
+        )
+
+        report_rows = []
+        for trade_ids, times, column in (
+            (money_trade_ids, money_times, 0),
+            (barter_trade_ids, barter_times, 1),
+        ):
+            reported = np.flatnonzero(
+                rng.random(len(trade_ids)) < options["report_rate"]
+            )
+            reporters = rng.choice(self.user_ids, size=len(reported))
+            statuses = rng.choice(REPORT_STATUSES, size=len(reported))
+            for i, reporter, status in zip(reported, reporters.tolist(), statuses):
+                trade_id = int(trade_ids[i])
+                report_rows.append(
+                    (reporter, "Suspicious listing", str(status), times[i])
+                    + ((trade_id, None) if column == 0 else (None, trade_id))
+                )
+        self.insert(
+            TradeReport,
+            [
+                "reporter",
+                "reason",
+                "status",
+                "created_at",
+                "money_trade",
+                "barter_trade",
+            ],
+            report_rows,
+        )
+
+        return {
+            "users": count,
+            "pokemon": n_pokemon,
+            "money listings": len(money_trade_ids),
+            "barter listings": len(barter_trade_ids),
+            "trade history rows": len(history_rows),
+            "trade requests": len(request_rows),
+            "notifications": n_notifications,
+            "reports": len(report_rows),
+        }
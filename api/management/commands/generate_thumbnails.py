@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.thumbnails import (
+    THUMBNAIL_FORMATS,
+    THUMBNAIL_SIZES,
+    ThumbnailError,
+    species_source_urls,
+    species_thumbnail,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders every thumbnail size and format for each species in the "
+        "database, so the first visitor of a page does not wait on PokeAPI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Species fetched and rendered in parallel",
+        )
+
+    def handle(self, *args, **options):
+        sources = species_source_urls()
+
+        def render(item):
+            pokeapi_id, image_url = item
+            for size in THUMBNAIL_SIZES:
+                for fmt in THUMBNAIL_FORMATS:
+                    species_thumbnail(pokeapi_id, size, fmt, source_url=image_url)
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {
+                pool.submit(render, item): item[0] for item in sorted(sources.items())
+            }
+            for future, pokeapi_id in futures.items():
+                try:
+                    future.result()
+                except ThumbnailError as e:
+                    failed += 1
+                    self.stderr.write(f"Species {pokeapi_id}: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered thumbnails for {len(sources) - failed} of "
+                f"{len(sources)} species."
+            )
+        )
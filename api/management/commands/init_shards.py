@@ -0,0 +1,63 @@
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.sharding import (
+    SHARD_ID_SPACE,
+    SHARD_KEYS,
+    SHARD_LOCAL,
+    mirror_user,
+    shard_aliases,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the schema on every shard in DATABASE_SHARDS, gives each "
+        "shard its own id range for user-owned tables, and copies every user "
+        "to the shards and the shard directory. Safe to run again after "
+        "adding migrations. Existing user-owned rows on the default database "
+        "are not moved."
+    )
+
+    def handle(self, *args, **options):
+        if not shard_aliases():
+            raise CommandError("No shards configured; set DATABASE_SHARDS.")
+        tables = [
+            apps.get_model(label)._meta.db_table
+            for label in sorted(SHARD_KEYS.keys() | SHARD_LOCAL)
+        ]
+        for index, alias in enumerate(shard_aliases()):
+            call_command("migrate", database=alias, verbosity=0)
+            # Ids stay unique across shards (and the default database), so a
+            # row moved between shards keeps its id
+            floor = (index + 1) * SHARD_ID_SPACE
+            with connections[alias].cursor() as cursor:
+                for table in tables:
+                    cursor.execute(
+                        "SELECT seq FROM sqlite_sequence WHERE name = %s", [table]
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        cursor.execute(
+                            "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                            [table, floor],
+                        )
+                    elif row[0] < floor:
+                        cursor.execute(
+                            "UPDATE sqlite_sequence SET seq = %s WHERE name = %s",
+                            [floor, table],
+                        )
+            self.stdout.write(f"Migrated {alias}")
+
+        count = 0
+        for user in User.objects.using("default").iterator():
+            mirror_user(user)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Mirrored {count} users to {len(shard_aliases())} shards"
+            )
+        )
@@ -0,0 +1,99 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import (
+    format_comparison,
+    format_results,
+    run_asgi,
+    run_wsgi,
+    summarize,
+    virtual_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the full Django stack (WSGI or ASGI) with concurrent virtual "
+        "users browsing, viewing, buying, trading and polling notifications, "
+        "then reports p50/p95/p99 latency and throughput per URL name. Seed "
+        "the database with generate_synthetic_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interface", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--users", type=int, default=20, help="Virtual users")
+        parser.add_argument(
+            "--duration", type=float, default=30, help="Seconds of measured load"
+        )
+        parser.add_argument(
+            "--think-time",
+            type=float,
+            default=0,
+            help="Mean pause between flows in seconds (0 = closed loop)",
+        )
+        parser.add_argument(
+            "--prefix", default="synth", help="Username prefix of seeded users"
+        )
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON results to this file")
+        parser.add_argument(
+            "--compare", help="Results file from an earlier run to diff against"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            users = virtual_users(
+                options["users"],
+                options["prefix"],
+                options["password"],
+                options["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(e) from e
+
+        run = run_wsgi if options["interface"] == "wsgi" else run_asgi
+        recorder, elapsed = run(users, options["duration"], options["think_time"])
+
+        results = summarize(
+            recorder,
+            elapsed,
+            meta={
+                "interface": options["interface"],
+                "users": options["users"],
+                "duration_s": options["duration"],
+                "think_time_s": options["think_time"],
+                "seed": options["seed"],
+            },
+        )
+        self.print_results(results)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            self.print_comparison(baseline, results)
+
+    def print_results(self, results):
+        for line in format_results(results):
+            self.stdout.write(line)
+        totals = results["totals"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totals['requests']} requests, {totals['throughput_rps']:.1f} req/s, "
+                f"{totals['server_errors']} server errors"
+            )
+        )
+
+    def print_comparison(self, baseline, results):
+        self.stdout.write(
+            f"\nAgainst {baseline['meta'].get('commit') or 'baseline'} "
+            "(latency in ms, change in %)"
+        )
+        for line in format_comparison(baseline, results):
+            self.stdout.write(line)
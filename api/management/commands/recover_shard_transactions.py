@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ShardTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Lists cross-shard transactions that never finished. A 'prepared' "
+        "one may have committed on some shards only and needs checking by "
+        "hand; a 'pending' one rolled back everywhere and can be marked "
+        "aborted with --abort-pending."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=60,
+            help="Only report transactions untouched for this many seconds",
+        )
+        parser.add_argument("--abort-pending", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options["older_than"])
+        stuck = ShardTransaction.objects.filter(
+            status__in=["pending", "prepared"], updated_at__lt=cutoff
+        ).order_by("created_at")
+        for log in stuck:
+            self.stdout.write(
+                f"{log.id} {log.status} on {', '.join(log.shards)} "
+                f"since {log.updated_at:%Y-%m-%d %H:%M:%S}"
+            )
+        if options["abort_pending"]:
+            aborted = stuck.filter(status="pending").update(
+                status="aborted", updated_at=timezone.now()
+            )
+            self.stdout.write(f"Marked {aborted} pending transactions aborted")
+        self.stdout.write(self.style.SUCCESS(f"{len(stuck)} unfinished transactions"))
@@ -0,0 +1,43 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+from api.atlases import render_atlases
+from api.models import Pokemon
+from api.sharding import on_shard, shard_aliases
+from api.thumbnails import ThumbnailError
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the sprite sheets profile pages show for every user's "
+        "collection that are not on disk yet. Run it after collections "
+        "change; until then profiles show per-species thumbnails."
+    )
+
+    def handle(self, *args, **options):
+        rendered = failed = 0
+        for alias in shard_aliases() or [None]:
+            # Sheets are versioned by the sources the profile's shard sees
+            with on_shard(alias):
+                rows = (
+                    Pokemon.objects.values_list("user_id", "pokeapi_id")
+                    .order_by("user_id", "pokeapi_id")
+                    .distinct()
+                )
+                collections = {
+                    frozenset(pokeapi_id for _, pokeapi_id in group)
+                    for _, group in groupby(rows.iterator(), key=lambda row: row[0])
+                }
+                for species_ids in collections:
+                    try:
+                        rendered += render_atlases(species_ids)
+                    except ThumbnailError as e:
+                        failed += 1
+                        self.stderr.write(f"Collection {sorted(species_ids)}: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {rendered} sprite sheets; {failed} collections failed."
+            )
+        )
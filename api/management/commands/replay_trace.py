@@ -0,0 +1,121 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from api.loadtest import (
+    HTTPDriver,
+    WSGIDriver,
+    format_comparison,
+    format_results,
+    summarize,
+)
+from api.replay import load_trace, replay
+from pokemon.db import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a request trace written by RequestTraceMiddleware against "
+        "this app (optionally on a fresh copy of a snapshot database) or a "
+        "running server, then compares latency per URL name with the "
+        "recorded timings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("trace", help="Trace file; rotated backups are included")
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Playback speed relative to the original (2 = twice as fast, "
+            "0 = back to back on one thread)",
+        )
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--snapshot",
+            help="SQLite database to copy to a scratch file and replay against",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Send requests to a running server instead of in-process",
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file")
+
+    def handle(self, *args, **options):
+        if options["snapshot"]:
+            if options["base_url"]:
+                raise CommandError(
+                    "--snapshot only applies to in-process replay; start the "
+                    "server with DATABASE_PATH pointing at a copy instead."
+                )
+            if connections["default"].vendor != "sqlite":
+                raise CommandError("--snapshot needs a SQLite database.")
+            # Every run starts from the same state, however many writes it makes
+            scratch = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+            scratch.close()
+            copy_sqlite_database(options["snapshot"], scratch.name)
+            connections.close_all()
+            connections["default"].settings_dict["NAME"] = scratch.name
+            self.stdout.write(
+                f"Replaying against {scratch.name}, a copy of {options['snapshot']}"
+            )
+
+        entries = load_trace(options["trace"])
+        if options["base_url"]:
+            driver = HTTPDriver(options["base_url"])
+        else:
+            driver = WSGIDriver(get_wsgi_application())
+        result = replay(entries, driver, options["speed"], options["concurrency"])
+
+        meta = {
+            "trace": options["trace"],
+            "speed": options["speed"],
+            "concurrency": options["concurrency"],
+            "snapshot": options["snapshot"],
+            "base_url": options["base_url"],
+        }
+        replayed = summarize(result.replayed, result.elapsed or 0.001, meta)
+        recorded = summarize(result.recorded, result.recorded_elapsed or 0.001)
+
+        for line in format_results(replayed):
+            self.stdout.write(line)
+        self.stdout.write("\nAgainst the recorded timings (latency in ms, change in %)")
+        for line in format_comparison(recorded, replayed):
+            self.stdout.write(line)
+
+        for reason, count in result.skipped.most_common():
+            self.stdout.write(f"Skipped {count}: {reason}")
+        for url_name, count in result.status_changes.most_common():
+            self.stdout.write(
+                self.style.WARNING(f"{url_name}: {count} responses changed status")
+            )
+        if options["speed"] > 0 and result.max_lag > 0.1:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Fell up to {result.max_lag:.2f}s behind schedule; "
+                    "raise --concurrency or lower --speed"
+                )
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(
+                    {
+                        "replayed": replayed,
+                        "recorded": recorded,
+                        "skipped": dict(result.skipped),
+                        "status_changes": dict(result.status_changes),
+                    },
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(f"Results written to {options['output']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {replayed['totals']['requests']} requests in "
+                f"{result.elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import refresh_trade_rollups
+
+
+class Command(BaseCommand):
+    help = "Aggregates new TradeHistory rows into the hourly and daily rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        processed = refresh_trade_rollups(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} trades."))
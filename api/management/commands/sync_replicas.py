@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.routers import replica_aliases
+from pokemon.db import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database onto every read replica in "
+        "DATABASE_REPLICAS, once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Seconds between syncs; keep below REPLICA_STICKY_SECONDS",
+        )
+
+    def handle(self, *args, **options):
+        if not replica_aliases():
+            raise CommandError("No replicas configured; set DATABASE_REPLICAS.")
+        source = connections["default"].settings_dict["NAME"]
+        while True:
+            start = time.perf_counter()
+            for alias in replica_aliases():
+                copy_sqlite_database(source, connections[alias].settings_dict["NAME"])
+            self.stdout.write(
+                f"Synced {len(replica_aliases())} replicas in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
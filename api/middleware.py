@@ -0,0 +1,397 @@
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+import requests
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.mail.backends.smtp import EmailBackend
+from django.db import connections
+from django.http import JsonResponse
+
+from .ratelimit import bucket_key, take_token
+from .routers import reading_from, replica_aliases
+from .sharding import on_shard, shard_aliases, shard_for_user
+
+logger = logging.getLogger("api.metrics")
+trace_logger = logging.getLogger("api.trace")
+
+# Metrics for the request being handled on this thread/task, if any
+_current_metrics = ContextVar("request_metrics", default=None)
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# Repeated statements above this count are reported as likely N+1 patterns
+DUPLICATE_QUERY_THRESHOLD = 3
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Normalises a statement so the same query with different values matches."""
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _LITERALS.sub("?", sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.external_time = {}
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+            self.fingerprints[fingerprint_sql(sql)] += 1
+
+    def record_external(self, kind: str, seconds: float):
+        self.external_time[kind] = self.external_time.get(kind, 0.0) + seconds
+
+    def duplicate_queries(self) -> list[dict]:
+        return [
+            {"sql": sql, "count": count}
+            for sql, count in self.fingerprints.most_common(5)
+            if count >= DUPLICATE_QUERY_THRESHOLD
+        ]
+
+
+def _timed_external(kind_for_call, original):
+    """Wraps a client method so calls made during a tracked request are timed."""
+
+    def wrapper(*args, **kwargs):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return original(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            metrics.record_external(
+                kind_for_call(*args, **kwargs), time.perf_counter() - start
+            )
+
+    wrapper.__wrapped__ = original
+    return wrapper
+
+
+def _http_kind(session, method, url, *args, **kwargs):
+    # pokebase goes through requests, so PokeAPI calls are picked out by host
+    return "pokeapi" if "pokeapi.co" in str(url) else "http"
+
+
+_external_hooks_installed = False
+
+
+def install_external_hooks():
+    """Patches requests and SMTP sending once per process."""
+    global _external_hooks_installed
+    if _external_hooks_installed:
+        return
+    requests.Session.request = _timed_external(_http_kind, requests.Session.request)
+    EmailBackend.send_messages = _timed_external(
+        lambda *args, **kwargs: "smtp", EmailBackend.send_messages
+    )
+    _external_hooks_installed = True
+
+
+class RouteMetricsRegistry:
+    """Per-process aggregate of request metrics keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, url_name, total, metrics: RequestMetrics):
+        external = sum(metrics.external_time.values())
+        with self._lock:
+            route = self._routes.setdefault(
+                url_name,
+                {
+                    "requests": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "sql_queries": 0,
+                    "sql_ms": 0.0,
+                    "external_ms": 0.0,
+                    "requests_with_duplicate_queries": 0,
+                },
+            )
+            route["requests"] += 1
+            route["total_ms"] += total * 1000
+            route["max_ms"] = max(route["max_ms"], total * 1000)
+            route["sql_queries"] += metrics.sql_count
+            route["sql_ms"] += metrics.sql_time * 1000
+            route["external_ms"] += external * 1000
+            if metrics.duplicate_queries():
+                route["requests_with_duplicate_queries"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {name: dict(route) for name, route in self._routes.items()}
+        for route in routes.values():
+            count = route["requests"]
+            route["avg_ms"] = round(route["total_ms"] / count, 3)
+            route["avg_sql_queries"] = round(route["sql_queries"] / count, 2)
+            route["avg_sql_ms"] = round(route["sql_ms"] / count, 3)
+            route["avg_external_ms"] = round(route["external_ms"] / count, 3)
+            for key in ("total_ms", "max_ms", "sql_ms", "external_ms"):
+                route[key] = round(route[key], 3)
+        return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteMetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Records SQL count and time, repeated query fingerprints, time spent in
+    PokeAPI/HTTP/SMTP calls and total handling time for each request.
+
+    Results are sent back as a Server-Timing header, logged as one JSON line
+    on the "api.metrics" logger and aggregated per URL name. Enabled with
+    REQUEST_METRICS_ENABLED; when off, Django drops the middleware at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_external_hooks()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_sql))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match else None
+        external = sum(metrics.external_time.values())
+        duplicates = metrics.duplicate_queries()
+
+        timings = [
+            f'sql;dur={metrics.sql_time * 1000:.2f};desc="{metrics.sql_count} queries"',
+            f"ext;dur={external * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ]
+        if duplicates:
+            timings.append(f'n1;desc="{len(duplicates)} repeated statements"')
+        response["Server-Timing"] = ", ".join(timings)
+
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "url_name": url_name,
+                    "status": response.status_code,
+                    "total_ms": round(total * 1000, 3),
+                    "sql_queries": metrics.sql_count,
+                    "sql_ms": round(metrics.sql_time * 1000, 3),
+                    "external_ms": {
+                        kind: round(seconds * 1000, 3)
+                        for kind, seconds in metrics.external_time.items()
+                    },
+                    "duplicate_queries": duplicates,
+                }
+            )
+        )
+        route_metrics.record(url_name, total, metrics)
+        return response
+
+
+# Parameters whose values never leave the process
+REDACTED_PARAMS = {
+    "password",
+    "new_password1",
+    "new_password2",
+    "email",
+    "token",
+    "uidb64",
+    "prompt",
+    "reason",
+    "admin_notes",
+}
+REDACTED = "[redacted]"
+
+
+def sanitize_params(params: dict) -> dict:
+    return {
+        key: REDACTED if key in REDACTED_PARAMS else value
+        for key, value in params.items()
+    }
+
+
+def _json_body(request):
+    if request.content_type != "application/json":
+        return None
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return None
+    return sanitize_params(body) if isinstance(body, dict) else None
+
+
+class RequestTraceMiddleware:
+    """
+    Appends one sanitized NDJSON line per request to the "api.trace" logger
+    (a rotating file, see LOGGING): start time, method, view name, URL and
+    query parameters, JSON body, user id, status and duration. Values of
+    REDACTED_PARAMS are replaced before anything is written.
+
+    Enabled with REQUEST_TRACE_ENABLED; REQUEST_TRACE_SAMPLE_RATE keeps only
+    a fraction of requests. Traces are replayed with the replay_trace command.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TRACE_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_TRACE_SAMPLE_RATE", 1.0)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return response
+        user = getattr(request, "user", None)
+        trace_logger.info(
+            json.dumps(
+                {
+                    "ts": round(started_at, 6),
+                    "method": request.method,
+                    "view": match.view_name,
+                    "url_name": match.url_name,
+                    "kwargs": sanitize_params(match.kwargs),
+                    "query": sanitize_params(dict(request.GET.lists())),
+                    "body": _json_body(request),
+                    "user_id": user.id if user and user.is_authenticated else None,
+                    "status": response.status_code,
+                    "duration_ms": round(duration * 1000, 3),
+                }
+            )
+        )
+        return response
+
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Set after a write so the browser keeps reading its own writes from the primary
+PRIMARY_PIN_COOKIE = "primary_pin"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets read-only requests read from a replica in DATABASE_READ_REPLICAS,
+    one picked at random per request. A successful write sets a cookie that
+    keeps the browser on the primary for REPLICA_STICKY_SECONDS, which should
+    cover the sync_replicas interval. Unused when no replicas are configured.
+    """
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            alias = None
+            if PRIMARY_PIN_COOKIE not in request.COOKIES:
+                alias = random.choice(replica_aliases())
+            with reading_from(alias):
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        if response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ShardMiddleware:
+    """
+    Sends unhinted queries for user-owned models to the logged-in user's
+    shard, so views listing the user's own rows read the right database.
+    Unused when DATABASE_SHARDS is not set.
+    """
+
+    def __init__(self, get_response):
+        if not shard_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = request.user
+        with on_shard(shard_for_user(user.id) if user.is_authenticated else None):
+            return self.get_response(request)
+
+
+class RateLimitMiddleware:
+    """
+    Answers 429 with Retry-After once a client has used up its token bucket
+    for a URL name in settings.RATE_LIMITS (see api/ratelimit.py). Routes
+    without a policy pass straight through. Unused when RATE_LIMITS is empty.
+    """
+
+    def __init__(self, get_response):
+        self.policies = getattr(settings, "RATE_LIMITS", {})
+        if not self.policies:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        policy = self.policies.get(url_name)
+        if policy is None:
+            return None
+        requests, seconds, scope = policy
+        retry_after = take_token(
+            bucket_key(url_name, request, scope), requests, seconds
+        )
+        if not retry_after:
+            return None
+        retry_after = math.ceil(retry_after)
+        return JsonResponse(
+            {
+                "success": False,
+                "error": f"Too many requests; try again in {retry_after} seconds.",
+            },
+            status=429,
+            headers={"Retry-After": str(retry_after)},
+        )
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_trade_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeciesPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pokeapi_id', models.IntegerField(unique=True)),
+                ('last_price', models.IntegerField()),
+                ('median_price', models.IntegerField()),
+                ('p25_price', models.IntegerField()),
+                ('p75_price', models.IntegerField()),
+                ('sale_count', models.IntegerField(default=0)),
+                ('total_amount', models.BigIntegerField(default=0)),
+                ('recent_prices', models.JSONField(default=list)),
+                ('last_sale_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SpeciesPriceBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pokeapi_id', models.IntegerField()),
+                ('bucket_start', models.DateTimeField()),
+                ('sale_count', models.IntegerField(default=0)),
+                ('total_amount', models.BigIntegerField(default=0)),
+                ('min_price', models.IntegerField()),
+                ('max_price', models.IntegerField()),
+                ('close_price', models.IntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pokeapi_id', 'bucket_start'), name='unique_species_bucket')],
+            },
+        ),
+    ]
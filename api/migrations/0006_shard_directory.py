@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_species_price_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shards', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('prepared', 'Prepared'), ('committed', 'Committed'), ('aborted', 'Aborted')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True)),
+                ('username', models.CharField(max_length=150, unique=True)),
+                ('shard', models.CharField(max_length=50)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_shard_directory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('flag', 'Flag'), ('unflag', 'Unflag'), ('remove', 'Remove')], max_length=10)),
+                ('criteria', models.JSONField(default=dict)),
+                ('reason', models.TextField(blank=True, null=True)),
+                ('admin_notes', models.TextField(blank=True, null=True)),
+                ('money_trades_updated', models.IntegerField(default=0)),
+                ('barter_trades_updated', models.IntegerField(default=0)),
+                ('reports_updated', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('moderator', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='moderation_audits', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
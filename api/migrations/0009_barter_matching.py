@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_fraud_graph'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarterProposal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cycle_key', models.CharField(max_length=100, unique=True)),
+                ('size', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BarterProposalLeg',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposal_legs', to='api.bartertrade')),
+                ('proposal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legs', to='api.barterproposal')),
+            ],
+            options={
+                'ordering': ['proposal', 'position'],
+            },
+        ),
+        migrations.AddField(
+            model_name='barterproposal',
+            name='listings',
+            field=models.ManyToManyField(related_name='proposals', through='api.BarterProposalLeg', to='api.bartertrade'),
+        ),
+        migrations.CreateModel(
+            name='BarterIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('offer', 'Offer'), ('want', 'Want')], max_length=5)),
+                ('key', models.CharField(max_length=120)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_entries', to='api.bartertrade')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['role', 'key'], name='api_barteri_role_bfdc6b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0010_wishlist_alerts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DomainEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        choices=[
+                            ("ListingCreated", "Listing created"),
+                            ("ListingCancelled", "Listing cancelled"),
+                            ("PokemonSold", "Pokemon sold"),
+                            ("TradeAccepted", "Trade accepted"),
+                            ("TradeModerated", "Trade moderated"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
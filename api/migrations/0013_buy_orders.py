@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_pokeapi_ids(apps, schema_editor):
+    MoneyTrade = apps.get_model("api", "MoneyTrade")
+    Pokemon = apps.get_model("api", "Pokemon")
+    MoneyTrade.objects.update(
+        pokeapi_id=models.Subquery(
+            Pokemon.objects.filter(id=models.OuterRef("pokemon_id")).values(
+                "pokeapi_id"
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_auctions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuyOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pokeapi_id', models.IntegerField()),
+                ('price', models.IntegerField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('filled', 'Filled'), ('cancelled', 'Cancelled')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='moneytrade',
+            name='pokeapi_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='moneytrade',
+            index=models.Index(fields=['pokeapi_id', 'status', 'amount_asked'], name='api_moneytr_pokeapi_2ac264_idx'),
+        ),
+        migrations.AddField(
+            model_name='buyorder',
+            name='history',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.tradehistory'),
+        ),
+        migrations.AddField(
+            model_name='buyorder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buy_orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='buyorder',
+            index=models.Index(fields=['pokeapi_id', 'status', '-price', 'created_at'], name='buy_order_book'),
+        ),
+        migrations.RunPython(copy_pokeapi_ids, migrations.RunPython.noop),
+    ]
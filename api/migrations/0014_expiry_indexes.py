@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_buy_orders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='traderequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('declined', 'Declined'), ('expired', 'Expired')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='bartertrade',
+            index=models.Index(fields=['status', 'created_at'], name='api_bartert_status_093abd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneytrade',
+            index=models.Index(fields=['status', 'created_at'], name='api_moneytr_status_5f526a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traderequest',
+            index=models.Index(fields=['status', 'created_at'], name='api_tradere_status_7593ce_idx'),
+        ),
+    ]
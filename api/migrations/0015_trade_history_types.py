@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+def fill_trade_types(apps, schema_editor):
+    # Barter rows used to be written without a trade_type, with amount 0
+    TradeHistory = apps.get_model("api", "TradeHistory")
+    TradeHistory.objects.filter(trade_type__isnull=True).update(
+        trade_type=models.Case(
+            models.When(amount__gt=0, then=models.Value("money")),
+            default=models.Value("barter"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_trade_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_trade_history_types'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auctionbid',
+            index=models.Index(fields=['auction', '-amount', 'id'], name='api_auction_auction_671295_idx'),
+        ),
+    ]
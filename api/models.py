@@ -34,7 +34,7 @@ class TradeHistory(models.Model):
     seller = models.ForeignKey(User, related_name="sales", on_delete=models.CASCADE)
     pokemon = models.ForeignKey(Pokemon, on_delete=models.SET_NULL, null=True)
     amount = models.IntegerField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     admin_notes = models.TextField(blank=True, null=True)
     is_flagged = models.BooleanField(default=False)
     flag_reason = models.TextField(blank=True, null=True)
@@ -65,11 +65,16 @@ class TradeRequest(models.Model):
             ("pending", "Pending"),
             ("accepted", "Accepted"),
             ("declined", "Declined"),
+            ("expired", "Expired"),
         ],
         default="pending",
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The expiry sweep reads the oldest pending requests first
+        indexes = [models.Index(fields=["status", "created_at"])]
+
 
 class Notification(models.Model):
     id = models.AutoField(primary_key=True)
@@ -100,6 +105,9 @@ class MoneyTrade(models.Model):
         Pokemon, on_delete=models.CASCADE, related_name="money_trade_listing"
     )
     amount_asked = models.IntegerField()
+    # Copy of pokemon.pokeapi_id, so the cheapest listing of a species is
+    # one index seek for the buy order book
+    pokeapi_id = models.IntegerField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     is_flagged = models.BooleanField(default=False)
     flag_reason = models.TextField(blank=True, null=True)
@@ -107,6 +115,12 @@ class MoneyTrade(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["pokeapi_id", "status", "amount_asked"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
     @property
     def owner(self):
         return self.pokemon.user
@@ -134,6 +148,9 @@ class BarterTrade(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
     @property
     def owner(self):
         return self.pokemon.user
@@ -182,3 +199,377 @@ class TradeReport(models.Model):
         trade = self.money_trade or self.barter_trade
         return f"Report on {trade} by {self.reporter.username}"
 
+
+class Checkpoint(models.Model):
+    """Cursor for background jobs that consume a table incrementally by id."""
+
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class RateLimitBucket(models.Model):
+    """One client's token bucket for one rate-limited route (see api/ratelimit.py)."""
+
+    key = models.CharField(max_length=255, unique=True)
+    # Unix time the bucket is full again
+    full_at = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key} full at {self.full_at}"
+
+
+class TradeRollup(models.Model):
+    """Pre-aggregated TradeHistory statistics for one hour or one day."""
+
+    GRANULARITY_CHOICES = [
+        ("hour", "Hour"),
+        ("day", "Day"),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    trade_count = models.IntegerField(default=0)  # Pokemon that changed hands
+    money_trade_count = models.IntegerField(default=0)
+    barter_trade_count = models.IntegerField(default=0)
+    money_moved = models.BigIntegerField(default=0)
+    unique_buyers = models.IntegerField(default=0)
+    unique_sellers = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-bucket_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["granularity", "bucket_start"], name="unique_rollup_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} rollup at {self.bucket_start.isoformat()}"
+
+
+class SpeciesPrice(models.Model):
+    """Running market statistics for money sales of one species."""
+
+    pokeapi_id = models.IntegerField(unique=True)
+    last_price = models.IntegerField()
+    median_price = models.IntegerField()
+    p25_price = models.IntegerField()
+    p75_price = models.IntegerField()
+    sale_count = models.IntegerField(default=0)
+    total_amount = models.BigIntegerField(default=0)
+    recent_prices = models.JSONField(default=list)  # Newest last, bounded window
+    last_sale_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Species {self.pokeapi_id} at ${self.median_price}"
+
+
+class SpeciesPriceBucket(models.Model):
+    """Daily OHLC-style price series for one species."""
+
+    pokeapi_id = models.IntegerField()
+    bucket_start = models.DateTimeField()
+    sale_count = models.IntegerField(default=0)
+    total_amount = models.BigIntegerField(default=0)
+    min_price = models.IntegerField()
+    max_price = models.IntegerField()
+    close_price = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pokeapi_id", "bucket_start"], name="unique_species_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return f"Species {self.pokeapi_id} on {self.bucket_start.date()}"
+
+
+class UserShard(models.Model):
+    """Global directory: which shard a user's rows live on (default database)."""
+
+    user_id = models.BigIntegerField(unique=True)
+    username = models.CharField(max_length=150, unique=True)
+    shard = models.CharField(max_length=50)
+
+    def __str__(self):
+        return f"{self.username} on {self.shard}"
+
+
+class ShardTransaction(models.Model):
+    """Coordinator record for one cross_shard_atomic block."""
+
+    shards = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            ("pending", "Pending"),
+            ("prepared", "Prepared"),
+            ("committed", "Committed"),
+            ("aborted", "Aborted"),
+        ],
+        default="pending",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ShardTransaction({self.id}) {self.status}"
+
+
+class ModerationAudit(models.Model):
+    """Summary of one bulk moderation request (see api/moderation.py)."""
+
+    ACTION_CHOICES = [
+        ("flag", "Flag"),
+        ("unflag", "Unflag"),
+        ("remove", "Remove"),
+    ]
+
+    moderator = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="moderation_audits"
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    criteria = models.JSONField(default=dict)  # The ids or filter as sent
+    reason = models.TextField(blank=True, null=True)
+    admin_notes = models.TextField(blank=True, null=True)
+    money_trades_updated = models.IntegerField(default=0)
+    barter_trades_updated = models.IntegerField(default=0)
+    reports_updated = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.action} by {self.moderator} at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class TradeEdge(models.Model):
+    """Money sales from one user to another, folded in by api/fraud.py."""
+
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    trade_count = models.IntegerField(default=0)
+    total_amount = models.BigIntegerField(default=0)
+    last_trade_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["seller", "buyer"], name="unique_trade_edge"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} -> {self.buyer_id} x{self.trade_count}"
+
+
+class TradeVelocityBucket(models.Model):
+    """Trades one user took part in during one short interval."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    bucket_start = models.DateTimeField(db_index=True)
+    trade_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "bucket_start"], name="unique_velocity_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id}: {self.trade_count} at {self.bucket_start}"
+
+
+class BarterIndexEntry(models.Model):
+    """
+    One thing a barter listing offers or wants, as a key like "type:fire" or
+    "species:pikachu". Looked up by (role, key) to match listings (api/barter.py).
+    """
+
+    ROLE_CHOICES = [
+        ("offer", "Offer"),
+        ("want", "Want"),
+    ]
+
+    listing = models.ForeignKey(
+        BarterTrade, on_delete=models.CASCADE, related_name="index_entries"
+    )
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    role = models.CharField(max_length=5, choices=ROLE_CHOICES)
+    key = models.CharField(max_length=120)
+
+    class Meta:
+        indexes = [models.Index(fields=["role", "key"])]
+
+    def __str__(self):
+        return f"Listing {self.listing_id} {self.role}s {self.key}"
+
+
+class BarterProposal(models.Model):
+    """A swap or trade cycle in which every owner gets a Pokemon they asked for."""
+
+    # Listing ids in cycle order, rotated to start at the smallest
+    cycle_key = models.CharField(max_length=100, unique=True)
+    size = models.IntegerField()
+    listings = models.ManyToManyField(
+        BarterTrade, through="BarterProposalLeg", related_name="proposals"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.size}-way barter {self.cycle_key}"
+
+
+class BarterProposalLeg(models.Model):
+    """A listing in a proposal; its Pokemon goes to the owner of the next leg."""
+
+    proposal = models.ForeignKey(
+        BarterProposal, on_delete=models.CASCADE, related_name="legs"
+    )
+    listing = models.ForeignKey(
+        BarterTrade, on_delete=models.CASCADE, related_name="proposal_legs"
+    )
+    position = models.IntegerField()
+
+    class Meta:
+        ordering = ["proposal", "position"]
+
+
+class WishlistAlert(models.Model):
+    """
+    A user's standing request to hear about new listings (api/wishlist.py).
+    Empty criteria match anything.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="wishlist_alerts"
+    )
+    pokeapi_id = models.IntegerField(null=True, blank=True)
+    pokemon_type = models.CharField(max_length=20, null=True, blank=True)
+    min_rarity = models.IntegerField(null=True, blank=True)
+    max_price = models.IntegerField(null=True, blank=True)
+    # The alert's most selective criterion, e.g. "species:25"; new listings
+    # look alerts up by the keys they could match
+    match_key = models.CharField(max_length=30)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["match_key", "max_price"])]
+
+    def __str__(self):
+        return f"{self.user.username} wants {self.match_key}"
+
+
+class DomainEvent(models.Model):
+    """
+    Append-only outbox of state changes, written in the transaction that
+    made them and delivered to handlers by api/events.py.
+    """
+
+    EVENT_TYPES = [
+        ("ListingCreated", "Listing created"),
+        ("ListingCancelled", "Listing cancelled"),
+        ("PokemonSold", "Pokemon sold"),
+        ("TradeAccepted", "Trade accepted"),
+        ("TradeModerated", "Trade moderated"),
+    ]
+
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    # Always has "user_ids": the users whose data the change touched
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_type}({self.id})"
+
+
+class Auction(models.Model):
+    """
+    A timed sale to the highest bidder. The leading bid is kept on the row
+    and held from the leader's balance until they are outbid or it closes.
+    """
+
+    STATUS_CHOICES = [
+        ("active", "Active"),
+        ("sold", "Sold"),
+        ("unsold", "Unsold"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    pokemon = models.ForeignKey(
+        Pokemon, on_delete=models.CASCADE, related_name="auctions"
+    )
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="auctions")
+    starting_price = models.IntegerField()
+    ends_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    current_bid = models.IntegerField(null=True, blank=True)
+    leader = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    bid_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "ends_at"])]
+
+    def __str__(self):
+        return f"Auction of {self.pokemon.name} ({self.status})"
+
+
+class AuctionBid(models.Model):
+    auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name="bids")
+    bidder = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="auction_bids"
+    )
+    amount = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Top bids are read highest first, earlier bids winning ties
+        indexes = [models.Index(fields=["auction", "-amount", "id"])]
+
+    def __str__(self):
+        return f"${self.amount} on auction {self.auction_id}"
+
+
+class BuyOrder(models.Model):
+    """
+    A standing offer to buy any Pokemon of a species for up to `price`,
+    escrowed from the buyer's balance while open.
+    """
+
+    STATUS_CHOICES = [
+        ("open", "Open"),
+        ("filled", "Filled"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="buy_orders")
+    pokeapi_id = models.IntegerField()
+    price = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="open")
+    history = models.ForeignKey(
+        TradeHistory, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Price-time priority: best price first, then the oldest order
+        indexes = [
+            models.Index(
+                fields=["pokeapi_id", "status", "-price", "created_at"],
+                name="buy_order_book",
+            )
+        ]
+
+    def __str__(self):
+        return f"Buy #{self.pokeapi_id} for up to ${self.price} ({self.status})"
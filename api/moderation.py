@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_profile_pages
+from .events import record_event
+from .models import BarterTrade, ModerationAudit, MoneyTrade, Pokemon, TradeReport
+
+# Largest id list accepted per trade type. The reports UPDATE binds both
+# lists, and SQLite allows 32766 parameters per statement.
+MAX_MODERATION_IDS = 10000
+OPEN_REPORT_STATUSES = ["pending", "investigating"]
+# What each action does to reports on the affected trades
+REPORT_STATUS_FOR_ACTION = {
+    "flag": "investigating",
+    "unflag": "dismissed",
+    "remove": "resolved",
+}
+TRADE_TYPES = {"money": MoneyTrade, "barter": BarterTrade}
+
+
+class ModerationError(ValueError):
+    """The request does not describe a valid set of trades or action."""
+
+
+def _filter_q(criteria: dict) -> Q:
+    """Turns a moderation filter into a Q that applies to either trade model."""
+    lookups = {
+        "status": "status",
+        "is_flagged": "is_flagged",
+        "seller": "pokemon__user__username",
+        "pokemon_name": "pokemon__name__icontains",
+        "created_after": "created_at__gte",
+        "created_before": "created_at__lt",
+        "reported": "reports__isnull",
+    }
+    unknown = set(criteria) - set(lookups)
+    if unknown:
+        raise ModerationError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+    if not criteria:
+        raise ModerationError("A filter needs at least one field")
+
+    q = Q()
+    for field, value in criteria.items():
+        if field in ("created_after", "created_before"):
+            value = parse_datetime(value) if isinstance(value, str) else None
+            if value is None:
+                raise ModerationError(f"{field} must be an ISO 8601 datetime")
+        elif field == "reported":
+            value = not value
+        q &= Q(**{lookups[field]: value})
+    return q
+
+
+def select_trades(data: dict) -> dict:
+    """
+    Returns {model: queryset} for the trades a bulk request names, either by
+    id ({"ids": {"money": [...], "barter": [...]}}) or by filter
+    ({"filter": {...}, "types": ["money", "barter"]}).
+    """
+    if ("ids" in data) == ("filter" in data):
+        raise ModerationError("Send either ids or filter")
+
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, dict) or set(ids) - set(TRADE_TYPES):
+            raise ModerationError('ids must map "money" and/or "barter" to id lists')
+        selected = {}
+        for trade_type, trade_ids in ids.items():
+            if not isinstance(trade_ids, list) or not all(
+                isinstance(i, int) for i in trade_ids
+            ):
+                raise ModerationError(f"ids.{trade_type} must be a list of integers")
+            if len(trade_ids) > MAX_MODERATION_IDS:
+                raise ModerationError(
+                    f"At most {MAX_MODERATION_IDS} ids per trade type"
+                )
+            model = TRADE_TYPES[trade_type]
+            selected[model] = model.objects.filter(id__in=trade_ids)
+        return selected
+
+    if not isinstance(data["filter"], dict):
+        raise ModerationError("filter must be an object")
+    types = data.get("types", list(TRADE_TYPES))
+    if not isinstance(types, list) or set(types) - set(TRADE_TYPES):
+        raise ModerationError('types must be a list of "money" and/or "barter"')
+    q = _filter_q(data["filter"])
+    # distinct: the reports join can repeat a trade
+    return {TRADE_TYPES[t]: TRADE_TYPES[t].objects.filter(q).distinct() for t in types}
+
+
+def moderate_trades(moderator, action, selected, criteria, reason=None, notes=None):
+    """
+    Applies a moderation action to every selected trade with one UPDATE per
+    model, moves their open reports on, and records a ModerationAudit, all
+    in one transaction.
+
+    Reports and owners are resolved before the trades change, since a
+    filter may select on the fields the action rewrites.
+    """
+    if action not in REPORT_STATUS_FOR_ACTION:
+        raise ModerationError("action must be flag, unflag or remove")
+
+    now = timezone.now()
+    changes = {"updated_at": now}
+    if action == "flag":
+        changes |= {"is_flagged": True, "flag_reason": reason}
+    elif action == "unflag":
+        changes |= {"is_flagged": False, "flag_reason": None}
+    else:
+        changes |= {"status": "removed", "is_flagged": False}
+    if notes is not None:
+        changes["admin_notes"] = notes
+
+    report_changes = {"status": REPORT_STATUS_FOR_ACTION[action]}
+    if action != "flag":
+        report_changes |= {"resolved_at": now, "resolved_by": moderator}
+
+    # Each selection is a subquery. Owners and reports are matched before
+    # any trade changes, and each model's UPDATE runs its own subquery once
+    money = selected.get(MoneyTrade, MoneyTrade.objects.none()).values("id")
+    barter = selected.get(BarterTrade, BarterTrade.objects.none()).values("id")
+    with transaction.atomic():
+        owner_ids = set(
+            Pokemon.objects.filter(
+                Q(money_trade_listing__in=money) | Q(barter_trade_listing__in=barter)
+            ).values_list("user_id", flat=True)
+        )
+        reports_updated = TradeReport.objects.filter(
+            Q(money_trade__in=money) | Q(barter_trade__in=barter),
+            status__in=OPEN_REPORT_STATUSES,
+        ).update(**report_changes)
+        money_updated = MoneyTrade.objects.filter(id__in=money).update(**changes)
+        barter_updated = BarterTrade.objects.filter(id__in=barter).update(**changes)
+        audit = ModerationAudit.objects.create(
+            moderator=moderator,
+            action=action,
+            criteria=criteria,
+            reason=reason,
+            admin_notes=notes,
+            money_trades_updated=money_updated,
+            barter_trades_updated=barter_updated,
+            reports_updated=reports_updated,
+        )
+        record_event(
+            "TradeModerated", sorted(owner_ids), action=action, audit_id=audit.id
+        )
+        if owner_ids:
+            invalidate_profile_pages(*owner_ids)
+    return audit
@@ -0,0 +1,195 @@
+"""
+Per-species buy orders matched against money listings.
+
+A BuyOrder is a standing bid for any Pokemon of a species, with its price
+held from the buyer's balance while it is open. Orders and listings cross
+with price-time priority: a new listing sells to the highest open order
+for its species (the oldest among equal prices) at that order's price,
+and a new order buys the cheapest listing at or under its price, at the
+listing's price, refunding the rest of its hold.
+
+Both sides are read down an index (buy_order_book on BuyOrder,
+pokeapi_id/status/amount_asked on MoneyTrade) starting at the best price,
+so a match costs O(log n) in the size of the book plus the few entries
+it actually looks at. An order is claimed by an UPDATE
+conditional on it still being open, and a listing by a DELETE conditional
+on it still being active, so concurrent order flow cannot fill either
+twice.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import BuyOrder, MoneyTrade
+from .sales import hold_funds, release_funds, settle_sale
+
+MAX_OPEN_ORDERS_PER_USER = 50
+# Price levels shown per species
+BOOK_DEPTH = 10
+# Listings a new order reads at a time while looking for one to claim
+LISTINGS_PER_READ = 5
+
+
+class BuyOrderError(ValueError):
+    """The buy order is not valid."""
+
+
+def _claim_listing(listing) -> bool:
+    deleted, _ = MoneyTrade.objects.filter(id=listing.id, status="active").delete()
+    return bool(deleted)
+
+
+def _claim_order(order) -> bool:
+    return bool(
+        BuyOrder.objects.filter(id=order.id, status="open").update(status="filled")
+    )
+
+
+def _fill(order, listing, price):
+    """Sells a claimed listing to a claimed order's buyer at `price`."""
+    history = settle_sale(listing.pokemon, order.user, price, "buy_order", order.id)
+    BuyOrder.objects.filter(id=order.id).update(history=history)
+    order.status, order.history = "filled", history
+    # For the response to whoever created the listing
+    listing.status, listing.sale = "completed", history
+
+
+def _best_orders(pokeapi_id, ask, seller_id, count) -> list[BuyOrder]:
+    """The best `count` open orders for a species paying at least `ask`."""
+    return list(
+        BuyOrder.objects.filter(pokeapi_id=pokeapi_id, status="open", price__gte=ask)
+        .exclude(user_id=seller_id)
+        .select_related("user")
+        .order_by("-price", "created_at")[:count]
+    )
+
+
+def match_listings(listings) -> list[MoneyTrade]:
+    """
+    Sells new active listings of one seller to the best open orders for
+    their species that meet their prices. Call inside the transaction
+    creating the listings. Returns the listings sold.
+
+    Per species in the batch, one seek reads the best orders priced at or
+    above its cheapest ask, as many as it has listings. More are read only
+    when all of those were claimed elsewhere meanwhile.
+    """
+    listings = [listing for listing in listings if listing.status == "active"]
+    if not listings:
+        return []
+    seller_id = listings[0].pokemon.user_id
+    asks, wanted = {}, Counter()
+    for listing in listings:
+        pokeapi_id = listing.pokemon.pokeapi_id
+        asks[pokeapi_id] = min(
+            asks.get(pokeapi_id, listing.amount_asked), listing.amount_asked
+        )
+        wanted[pokeapi_id] += 1
+    book = {
+        pokeapi_id: _best_orders(pokeapi_id, ask, seller_id, wanted[pokeapi_id])
+        for pokeapi_id, ask in asks.items()
+    }
+
+    sold = []
+    for listing in listings:
+        pokeapi_id = listing.pokemon.pokeapi_id
+        orders = book[pokeapi_id]
+        # Best first, so once an order cannot pay the ask no later one can
+        while orders and orders[0].price >= listing.amount_asked:
+            order = orders.pop(0)
+            # The listing is new in this transaction, so nobody else can
+            # claim it; the order may have been filled or cancelled
+            if _claim_order(order):
+                _claim_listing(listing)
+                _fill(order, listing, order.price)
+                sold.append(listing)
+                break
+            if not orders:
+                # Claimed orders are no longer open, so this reads past them
+                orders = book[pokeapi_id] = _best_orders(
+                    pokeapi_id, listing.amount_asked, seller_id, wanted[pokeapi_id]
+                )
+    return sold
+
+
+def place_buy_order(user, data: dict) -> BuyOrder:
+    """
+    Validates {pokeapi_id, price}, holds the price and opens the order,
+    filling it straight away from the cheapest listing at or under it.
+    """
+    pokeapi_id = data.get("pokeapi_id")
+    price = data.get("price")
+    if not isinstance(pokeapi_id, int) or pokeapi_id <= 0:
+        raise BuyOrderError("pokeapi_id must be a positive integer")
+    if not isinstance(price, int) or price <= 0:
+        raise BuyOrderError("price must be a positive integer")
+    if (
+        BuyOrder.objects.filter(user=user, status="open").count()
+        >= MAX_OPEN_ORDERS_PER_USER
+    ):
+        raise BuyOrderError(
+            f"At most {MAX_OPEN_ORDERS_PER_USER} open buy orders per user"
+        )
+
+    with transaction.atomic():
+        if not hold_funds(user.id, price):
+            raise BuyOrderError("You don't have enough money for this order")
+        order = BuyOrder.objects.create(user=user, pokeapi_id=pokeapi_id, price=price)
+
+        candidates = (
+            MoneyTrade.objects.filter(
+                pokeapi_id=pokeapi_id, status="active", amount_asked__lte=price
+            )
+            .exclude(pokemon__user=user)
+            .select_related("pokemon__user")
+            .order_by("amount_asked", "created_at")
+        )
+        # Claimed listings are no longer active, so each read goes past them
+        while order.status == "open":
+            batch = list(candidates[:LISTINGS_PER_READ])
+            if not batch:
+                break
+            for listing in batch:
+                if _claim_listing(listing):
+                    _claim_order(order)
+                    _fill(order, listing, listing.amount_asked)
+                    if listing.amount_asked < price:
+                        release_funds(user.id, price - listing.amount_asked)
+                    break
+    return order
+
+
+def cancel_buy_order(user, order_id) -> BuyOrder:
+    """
+    Cancels one of the user's open orders and releases its hold. Raises
+    BuyOrder.DoesNotExist if the user has no open order with that id.
+    """
+    with transaction.atomic():
+        order = BuyOrder.objects.get(id=order_id, user=user, status="open")
+        if not BuyOrder.objects.filter(id=order.id, status="open").update(
+            status="cancelled"
+        ):
+            raise BuyOrder.DoesNotExist
+        release_funds(user.id, order.price)
+    order.status = "cancelled"
+    return order
+
+
+def order_book(pokeapi_id) -> dict:
+    """The best BOOK_DEPTH price levels on each side of a species' book."""
+    return {
+        "bids": list(
+            BuyOrder.objects.filter(pokeapi_id=pokeapi_id, status="open")
+            .values("price")
+            .annotate(orders=Count("id"))
+            .order_by("-price")[:BOOK_DEPTH]
+        ),
+        "asks": list(
+            MoneyTrade.objects.filter(pokeapi_id=pokeapi_id, status="active")
+            .values(price=F("amount_asked"))
+            .annotate(listings=Count("id"))
+            .order_by("price")[:BOOK_DEPTH]
+        ),
+    }
@@ -0,0 +1,331 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_species_price_version
+from .models import Pokemon, SpeciesPrice, SpeciesPriceBucket, TradeHistory
+from .sharding import shard_aliases
+
+# Number of most recent sales the rolling median and percentiles are taken over
+PRICE_WINDOW = 50
+# Sales needed before the median is trusted over the last price
+MIN_SALES_FOR_MEDIAN = 3
+HISTORY_DAYS = 30
+# Relative move in suggested price that makes cached collection values stale
+MATERIAL_PRICE_CHANGE = 0.1
+MICROSECONDS_PER_DAY = 86_400_000_000
+SALE_DTYPE = [
+    ("pokeapi_id", np.int64),
+    ("amount", np.int64),
+    ("timestamp", "datetime64[us]"),
+]
+# Ids per IN (...) statement, under SQLite's bound-variable limit
+ID_BATCH_SIZE = 500
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _percentile(sorted_prices: list[int], q: float) -> int:
+    """Linear-interpolated percentile, matching numpy's default method."""
+    position = (len(sorted_prices) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_prices) - 1)
+    value = sorted_prices[lower] + (sorted_prices[upper] - sorted_prices[lower]) * (
+        position - lower
+    )
+    return round(value)
+
+
+def _day_start(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _apply_window(stats: SpeciesPrice, window: list[int]):
+    ordered = sorted(window)
+    stats.recent_prices = window
+    stats.median_price = _percentile(ordered, 0.5)
+    stats.p25_price = _percentile(ordered, 0.25)
+    stats.p75_price = _percentile(ordered, 0.75)
+
+
+def record_sale(pokeapi_id: int, amount: int, timestamp) -> SpeciesPrice:
+    """
+    Folds one money sale into the species statistics and its daily bucket.
+
+    Work is bounded by PRICE_WINDOW, independent of how many sales the
+    species has had. Call inside the transaction that records the sale.
+    """
+    with transaction.atomic():
+        stats = (
+            SpeciesPrice.objects.select_for_update()
+            .filter(pokeapi_id=pokeapi_id)
+            .first()
+        )
+        if stats is None:
+            stats = SpeciesPrice(pokeapi_id=pokeapi_id)
+            window = []
+        else:
+            window = list(stats.recent_prices)
+        previous_price = suggested_price(stats) if stats.pk else None
+
+        window = (window + [amount])[-PRICE_WINDOW:]
+        _apply_window(stats, window)
+        stats.last_price = amount
+        stats.last_sale_at = timestamp
+        stats.sale_count += 1
+        stats.total_amount += amount
+        stats.save()
+
+        bucket, created = SpeciesPriceBucket.objects.get_or_create(
+            pokeapi_id=pokeapi_id,
+            bucket_start=_day_start(timestamp),
+            defaults={
+                "sale_count": 1,
+                "total_amount": amount,
+                "min_price": amount,
+                "max_price": amount,
+                "close_price": amount,
+            },
+        )
+        if not created:
+            bucket.sale_count += 1
+            bucket.total_amount += amount
+            bucket.min_price = min(bucket.min_price, amount)
+            bucket.max_price = max(bucket.max_price, amount)
+            bucket.close_price = amount
+            bucket.save()
+
+        new_price = suggested_price(stats)
+        if (
+            previous_price is None
+            or abs(new_price - previous_price) >= MATERIAL_PRICE_CHANGE * previous_price
+        ):
+            transaction.on_commit(lambda: bump_species_price_version(pokeapi_id))
+
+    return stats
+
+
+def suggested_price(stats: SpeciesPrice | None) -> int | None:
+    """Median once there is enough data, otherwise the last traded price."""
+    if stats is None:
+        return None
+    if stats.sale_count >= MIN_SALES_FOR_MEDIAN:
+        return stats.median_price
+    return stats.last_price
+
+
+def format_species_price_data(pokeapi_id: int) -> dict:
+    """Price summary and recent daily series for a species (two indexed reads)."""
+    stats = SpeciesPrice.objects.filter(pokeapi_id=pokeapi_id).first()
+    buckets = SpeciesPriceBucket.objects.filter(pokeapi_id=pokeapi_id).order_by(
+        "-bucket_start"
+    )[:HISTORY_DAYS]
+
+    return {
+        "pokeapi_id": pokeapi_id,
+        "suggested_price": suggested_price(stats),
+        "last_price": stats.last_price if stats else None,
+        "median_price": stats.median_price if stats else None,
+        "p25_price": stats.p25_price if stats else None,
+        "p75_price": stats.p75_price if stats else None,
+        "sale_count": stats.sale_count if stats else 0,
+        "last_sale_at": stats.last_sale_at.isoformat() if stats else None,
+        "history": [
+            {
+                "date": bucket.bucket_start.date().isoformat(),
+                "sale_count": bucket.sale_count,
+                "average_price": bucket.total_amount // bucket.sale_count,
+                "min_price": bucket.min_price,
+                "max_price": bucket.max_price,
+                "close_price": bucket.close_price,
+            }
+            for bucket in reversed(buckets)
+        ],
+    }
+
+
+def backfill_price_index() -> int:
+    """
+    Rebuilds the whole price index from TradeHistory, on every shard, in
+    one pass.
+
+    Sales are loaded into NumPy arrays and grouped by species and by
+    (species, day) with sort + reduceat, so only the final per-species
+    window percentiles need a Python loop. Returns the number of species.
+
+    The history is read and the index upserted in one transaction that
+    first locks the existing SpeciesPrice rows, the rows record_sale locks.
+    A sale committed before the read is in the rebuilt figures, and one
+    still in flight waits and is folded in on top of them, so live sales
+    are never lost.
+    """
+    with transaction.atomic():
+        list(SpeciesPrice.objects.select_for_update().values_list("id"))
+        return _rebuild_price_index()
+
+
+def _bucket_keys(species, days):
+    # One int64 per (species, day since the epoch)
+    return species << 32 | days
+
+
+def _sales():
+    """
+    Yields (pokeapi_id, amount, naive UTC timestamp) for every money sale,
+    shard by shard.
+    """
+    aliases = shard_aliases() or [None]
+    # Sold on one shard and resold since: the Pokemon is on another one
+    moved = []
+    for alias in aliases:
+        rows = (
+            TradeHistory.objects.using(alias)
+            # No pokemon__isnull filter: it would make the join an inner one
+            .filter(amount__gt=0)
+            .order_by("id")
+            .values_list("pokemon_id", "pokemon__pokeapi_id", "amount", "timestamp")
+        )
+        for pokemon_id, pokeapi_id, amount, timestamp in rows.iterator(
+            chunk_size=10000
+        ):
+            if pokemon_id is None:
+                continue
+            # Timestamps come back in UTC; datetime64 holds naive ones
+            if pokeapi_id is None:
+                moved.append((pokemon_id, amount, timestamp.replace(tzinfo=None)))
+            else:
+                yield pokeapi_id, amount, timestamp.replace(tzinfo=None)
+
+    species = {}
+    pokemon_ids = sorted({pokemon_id for pokemon_id, _, _ in moved})
+    for start in range(0, len(pokemon_ids), ID_BATCH_SIZE):
+        for alias in aliases:
+            species.update(
+                Pokemon.objects.using(alias)
+                .filter(id__in=pokemon_ids[start : start + ID_BATCH_SIZE])
+                .values_list("id", "pokeapi_id")
+            )
+    for pokemon_id, amount, timestamp in moved:
+        if pokemon_id in species:
+            yield species[pokemon_id], amount, timestamp
+
+
+def _rebuild_price_index() -> int:
+    sales = np.fromiter(_sales(), dtype=SALE_DTYPE)
+    if not sales.size:
+        # Nothing read is more likely a misconfigured scan than a market
+        # without sales: keep the index rather than wiping it
+        return 0
+    species, amounts = sales["pokeapi_id"], sales["amount"]
+    micros = sales["timestamp"].astype(np.int64)
+
+    # Stable sort by species then time keeps simultaneous sales in read order
+    order = np.lexsort((micros, species))
+    species, amounts, micros = species[order], amounts[order], micros[order]
+
+    stats_objects = []
+    starts = np.flatnonzero(np.r_[True, species[1:] != species[:-1]])
+    ends = np.r_[starts[1:], species.size]
+    totals = np.add.reduceat(amounts, starts)
+
+    for start, end, total in zip(starts, ends, totals):
+        window = amounts[max(start, end - PRICE_WINDOW) : end]
+        p25, median, p75 = np.percentile(window, [25, 50, 75])
+        stats_objects.append(
+            SpeciesPrice(
+                pokeapi_id=int(species[start]),
+                last_price=int(amounts[end - 1]),
+                median_price=round(median),
+                p25_price=round(p25),
+                p75_price=round(p75),
+                sale_count=int(end - start),
+                total_amount=int(total),
+                recent_prices=window.tolist(),
+                last_sale_at=EPOCH + timedelta(microseconds=int(micros[end - 1])),
+            )
+        )
+
+    bucket_objects = []
+    days = micros // MICROSECONDS_PER_DAY
+    boundary = np.r_[True, (species[1:] != species[:-1]) | (days[1:] != days[:-1])]
+    starts = np.flatnonzero(boundary)
+    bucket_species, bucket_days = species[starts], days[starts]
+    ends = np.r_[starts[1:], species.size]
+    counts = ends - starts
+    sums = np.add.reduceat(amounts, starts)
+    minimums = np.minimum.reduceat(amounts, starts)
+    maximums = np.maximum.reduceat(amounts, starts)
+    closes = amounts[ends - 1]
+
+    for i, start in enumerate(starts):
+        bucket_objects.append(
+            SpeciesPriceBucket(
+                pokeapi_id=int(species[start]),
+                bucket_start=EPOCH + timedelta(days=int(days[start])),
+                sale_count=int(counts[i]),
+                total_amount=int(sums[i]),
+                min_price=int(minimums[i]),
+                max_price=int(maximums[i]),
+                close_price=int(closes[i]),
+            )
+        )
+
+    started = timezone.now()
+    SpeciesPrice.objects.bulk_create(
+        stats_objects,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["pokeapi_id"],
+        update_fields=[
+            "last_price",
+            "median_price",
+            "p25_price",
+            "p75_price",
+            "sale_count",
+            "total_amount",
+            "recent_prices",
+            "last_sale_at",
+            "updated_at",
+        ],
+    )
+    SpeciesPriceBucket.objects.bulk_create(
+        bucket_objects,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["pokeapi_id", "bucket_start"],
+        update_fields=[
+            "sale_count",
+            "total_amount",
+            "min_price",
+            "max_price",
+            "close_price",
+        ],
+    )
+    # Rows the history no longer accounts for, e.g. after it was pruned:
+    # species not upserted above, and buckets for days without sales
+    SpeciesPrice.objects.filter(updated_at__lt=started).delete()
+    buckets = np.fromiter(
+        (
+            (bucket_id, pokeapi_id, bucket_start.replace(tzinfo=None))
+            for bucket_id, pokeapi_id, bucket_start in (
+                SpeciesPriceBucket.objects.values_list(
+                    "id", "pokeapi_id", "bucket_start"
+                ).iterator(chunk_size=10000)
+            )
+        ),
+        dtype=[("id", np.int64), ("pokeapi_id", np.int64), ("day", "datetime64[D]")],
+    )
+    stale = buckets["id"][
+        ~np.isin(
+            _bucket_keys(buckets["pokeapi_id"], buckets["day"].astype(np.int64)),
+            _bucket_keys(bucket_species, bucket_days),
+        )
+    ].tolist()
+    for start in range(0, len(stale), ID_BATCH_SIZE):
+        SpeciesPriceBucket.objects.filter(
+            id__in=stale[start : start + ID_BATCH_SIZE]
+        ).delete()
+
+    return len(stats_objects)
@@ -0,0 +1,75 @@
+"""
+Token-bucket rate limits for expensive endpoints.
+
+settings.RATE_LIMITS maps a URL name to (requests, seconds, scope): a
+bucket of `requests` tokens refilled evenly over `seconds`, one bucket per
+route and per user ("user" scope) or per client IP ("ip" scope, and
+anonymous requests to "user" routes). Behind a reverse proxy every
+request's REMOTE_ADDR is the proxy's, so set RATE_LIMIT_CLIENT_IP_HEADER to
+the header the proxy puts the client's address in.
+
+A bucket is a RateLimitBucket row on the primary database holding the time
+it will be full again (the generic cell rate algorithm), so every worker
+sees the same buckets. A token is taken by one UPDATE conditional on the
+bucket still having one, so concurrent requests can never take more tokens
+than there are. A check is that one UPDATE while the bucket has room, and
+one SELECT more when it has not. Full buckets are the same as missing ones
+and are deleted whenever a new bucket is created.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Value
+from django.db.models.functions import Greatest
+
+from .models import RateLimitBucket
+
+SCOPES = ("user", "ip")
+
+
+def client_ip(request) -> str:
+    """
+    REMOTE_ADDR, or the address the proxy appended last to the
+    RATE_LIMIT_CLIENT_IP_HEADER header when one is configured. Earlier
+    entries of an X-Forwarded-For header come from the client.
+    """
+    header = settings.RATE_LIMIT_CLIENT_IP_HEADER
+    if header:
+        address = request.headers.get(header, "").rsplit(",", 1)[-1].strip()
+        if address:
+            return address
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def bucket_key(url_name, request, scope) -> str:
+    if scope == "user":
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"ratelimit:{url_name}:user:{user.id}"
+    return f"ratelimit:{url_name}:ip:{client_ip(request)}"
+
+
+def take_token(key, requests, seconds, now=None) -> float:
+    """
+    Takes a token from the bucket at `key`. Returns 0 if one was free, else
+    the seconds until one will be.
+    """
+    now = time.time() if now is None else now
+    interval = seconds / requests
+    # Replicas lag behind the writes below
+    buckets = RateLimitBucket.objects.using(DEFAULT_DB_ALIAS)
+    while True:
+        if buckets.filter(key=key, full_at__lte=now + seconds - interval).update(
+            full_at=Greatest("full_at", Value(now)) + interval
+        ):
+            return 0.0
+        full_at = buckets.filter(key=key).values_list("full_at", flat=True).first()
+        if full_at is not None:
+            return full_at + interval - seconds - now
+        # A new bucket starts full; another request may be creating it too
+        buckets.filter(full_at__lt=now).delete()
+        buckets.bulk_create(
+            [RateLimitBucket(key=key, full_at=now)], ignore_conflicts=True
+        )
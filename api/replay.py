@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
+
+from .loadtest import LatencyRecorder, SessionClient, url_name_for
+from .middleware import REDACTED
+
+# Views that need credentials the trace does not keep, or that would end the
+# session replayed users are logged in with
+SKIPPED_VIEWS = {
+    "login",
+    "logout",
+    "signup",
+    "password_reset",
+    "password_reset_confirm",
+    "admin:login",
+    "admin:logout",
+}
+
+
+def load_trace(path) -> list[dict]:
+    """Reads a trace and its rotated backups (path.1, path.2, ...) in time order."""
+    path = Path(path)
+    files = [path] + [
+        backup
+        for backup in path.parent.glob(path.name + ".*")
+        if backup.suffix[1:].isdigit()
+    ]
+    entries = []
+    for file in files:
+        with open(file) as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+def build_request(entry):
+    """Returns (method, path, payload) for a trace entry and a skip reason, if any."""
+    if entry["view"] in SKIPPED_VIEWS:
+        return None, "authentication view"
+    if REDACTED in entry["kwargs"].values():
+        return None, "redacted URL parameter"
+    try:
+        path = reverse(entry["view"], kwargs=entry["kwargs"])
+    except NoReverseMatch:
+        return None, "route no longer exists"
+    if entry["query"]:
+        path += "?" + urlencode(entry["query"], doseq=True)
+    return (entry["method"], path, entry["body"]), None
+
+
+def logged_in_client(user) -> SessionClient:
+    """A client holding a fresh session for `user`, as force_login would create."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    client = SessionClient()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return client
+
+
+class ReplayResult:
+    def __init__(self):
+        # Latency as recorded in production and as measured now, for the
+        # same set of requests
+        self.recorded = LatencyRecorder()
+        self.replayed = LatencyRecorder()
+        self.skipped = Counter()
+        self.status_changes = Counter()
+        self.recorded_elapsed = 0.0
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+
+
+def replay(entries, driver, speed=1.0, concurrency=16) -> ReplayResult:
+    """
+    Re-issues trace entries in recorded order as the users who made them.
+
+    With speed > 0 each request is sent at its original offset divided by
+    `speed` from a pool of `concurrency` threads, so overlapping requests
+    overlap again. Speed 0 sends them back to back on one thread, which
+    makes a replay against a restored snapshot fully deterministic.
+    """
+    result = ReplayResult()
+    lock = threading.Lock()
+
+    user_ids = {entry["user_id"] for entry in entries if entry["user_id"]}
+    users = User.objects.in_bulk(user_ids)
+    clients = {}
+    requests = []
+    for entry in entries:
+        request, reason = build_request(entry)
+        if request and entry["user_id"] and entry["user_id"] not in users:
+            request, reason = None, "user missing from database"
+        if request is None:
+            result.skipped[reason] += 1
+            continue
+        if entry["user_id"] and entry["user_id"] not in clients:
+            clients[entry["user_id"]] = logged_in_client(users[entry["user_id"]])
+        requests.append((entry, request))
+
+    if not requests:
+        return result
+    first_ts = requests[0][0]["ts"]
+    last = requests[-1][0]
+    result.recorded_elapsed = max(
+        last["ts"] + last["duration_ms"] / 1000 - first_ts, 0.001
+    )
+
+    def send(entry, request):
+        client = clients.get(entry["user_id"]) or SessionClient()
+        method, path, payload = request
+        start = time.perf_counter()
+        response = driver.request(client, method, path, payload)
+        elapsed = time.perf_counter() - start
+        client.store_cookies(response.headers)
+        url_name = url_name_for(path)
+        with lock:
+            result.replayed.record(url_name, response.status, elapsed)
+            result.recorded.record(
+                url_name, entry["status"], entry["duration_ms"] / 1000
+            )
+            if response.status != entry["status"]:
+                result.status_changes[url_name] += 1
+
+    start = time.perf_counter()
+    if speed <= 0:
+        for entry, request in requests:
+            send(entry, request)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = []
+            for entry, request in requests:
+                due = start + (entry["ts"] - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    result.max_lag = max(result.max_lag, -delay)
+                futures.append(pool.submit(send, entry, request))
+            for future in futures:
+                future.result()
+    result.elapsed = time.perf_counter() - start
+    return result
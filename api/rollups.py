@@ -0,0 +1,150 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+
+from .models import Checkpoint, TradeHistory, TradeRollup
+from .sharding import shard_aliases
+
+ROLLUP_CHECKPOINT = "trade_rollups"
+
+GRANULARITIES = {
+    "hour": (TruncHour, timedelta(hours=1)),
+    "day": (TruncDay, timedelta(days=1)),
+}
+
+ROLLUP_FIELDS = [
+    "trade_count",
+    "money_trade_count",
+    "barter_trade_count",
+    "money_moved",
+    "unique_buyers",
+    "unique_sellers",
+]
+
+
+def _truncate(timestamp, granularity):
+    """Returns the start of the bucket containing `timestamp`."""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _history(alias, granularity, start, end):
+    trunc, _ = GRANULARITIES[granularity]
+    return (
+        TradeHistory.objects.using(alias)
+        .filter(timestamp__gte=start, timestamp__lt=end)
+        .annotate(bucket=trunc("timestamp"))
+    )
+
+
+def _rebuild_buckets(granularity, start, end):
+    """
+    Recomputes every bucket of one granularity between start and end, from
+    the history on every shard. Counts and sums add up across shards;
+    distinct buyers and sellers are collected per bucket instead.
+    """
+    aliases = shard_aliases() or [None]
+    buckets = defaultdict(Counter)
+    for alias in aliases:
+        # Every other trade_type (money, auction, buy_order) is a sale for money
+        for row in (
+            _history(alias, granularity, start, end)
+            .values("bucket")
+            .annotate(
+                trade_count=Count("id"),
+                money_trade_count=Count("id", filter=~Q(trade_type="barter")),
+                barter_trade_count=Count("id", filter=Q(trade_type="barter")),
+                money_moved=Sum("amount"),
+                unique_buyers=Count("buyer", distinct=True),
+                unique_sellers=Count("seller", distinct=True),
+            )
+        ):
+            bucket = buckets[row.pop("bucket")]
+            bucket.update({field: value or 0 for field, value in row.items()})
+    if len(aliases) > 1:
+        for field, column in (
+            ("unique_buyers", "buyer_id"),
+            ("unique_sellers", "seller_id"),
+        ):
+            users = defaultdict(set)
+            for alias in aliases:
+                for bucket, user_id in (
+                    _history(alias, granularity, start, end)
+                    .values_list("bucket", column)
+                    .distinct()
+                ):
+                    users[bucket].add(user_id)
+            for bucket, user_ids in users.items():
+                buckets[bucket][field] = len(user_ids)
+
+    rollups = [
+        TradeRollup(
+            granularity=granularity,
+            bucket_start=bucket_start,
+            **{field: totals[field] for field in ROLLUP_FIELDS},
+        )
+        for bucket_start, totals in buckets.items()
+    ]
+    TradeRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=["granularity", "bucket_start"],
+        update_fields=ROLLUP_FIELDS + ["updated_at"],
+    )
+    return len(rollups)
+
+
+def refresh_trade_rollups(batch_size=5000) -> int:
+    """
+    Folds TradeHistory rows added since the last run into the rollup tables.
+
+    Only buckets touched by new rows are recomputed, so a refresh costs the
+    same no matter how much history already exists. Each shard's history
+    has its own checkpoint, as shards number their rows in separate id
+    ranges. Returns the number of TradeHistory rows consumed.
+    """
+    processed = 0
+    for alias in shard_aliases() or [None]:
+        name = f"{ROLLUP_CHECKPOINT}:{alias}" if alias else ROLLUP_CHECKPOINT
+        while True:
+            with transaction.atomic():
+                checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(
+                    name=name
+                )
+                batch = list(
+                    TradeHistory.objects.using(alias)
+                    .filter(id__gt=checkpoint.position)
+                    .order_by("id")
+                    .values_list("id", "timestamp")[:batch_size]
+                )
+                if not batch:
+                    break
+
+                timestamps = [timestamp for _, timestamp in batch]
+                for granularity, (_, width) in GRANULARITIES.items():
+                    start = _truncate(min(timestamps), granularity)
+                    end = _truncate(max(timestamps), granularity) + width
+                    _rebuild_buckets(granularity, start, end)
+
+                checkpoint.position = batch[-1][0]
+                checkpoint.save()
+                processed += len(batch)
+    return processed
+
+
+def rollup_summary(granularity, since) -> list[dict]:
+    """Returns rollup buckets of the given granularity newer than `since`."""
+    buckets = TradeRollup.objects.filter(
+        granularity=granularity, bucket_start__gte=_truncate(since, granularity)
+    ).order_by("bucket_start")
+    return [
+        {
+            "bucket_start": bucket.bucket_start.isoformat(),
+            **{field: getattr(bucket, field) for field in ROLLUP_FIELDS},
+        }
+        for bucket in buckets
+    ]
@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .sharding import (
+    SHARD_KEYS,
+    SHARD_LOCAL,
+    current_shard,
+    shard_aliases,
+    shard_for_user,
+)
+
+# Replica alias chosen for the request being handled, if it may read from one
+_read_alias = ContextVar("read_alias", default=None)
+
+# Always read from the primary: sessions are created by a write on one
+# request and read on the very next one
+PRIMARY_ONLY_APPS = {"sessions"}
+
+
+def replica_aliases() -> list[str]:
+    return getattr(settings, "DATABASE_READ_REPLICAS", [])
+
+
+@contextmanager
+def reading_from(alias):
+    """Routes reads in this context to `alias` (None for the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads made while handling a read-only request to the replica
+    ReplicaRoutingMiddleware picked for it. Everything else, including reads
+    inside a transaction on the primary, goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        # Reads that feed a write must see the primary's current state
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copied from the primary by sync_replicas
+        return db == DEFAULT_DB_ALIAS
+
+
+class ShardRouter:
+    """
+    Places user-owned rows on the shard their owner hashes to. Users and
+    everything not user-owned stay on the default database; users are
+    mirrored to every shard so foreign keys hold there. Inactive unless
+    DATABASE_SHARDS is set.
+    """
+
+    def _shard(self, model, instance):
+        if not shard_aliases():
+            return None
+        label = model._meta.label_lower
+        if label not in SHARD_KEYS and label not in SHARD_LOCAL:
+            return None
+        # Assigning a related row passes that row as the hint: stay with it
+        if (
+            instance is not None
+            and not isinstance(instance, model)
+            and instance._state.db in shard_aliases()
+        ):
+            return instance._state.db
+        if isinstance(instance, model):
+            if instance._state.db in shard_aliases():
+                return instance._state.db
+            if label in SHARD_KEYS:
+                return shard_for_user(getattr(instance, SHARD_KEYS[label]))
+            # Follow a related row already loaded from a shard
+            for related in instance._state.fields_cache.values():
+                db = getattr(getattr(related, "_state", None), "db", None)
+                if db in shard_aliases():
+                    return db
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not shard_aliases():
+            return None
+        # Users exist everywhere; anything else must share a database
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards carry the full schema so mirrored users satisfy foreign keys
+        return True if db in shard_aliases() else None
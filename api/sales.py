@@ -0,0 +1,119 @@
+"""
+Money movement shared by fixed-price sales and auctions.
+
+Balances change with conditional UPDATEs on Profile.money, so two requests
+spending the same money cannot both succeed. settle_sale is the one path
+that hands a sold Pokemon over: it credits the seller, moves the Pokemon
+and writes TradeHistory, the species price index, the PokemonSold event
+and both parties' notifications.
+
+With DATABASE_SHARDS set the seller's and buyer's rows can be on different
+shards: the Pokemon is handed over with move_pokemon, each balance and
+notification goes to its owner's shard, and sale_atomic spans them all.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .cache import invalidate_balances, invalidate_valuations
+from .events import record_event
+from .factories import notification_factory
+from .models import Notification, Profile, TradeHistory
+from .pricing import record_sale
+from .sharding import (
+    bulk_create_on_owner_shards,
+    cross_shard_atomic,
+    move_pokemon,
+    shard_aliases,
+    shard_for_user,
+    shard_of,
+)
+
+
+class SaleError(ValueError):
+    """The sale can't go ahead; its transaction is rolled back."""
+
+
+def sale_atomic(pokemon, buyer):
+    """
+    The transaction a sale runs in: the seller's shard, the buyer's and the
+    default database (for the price index), or just the one database.
+    """
+    return cross_shard_atomic(
+        shard_of(pokemon),
+        shard_for_user(buyer.id),
+        DEFAULT_DB_ALIAS if shard_aliases() else None,
+    )
+
+
+def hold_funds(user_id, amount) -> bool:
+    """Takes `amount` from the user's balance if it covers it."""
+    held = (
+        Profile.objects.using(shard_for_user(user_id))
+        .filter(user_id=user_id, money__gte=amount)
+        .update(money=F("money") - amount)
+    )
+    if held:
+        invalidate_balances(user_id)
+    return bool(held)
+
+
+def release_funds(user_id, amount):
+    """Gives held money back, or pays it to a seller."""
+    Profile.objects.using(shard_for_user(user_id)).filter(user_id=user_id).update(
+        money=F("money") + amount
+    )
+    invalidate_balances(user_id)
+
+
+def settle_sale(pokemon, buyer, amount, trade_type, trade_ref_id) -> TradeHistory:
+    """
+    Completes the sale of `pokemon` (with its user loaded) to `buyer`, whose
+    `amount` must already be held. Call inside sale_atomic.
+    """
+    seller = pokemon.user
+    release_funds(seller.id, amount)
+    pokemon = move_pokemon(pokemon, buyer)
+
+    # Next to the Pokemon, on the buyer's shard
+    history = TradeHistory.objects.using(shard_of(pokemon)).create(
+        buyer=buyer,
+        seller=seller,
+        pokemon_id=pokemon.id,
+        amount=amount,
+        trade_type=trade_type,
+        trade_ref_id=trade_ref_id,
+    )
+    record_sale(pokemon.pokeapi_id, amount, history.timestamp)
+    record_event(
+        "PokemonSold",
+        [buyer.id, seller.id],
+        pokemon_id=pokemon.id,
+        trade_type=trade_type,
+        trade_id=trade_ref_id,
+        history_id=history.id,
+        amount=amount,
+    )
+
+    bulk_create_on_owner_shards(
+        Notification,
+        [
+            notification_factory.create_notification(
+                user=seller,
+                message=(
+                    f"Your Pokémon {pokemon.name} was sold to "
+                    f"{buyer.username} for ${amount}."
+                ),
+                link=f"/pokemon/{pokemon.id}",
+            ),
+            notification_factory.create_notification(
+                user=buyer,
+                message=(
+                    f"You bought {pokemon.name} from {seller.username} for ${amount}."
+                ),
+                link=f"/pokemon/{pokemon.id}",
+            ),
+        ],
+    )
+    transaction.on_commit(lambda: invalidate_valuations(buyer.id, seller.id))
+    return history
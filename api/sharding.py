@@ -0,0 +1,224 @@
+import copy
+import hashlib
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .cache import invalidate_profile_pages
+from .models import (
+    BarterTrade,
+    MoneyTrade,
+    Pokemon,
+    ShardTransaction,
+    TradeRequest,
+    UserShard,
+)
+
+# Shard every query for a shard-local model goes to when no hint says otherwise
+_current_shard = ContextVar("current_shard", default=None)
+
+# Models placed by the hash of their owner's user id -> owner id field
+SHARD_KEYS = {
+    "api.profile": "user_id",
+    "api.pokemon": "user_id",
+    "api.notification": "user_id",
+    "api.traderequest": "receiver_id",
+}
+# Models with foreign keys into the sharded tables. They live next to the
+# rows they point at, so they follow related instances or the current shard.
+SHARD_LOCAL = {
+    "api.moneytrade",
+    "api.bartertrade",
+    "api.tradehistory",
+    "api.tradereport",
+    "api.barterindexentry",
+    "api.barterproposal",
+    "api.barterproposalleg",
+    "api.domainevent",
+    "api.auction",
+    "api.auctionbid",
+    "api.buyorder",
+}
+# Offset between shards' id sequences, so a row keeps its id when moved
+SHARD_ID_SPACE = 1 << 40
+
+
+def shard_aliases() -> list[str]:
+    return getattr(settings, "DATABASE_SHARD_ALIASES", [])
+
+
+def shard_for_user(user_id) -> str | None:
+    """Stable placement: blake2b of the user id, modulo the shard count."""
+    shards = shard_aliases()
+    if not shards or user_id is None:
+        return None
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return shards[int.from_bytes(digest, "big") % len(shards)]
+
+
+def shard_for_username(username) -> str | None:
+    """Resolves a username through the global directory, without touching auth."""
+    if not shard_aliases():
+        return None
+    entry = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(username=username).first()
+    return entry.shard if entry else None
+
+
+def shard_of(instance) -> str | None:
+    """The shard a loaded row lives on; None when unsharded, for the routers."""
+    return instance._state.db if shard_aliases() else None
+
+
+def get_on_any_shard(queryset, **lookup):
+    """
+    Gets a row of a shard-placed model wherever it lives. Rows keep their id
+    when moved between shards, so the id doesn't say which shard holds one:
+    the current shard is tried first, then the others.
+    """
+    shards = shard_aliases()
+    if not shards:
+        return queryset.get(**lookup)
+    for alias in sorted(shards, key=lambda alias: alias != current_shard()):
+        try:
+            return queryset.using(alias).get(**lookup)
+        except queryset.model.DoesNotExist:
+            pass
+    raise queryset.model.DoesNotExist(f"No {queryset.model.__name__} on any shard")
+
+
+def bulk_create_on_owner_shards(model, objs, owner_field=None):
+    """
+    Bulk-creates rows on their owners' shards, one INSERT per shard. Models
+    in SHARD_KEYS know their owner field; shard-local ones name it.
+    """
+    owner_field = owner_field or SHARD_KEYS[model._meta.label_lower]
+    by_shard = {}
+    for obj in objs:
+        by_shard.setdefault(shard_for_user(getattr(obj, owner_field)), []).append(obj)
+    for alias, group in by_shard.items():
+        model.objects.using(alias).bulk_create(group)
+
+
+@contextmanager
+def on_shard(alias):
+    """Sends unhinted queries for shard-local models to `alias`."""
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def current_shard() -> str | None:
+    return _current_shard.get()
+
+
+def mirror_saved_user(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and shard_aliases():
+        mirror_user(instance)
+
+
+def mirror_user(user):
+    """Copies a user row to every shard and records it in the directory."""
+    for alias in shard_aliases():
+        User.objects.using(alias).bulk_create(
+            [copy.copy(user)],
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[
+                field.name
+                for field in User._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user.id,
+        defaults={"username": user.username, "shard": shard_for_user(user.id)},
+    )
+
+
+@contextmanager
+def cross_shard_atomic(*aliases):
+    """
+    One transaction per shard, committed together.
+
+    Shards are entered in sorted order, so two cross-shard operations never
+    wait on each other's locks in opposite order. A ShardTransaction row on
+    the default database tracks the attempt: "prepared" once the body has
+    succeeded and before the first shard commits, "committed" after the
+    last. A crash between shard commits leaves it "prepared" for
+    recover_shard_transactions to report. With a single database (None
+    standing for the default) it is a plain atomic block and nothing is
+    logged.
+    """
+    aliases = sorted({alias or DEFAULT_DB_ALIAS for alias in aliases})
+    if len(aliases) == 1:
+        with transaction.atomic(using=aliases[0]):
+            yield None
+        return
+    log = ShardTransaction.objects.using(DEFAULT_DB_ALIAS).create(shards=aliases)
+    try:
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            yield log
+            log.status = "prepared"
+            log.save(using=DEFAULT_DB_ALIAS, update_fields=["status", "updated_at"])
+    except BaseException:
+        log.status = "aborted"
+        log.save(using=DEFAULT_DB_ALIAS, update_fields=["status", "updated_at"])
+        raise
+    log.status = "committed"
+    log.save(using=DEFAULT_DB_ALIAS, update_fields=["status", "updated_at"])
+
+
+def _drop_listings(pokemon, alias):
+    MoneyTrade.objects.using(alias).filter(pokemon=pokemon).delete()
+    BarterTrade.objects.using(alias).filter(pokemon=pokemon).delete()
+
+
+def move_pokemon(pokemon, new_owner):
+    """
+    Hands a Pokemon to another user, moving its row to their shard.
+
+    The id is kept (ids are unique across shards, see init_shards), so
+    history rows pointing at it stay valid. Its listings and the pending
+    trade requests for it on either shard are removed; requests held on
+    other shards fail the ownership check when answered.
+    """
+    source = shard_of(pokemon)
+    target = shard_for_user(new_owner.id) or source
+    old_owner_id = pokemon.user_id
+    if source == target:
+        # No savepoint: this is one step of the caller's transaction
+        with transaction.atomic(using=source, savepoint=False):
+            _drop_listings(pokemon, source)
+            pokemon.user = new_owner
+            pokemon.save(using=source, update_fields=["user"])
+        moved = pokemon
+    else:
+        with cross_shard_atomic(source, target):
+            _drop_listings(pokemon, source)
+            for alias in (source, target):
+                TradeRequest.objects.using(alias).filter(
+                    Q(sender_pokemon_id=pokemon.id) | Q(receiver_pokemon_id=pokemon.id),
+                    status="pending",
+                ).delete()
+            # A plain DELETE, not the ORM's: history rows keep pointing at the id
+            with connections[source].cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Pokemon._meta.db_table} WHERE id = %s", [pokemon.id]
+                )
+            moved = copy.copy(pokemon)
+            moved._state = copy.copy(pokemon._state)
+            moved._state.adding, moved._state.db = True, None
+            moved.user = new_owner
+            moved.offered_in_trade = None
+            moved.save(using=target, force_insert=True)
+    # Both shards have committed
+    invalidate_profile_pages(old_owner_id, new_owner.id)
+    return moved
@@ -1,3 +1,2581 @@
-from django.test import TestCase
+import json
+import logging
+import random
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import addModuleCleanup, mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Count, F, Q, Sum
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+
+from pokemon.db import DATABASE_PROFILES
+
+from . import events, orders
+from . import urls as api_urls
+from .atlases import ATLAS_TILE_SIZE, atlas_root, collection_atlas, render_atlases
+from .auctions import AuctionError, close_expired_auctions, place_bid, top_bids
+from .barter import index_barter_listings
+from .expiry import expire_stale
+from .fraud import VELOCITY_LIMIT, detect_fraud
+from .loadtest import (
+    FLOW_WEIGHTS,
+    LatencyRecorder,
+    VirtualUser,
+    WSGIDriver,
+    compare_results,
+    run_flow,
+    summarize,
+)
+from .middleware import (
+    DUPLICATE_QUERY_THRESHOLD,
+    PRIMARY_PIN_COOKIE,
+    REDACTED,
+    ReplicaRoutingMiddleware,
+    RequestMetrics,
+    ShardMiddleware,
+    fingerprint_sql,
+    route_metrics,
+)
+from .models import (
+    Auction,
+    AuctionBid,
+    BarterProposal,
+    BarterProposalLeg,
+    BarterTrade,
+    BuyOrder,
+    Checkpoint,
+    DomainEvent,
+    ModerationAudit,
+    MoneyTrade,
+    Notification,
+    Pokemon,
+    Profile,
+    RateLimitBucket,
+    ShardTransaction,
+    SpeciesPrice,
+    SpeciesPriceBucket,
+    TradeEdge,
+    TradeHistory,
+    TradeReport,
+    TradeRequest,
+    TradeRollup,
+    UserShard,
+    WishlistAlert,
+)
+from .orders import BuyOrderError, cancel_buy_order, place_buy_order
+from .pricing import (
+    PRICE_WINDOW,
+    backfill_price_index,
+    format_species_price_data,
+    record_sale,
+)
+from .ratelimit import take_token
+from .replay import replay
+from .rollups import GRANULARITIES, refresh_trade_rollups
+from .routers import ReadReplicaRouter, reading_from
+from .sharding import (
+    SHARD_ID_SPACE,
+    cross_shard_atomic,
+    move_pokemon,
+    shard_for_user,
+    shard_for_username,
+)
+from .thumbnails import species_thumbnail
+from .valuation import get_valuation
+
+SMALL_SCALE = 2
+LARGE_SCALE = 25
+
+# case id -> (max queries, max response KB at small scale, at large scale).
+# A case id is a URL name, optionally followed by ":variant". Rate-limited
+# routes include 5 queries creating the client's token bucket.
+QUERY_BUDGETS = {
+    "index": (0, 1, 1),
+    "login": (10, 1, 1),
+    "logout": (4, 1, 1),
+    "signup": (9, 1, 1),
+    "password_reset": (6, 1, 1),
+    "user": (3, 1, 1),
+    "admin_dashboard": (7, 2, 2),
+    "manage_trade": (7, 1, 1),
+    "bulk_manage_trades": (9, 1, 1),
+    "manage_report": (4, 1, 1),
+    "list_reports": (5, 2, 8),
+    "trade_activity": (4, 2, 12),
+    "trade_activity:summary": (3, 1, 1),
+    "request_metrics": (2, 1, 1),
+    "user profile": (8, 3, 24),
+    "user_valuation": (2, 1, 1),
+    "pokemon_detail": (5, 1, 1),
+    "create_money_trade": (32, 1, 1),
+    "create_barter_trade": (14, 1, 1),
+    "cancel_trade": (10, 1, 1),
+    "bulk_create_money_trades": (30, 1, 1),
+    "bulk_create_barter_trades": (12, 1, 1),
+    "bulk_cancel_trades": (9, 1, 1),
+    "barter_proposals": (4, 1, 1),
+    "species_price": (2, 1, 1),
+    "species_order_book": (2, 1, 1),
+    "buy_orders": (3, 1, 1),
+    "create_buy_order": (30, 1, 1),
+    "cancel_buy_order": (7, 1, 1),
+    "species_thumbnail": (1, 1, 1),
+    "thumbnail": (0, 16, 16),
+    "atlas": (0, 64, 64),
+    "buy_pokemon": (26, 1, 1),
+    "create_auction": (10, 1, 1),
+    "auctions": (1, 2, 16),
+    "auction_detail": (2, 2, 2),
+    "bid_on_auction": (10, 1, 1),
+    "filter_marketplace": (10, 4, 32),
+    "trade_history": (3, 2, 12),
+    "featured_pokemon": (6, 1, 1),
+    "notifications": (3, 1, 8),
+    "notifications_read": (3, 1, 1),
+    "wishlist": (3, 1, 1),
+    "add_wishlist_alert": (4, 1, 1),
+    "delete_wishlist_alert": (4, 1, 1),
+    "send_trade": (9, 1, 1),
+    "respond_trade": (17, 1, 1),
+    "incoming_trades": (3, 3, 24),
+    "incoming-trades-pokemon": (4, 1, 8),
+    "user_profile": (4, 1, 8),
+    "my_pokemon": (3, 1, 4),
+    "chatbot_chat": (5, 1, 1),
+    "password_reset_confirm": (5, 1, 1),
+    "password_reset_complete": (0, 4, 4),
+    "submit_trade_report": (4, 1, 1),
+    "trade_detail": (1, 1, 1),
+}
+
+
+def setUpModule():
+    # Tests that don't pick their own THUMBNAIL_ROOT (the atlas budget case
+    # renders a sheet) still keep out of the working tree
+    thumbnail_dir = tempfile.TemporaryDirectory()
+    addModuleCleanup(thumbnail_dir.cleanup)
+    thumbnails = override_settings(THUMBNAIL_ROOT=thumbnail_dir.name)
+    thumbnails.enable()
+    addModuleCleanup(thumbnails.disable)
+
+
+def fake_pokeapi_pokemon():
+    """Stand-in for a pokebase response so signup never touches the network."""
+    return SimpleNamespace(
+        id=25,
+        name="pikachu",
+        sprites=SimpleNamespace(other=SimpleNamespace(), front_default=None),
+        types=[SimpleNamespace(type=SimpleNamespace(name="electric"))],
+    )
+
+
+def sprite_png(size=475):
+    """A local stand-in for official artwork: noise on a transparent border."""
+    noise = random.Random(size).randbytes(size * size // 4 * 3)
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    image.paste(Image.frombytes("RGB", (size // 2, size // 2), noise), (size // 4,) * 2)
+    out = BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def fake_sprite_response(url, **kwargs):
+    response = mock.Mock(content=sprite_png())
+    response.raise_for_status.return_value = None
+    return response
+
+
+def fake_chatbot_response(*args, **kwargs):
+    response = mock.Mock()
+    response.json.return_value = [{"generated_text": "Pikachu is electric."}]
+    return response
+
+
+def create_pokemon(user, pokeapi_id, count=1):
+    return Pokemon.objects.bulk_create(
+        Pokemon(
+            user=user,
+            pokeapi_id=pokeapi_id,
+            name=f"species-{pokeapi_id}",
+            rarity=pokeapi_id % 5 + 1,
+            image_url=f"https://example.com/{pokeapi_id}.png",
+            types=["fire", "flying"],
+        )
+        for _ in range(count)
+    )
+
+
+def seed_traders(count, offset, alice, alice_target, bob_target, auction=None):
+    """
+    Adds `count` ordinary traders with collections, listings, history,
+    reports and trade requests pointing at the fixed actors' Pokemon, and
+    a bid from each on `auction`. Every per-row relation an endpoint might
+    walk grows with `count`.
+    """
+    for i in range(offset, offset + count):
+        trader = User.objects.create_user(f"trader{i}", email=f"trader{i}@x.com")
+        Profile.objects.create(user=trader, money=1000)
+        pokemon = create_pokemon(trader, i % 150 + 1, count=6)
+        money = MoneyTrade.objects.create(pokemon=pokemon[0], amount_asked=50 + i)
+        barter = BarterTrade.objects.create(
+            pokemon=pokemon[1], trade_preferences="anything"
+        )
+        TradeHistory.objects.create(
+            buyer=trader,
+            seller=alice,
+            pokemon=pokemon[2],
+            amount=10 + i,
+            trade_type="money",
+        )
+        TradeHistory.objects.create(
+            buyer=alice,
+            seller=trader,
+            pokemon=pokemon[3],
+            amount=0,
+            trade_type="barter",
+        )
+        TradeReport.objects.create(reporter=trader, reason="spam", money_trade=money)
+        TradeReport.objects.create(reporter=trader, reason="spam", barter_trade=barter)
+        Notification.objects.create(user=alice, message=f"hello {i}")
+        # Every trader hears about alice's charmanders; one wants something else
+        WishlistAlert.objects.create(
+            user=trader, pokeapi_id=4, max_price=1000, match_key="species:4"
+        )
+        WishlistAlert.objects.create(
+            user=trader, pokemon_type="ice", match_key="type:ice"
+        )
+        alice_extra = create_pokemon(alice, i % 150 + 1)[0]
+        MoneyTrade.objects.create(pokemon=alice_extra, amount_asked=200 + i)
+        TradeRequest.objects.create(
+            sender=trader,
+            receiver=alice,
+            sender_pokemon=pokemon[4],
+            receiver_pokemon=alice_target,
+        )
+        TradeRequest.objects.create(
+            sender=trader,
+            receiver=alice,
+            sender_pokemon=pokemon[5],
+            receiver_pokemon=bob_target,
+        )
+        Auction.objects.create(
+            pokemon=pokemon[2],
+            seller=trader,
+            starting_price=20 + i,
+            ends_at=timezone.now() + timedelta(days=1),
+        )
+        BuyOrder.objects.create(user=trader, pokeapi_id=4, price=1)
+        if auction is not None:
+            AuctionBid.objects.create(auction=auction, bidder=trader, amount=100 + i)
+            Auction.objects.filter(id=auction.id).update(
+                current_bid=100 + i, leader=trader, bid_count=F("bid_count") + 1
+            )
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+@mock.patch("api.thumbnails.requests.get", new=fake_sprite_response)
+class QueryBudgetTests(TestCase):
+    """
+    Every API URL is requested against a small and a large dataset. Query
+    counts must stay within budget and be identical at both sizes, so a
+    change that issues a query per row fails here.
+    """
+
+    def setUp(self):
+        thumbnail_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(THUMBNAIL_ROOT=thumbnail_dir))
+        self.admin = User.objects.create_user("admin", is_staff=True)
+        self.alice = User.objects.create_user(
+            "alice", email="alice@x.com", password="pw"
+        )
+        self.bob = User.objects.create_user("bob", email="bob@x.com")
+        # Never logged in, so password reset tokens for her stay valid
+        self.carol = User.objects.create_user(
+            "carol", email="carol@x.com", password="pw"
+        )
+        for user in (self.admin, self.alice, self.bob):
+            Profile.objects.create(user=user, money=100000)
+
+        self.alice_pokemon = create_pokemon(self.alice, 4, count=4)
+        self.bob_pokemon = create_pokemon(self.bob, 7, count=4)
+        self.bob_sale = MoneyTrade.objects.create(
+            pokemon=self.bob_pokemon[0], amount_asked=100, pokeapi_id=7
+        )
+        self.bob_barter = BarterTrade.objects.create(pokemon=self.bob_pokemon[1])
+        self.alice_listing = MoneyTrade.objects.create(
+            pokemon=self.alice_pokemon[1], amount_asked=70
+        )
+        self.report = TradeReport.objects.create(
+            reporter=self.bob, reason="too cheap", money_trade=self.alice_listing
+        )
+        self.alert = WishlistAlert.objects.create(
+            user=self.alice, pokemon_type="water", match_key="type:water"
+        )
+        self.incoming = TradeRequest.objects.create(
+            sender=self.bob,
+            receiver=self.alice,
+            sender_pokemon=self.bob_pokemon[2],
+            receiver_pokemon=self.alice_pokemon[2],
+        )
+        # Takes alice's next charmander listing
+        BuyOrder.objects.create(user=self.bob, pokeapi_id=4, price=40)
+        self.alice_order = BuyOrder.objects.create(
+            user=self.alice, pokeapi_id=150, price=10
+        )
+        self.auction = Auction.objects.create(
+            pokemon=create_pokemon(self.bob, 9)[0],
+            seller=self.bob,
+            starting_price=50,
+            ends_at=timezone.now() + timedelta(days=1),
+        )
+
+    def seed(self, count, offset=0):
+        seed_traders(
+            count,
+            offset,
+            self.alice,
+            self.alice_pokemon[2],
+            self.bob_pokemon[2],
+            self.auction,
+        )
+
+    def rendered_atlas(self, species_ids):
+        """URL of a sheet already on disk, like the thumbnail case below."""
+        render_atlases(species_ids)
+        return collection_atlas(species_ids)["sheets"][0]
+
+    def cases(self):
+        alice, admin = self.alice, self.admin
+        alice_free, bob_free = self.alice_pokemon[0], self.bob_pokemon[3]
+        uid = urlsafe_base64_encode(force_bytes(self.carol.pk))
+        token = default_token_generator.make_token(self.carol)
+        return [
+            ("index", "get", reverse("index"), None, None),
+            (
+                "login",
+                "post",
+                reverse("login"),
+                {"username": "alice", "password": "pw"},
+                None,
+            ),
+            ("logout", "post", reverse("logout"), None, alice),
+            (
+                "signup",
+                "post",
+                reverse("signup"),
+                {"username": "newbie", "password": "pw", "email": "n@x.com"},
+                None,
+            ),
+            (
+                "password_reset",
+                "post",
+                reverse("password_reset"),
+                {"email": "nobody@x.com"},
+                None,
+            ),
+            ("user", "get", reverse("user"), None, alice),
+            ("admin_dashboard", "get", reverse("admin_dashboard"), None, admin),
+            (
+                "manage_trade",
+                "post",
+                reverse("manage_trade", args=["money", self.bob_sale.id]),
+                {"action": "flag", "reason": "test"},
+                admin,
+            ),
+            (
+                "bulk_manage_trades",
+                "post",
+                reverse("bulk_manage_trades"),
+                {
+                    "action": "remove",
+                    "ids": {"money": [self.bob_sale.id, self.alice_listing.id]},
+                    "admin_notes": "cleanup",
+                },
+                admin,
+            ),
+            (
+                "manage_report",
+                "post",
+                reverse("manage_report", args=[self.report.id]),
+                {"status": "resolved", "admin_notes": "ok"},
+                admin,
+            ),
+            ("list_reports", "get", reverse("list_reports"), None, admin),
+            ("trade_activity", "get", reverse("trade_activity"), None, admin),
+            (
+                "trade_activity:summary",
+                "get",
+                reverse("trade_activity") + "?mode=summary&granularity=hour",
+                None,
+                admin,
+            ),
+            ("request_metrics", "get", reverse("request_metrics"), None, admin),
+            (
+                "user profile",
+                "get",
+                reverse("user profile", args=["alice"]),
+                None,
+                None,
+            ),
+            (
+                "user_valuation",
+                "get",
+                reverse("user_valuation", args=["alice"]),
+                None,
+                None,
+            ),
+            (
+                "pokemon_detail",
+                "get",
+                reverse("pokemon_detail", args=[self.bob_pokemon[0].id]),
+                None,
+                alice,
+            ),
+            (
+                "create_money_trade",
+                "post",
+                reverse("create_money_trade", args=[alice_free.id]),
+                {"amount_asked": 30},
+                alice,
+            ),
+            (
+                "create_barter_trade",
+                "post",
+                reverse("create_barter_trade", args=[alice_free.id]),
+                {"trade_preferences": "water"},
+                alice,
+            ),
+            (
+                "cancel_trade",
+                "post",
+                reverse("cancel_trade", args=[self.alice_pokemon[1].id]),
+                None,
+                alice,
+            ),
+            (
+                "bulk_create_money_trades",
+                "post",
+                reverse("bulk_create_money_trades"),
+                {
+                    "items": [
+                        {"pokemon_id": pokemon.id, "amount_asked": 30}
+                        for pokemon in (alice_free, self.alice_pokemon[1], bob_free)
+                    ]
+                },
+                alice,
+            ),
+            (
+                "barter_proposals",
+                "get",
+                reverse("barter_proposals"),
+                None,
+                alice,
+            ),
+            (
+                "bulk_create_barter_trades",
+                "post",
+                reverse("bulk_create_barter_trades"),
+                {
+                    "items": [
+                        {"pokemon_id": alice_free.id, "trade_preferences": "fire"},
+                        {"pokemon_id": self.alice_pokemon[3].id},
+                    ]
+                },
+                alice,
+            ),
+            (
+                "bulk_cancel_trades",
+                "post",
+                reverse("bulk_cancel_trades"),
+                {"pokemon_ids": [p.id for p in self.alice_pokemon]},
+                alice,
+            ),
+            ("species_price", "get", reverse("species_price", args=[7]), None, None),
+            (
+                "species_order_book",
+                "get",
+                reverse("species_order_book", args=[4]),
+                None,
+                None,
+            ),
+            ("buy_orders", "get", reverse("buy_orders"), None, alice),
+            (
+                "create_buy_order",
+                "post",
+                reverse("create_buy_order"),
+                {"pokeapi_id": 7, "price": 150},
+                alice,
+            ),
+            (
+                "cancel_buy_order",
+                "post",
+                reverse("cancel_buy_order", args=[self.alice_order.id]),
+                None,
+                alice,
+            ),
+            (
+                "species_thumbnail",
+                "get",
+                reverse("species_thumbnail", args=[7, 96, "webp"]),
+                None,
+                None,
+            ),
+            ("atlas", "get", self.rendered_atlas([4, 7]), None, None),
+            (
+                "thumbnail",
+                "get",
+                reverse("thumbnail", args=[species_thumbnail(4, 96, "png")]),
+                None,
+                None,
+            ),
+            (
+                "buy_pokemon",
+                "post",
+                reverse("buy_pokemon", args=[self.bob_pokemon[0].id]),
+                None,
+                alice,
+            ),
+            (
+                "create_auction",
+                "post",
+                reverse("create_auction", args=[alice_free.id]),
+                {"starting_price": 50, "duration_hours": 24},
+                alice,
+            ),
+            ("auctions", "get", reverse("auctions"), None, None),
+            (
+                "auction_detail",
+                "get",
+                reverse("auction_detail", args=[self.auction.id]),
+                None,
+                None,
+            ),
+            (
+                "bid_on_auction",
+                "post",
+                reverse("bid_on_auction", args=[self.auction.id]),
+                {"amount": 5000},
+                alice,
+            ),
+            ("filter_marketplace", "get", reverse("filter_marketplace"), None, alice),
+            ("trade_history", "get", reverse("trade_history"), None, alice),
+            ("featured_pokemon", "get", reverse("featured_pokemon"), None, alice),
+            ("notifications", "get", reverse("notifications"), None, alice),
+            ("notifications_read", "post", reverse("notifications_read"), None, alice),
+            ("wishlist", "get", reverse("wishlist"), None, alice),
+            (
+                "add_wishlist_alert",
+                "post",
+                reverse("add_wishlist_alert"),
+                {"pokeapi_id": 7, "max_price": 500},
+                alice,
+            ),
+            (
+                "delete_wishlist_alert",
+                "post",
+                reverse("delete_wishlist_alert", args=[self.alert.id]),
+                None,
+                alice,
+            ),
+            (
+                "send_trade",
+                "post",
+                reverse("send_trade"),
+                {
+                    "receiver_id": self.bob.id,
+                    "sender_pokemon_id": alice_free.id,
+                    "receiver_pokemon_id": bob_free.id,
+                },
+                alice,
+            ),
+            (
+                "respond_trade",
+                "post",
+                reverse("respond_trade", args=[self.incoming.id]),
+                {"action": "accept"},
+                alice,
+            ),
+            ("incoming_trades", "get", reverse("incoming_trades"), None, alice),
+            (
+                "incoming-trades-pokemon",
+                "get",
+                reverse("incoming-trades-pokemon", args=[self.alice_pokemon[2].id]),
+                None,
+                alice,
+            ),
+            (
+                "user_profile",
+                "get",
+                reverse("user_profile", args=[alice.id]),
+                None,
+                None,
+            ),
+            ("my_pokemon", "get", reverse("my_pokemon"), None, alice),
+            ("chatbot_chat", "post", reverse("chatbot_chat"), {"prompt": "hi"}, None),
+            (
+                "password_reset_confirm",
+                "get",
+                reverse("password_reset_confirm", args=[uid, token]),
+                None,
+                None,
+            ),
+            (
+                "password_reset_complete",
+                "get",
+                reverse("password_reset_complete"),
+                None,
+                None,
+            ),
+            (
+                "submit_trade_report",
+                "post",
+                reverse("submit_trade_report", args=[self.bob_sale.id]),
+                {"reason": "suspicious"},
+                alice,
+            ),
+            (
+                "trade_detail",
+                "get",
+                reverse("trade_detail", args=[self.bob_sale.id]),
+                None,
+                None,
+            ),
+        ]
+
+    def measure(self):
+        """Runs every case in a rolled-back savepoint; returns {case: (queries, bytes)}."""
+        results = {}
+        for case_id, method, url, payload, user in self.cases():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            cache.clear()
+            kwargs = {}
+            if payload is not None:
+                kwargs = {
+                    "data": json.dumps(payload),
+                    "content_type": "application/json",
+                }
+
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(url, **kwargs)
+                transaction.set_rollback(True)
+
+            self.assertLess(response.status_code, 400, f"{case_id}: {response.content}")
+            results[case_id] = (len(queries), len(response.content))
+        return results
+
+    def assert_within_budget(self, results, scale_index):
+        for case_id, (query_count, size) in results.items():
+            budget = QUERY_BUDGETS[case_id]
+            with self.subTest(case=case_id):
+                self.assertLessEqual(query_count, budget[0], "query budget exceeded")
+                self.assertLessEqual(
+                    size, budget[scale_index] * 1024, "response size budget exceeded"
+                )
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in api_urls.urlpatterns}
+        self.assertNotIn(None, names, "every API URL needs a name")
+        budgeted = {case_id.split(":")[0] for case_id in QUERY_BUDGETS}
+        self.assertEqual(names - budgeted, set())
+        self.assertEqual({case[0] for case in self.cases()}, set(QUERY_BUDGETS))
+
+    @mock.patch("api.views.requests.post", side_effect=fake_chatbot_response)
+    @mock.patch("api.factories.pb.pokemon_species", side_effect=Exception)
+    @mock.patch("api.views.random_pokemon", side_effect=fake_pokeapi_pokemon)
+    def test_query_counts_are_flat_and_within_budget(self, *mocks):
+        self.seed(SMALL_SCALE)
+        small = self.measure()
+        self.assert_within_budget(small, 1)
+
+        self.seed(LARGE_SCALE - SMALL_SCALE, offset=SMALL_SCALE)
+        large = self.measure()
+        self.assert_within_budget(large, 2)
+
+        for case_id in QUERY_BUDGETS:
+            with self.subTest(case=case_id):
+                self.assertEqual(
+                    small[case_id][0],
+                    large[case_id][0],
+                    "query count grows with data size",
+                )
+
+
+class AdminChangelistQueryTests(TestCase):
+    """The admin changelists must not issue a query per listed row."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("root", "root@x.com", "pw")
+        self.alice = User.objects.create_user("alice")
+        self.alice_pokemon = create_pokemon(self.alice, 4, count=4)
+
+    def changelist_queries(self):
+        client = Client()
+        client.force_login(self.admin)
+        counts = {}
+        for model in ("moneytrade", "bartertrade", "tradehistory", "tradereport"):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse(f"admin:api_{model}_changelist"))
+            self.assertEqual(response.status_code, 200)
+            counts[model] = len(queries)
+        return counts
+
+    def test_changelist_queries_are_flat(self):
+        seed_traders(
+            SMALL_SCALE, 0, self.alice, self.alice_pokemon[0], self.alice_pokemon[1]
+        )
+        small = self.changelist_queries()
+        seed_traders(
+            LARGE_SCALE - SMALL_SCALE,
+            SMALL_SCALE,
+            self.alice,
+            self.alice_pokemon[0],
+            self.alice_pokemon[1],
+        )
+        self.assertEqual(small, self.changelist_queries())
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        route_metrics.reset()
+        self.alice = User.objects.create_user("alice")
+        Profile.objects.create(user=self.alice)
+        create_pokemon(self.alice, 4, count=5)
+
+    def test_server_timing_and_route_aggregate(self):
+        with self.assertLogs("api.metrics", level="INFO") as logs:
+            response = Client().get(reverse("user_profile", args=[self.alice.id]))
+
+        self.assertIn("sql;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["url_name"], "user_profile")
+        self.assertEqual(line["sql_queries"], 4)
+        self.assertEqual(route_metrics.snapshot()["user_profile"]["requests"], 1)
+
+    def test_repeated_statements_are_reported(self):
+        self.assertEqual(
+            fingerprint_sql('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND x = 5'),
+            'SELECT * FROM "t" WHERE "id" IN (...) AND x = ?',
+        )
+        metrics = RequestMetrics()
+        for _ in range(DUPLICATE_QUERY_THRESHOLD):
+            metrics.record_sql(
+                lambda *args: None, "SELECT 1 WHERE id = %s", [1], False, {}
+            )
+        self.assertEqual(metrics.duplicate_queries()[0]["count"], 3)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class LoadHarnessTests(TestCase):
+    def setUp(self):
+        # As the test client does, keep the test transaction's connection open
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+        # One money and one barter listing per rarity, so whichever filters a
+        # flow picks there is something to view and buy
+        for name in ("ash", "misty"):
+            user = User.objects.create_user(name, password="pw")
+            Profile.objects.create(user=user, money=5000)
+            for pokeapi_id in range(5, 10):
+                pokemon = create_pokemon(user, pokeapi_id, count=3)
+                MoneyTrade.objects.create(pokemon=pokemon[0], amount_asked=10)
+                BarterTrade.objects.create(pokemon=pokemon[1], trade_preferences="any")
+        Pokemon.objects.update(name="pikachu")
+
+    @mock.patch("api.loadtest.MARKETPLACE_QUERIES", ["pika"])
+    @mock.patch("api.loadtest.POKEMON_TYPES", ["fire"])
+    def test_every_flow_runs_against_the_wsgi_stack(self):
+        driver = WSGIDriver(get_wsgi_application())
+        recorder = LatencyRecorder()
+        peers = []
+        ash = VirtualUser("ash", "pw", 1, peers)
+        misty = VirtualUser("misty", "pw", 2, peers)
+        peers += [ash, misty]
+        for user in peers:
+            run_flow(driver, user, user.login, recorder)
+        self.assertEqual(recorder.statuses["login"][200], 2)
+
+        for flow in FLOW_WEIGHTS:
+            run_flow(driver, ash, getattr(ash, flow), recorder)
+        run_flow(driver, misty, misty.respond_trades, recorder)
+
+        self.assertLessEqual(
+            {
+                "filter_marketplace",
+                "featured_pokemon",
+                "pokemon_detail",
+                "species_price",
+                "user_profile",
+                "notifications",
+                "buy_pokemon",
+                "my_pokemon",
+                "send_trade",
+                "incoming_trades",
+                "respond_trade",
+            },
+            set(recorder.samples),
+        )
+        for url_name, statuses in recorder.statuses.items():
+            self.assertFalse([status for status in statuses if status >= 400], url_name)
+
+    def test_summary_percentiles_and_comparison(self):
+        recorder = LatencyRecorder()
+        for ms in range(1, 101):
+            recorder.record("pokemon_detail", 200, ms / 1000)
+        recorder.record("buy_pokemon", 500, 0.2)
+
+        results = summarize(recorder, elapsed=10)
+        route = results["routes"]["pokemon_detail"]
+        self.assertEqual(route["requests"], 100)
+        self.assertEqual(route["p50_ms"], 50.5)
+        self.assertEqual(route["p99_ms"], 99.01)
+        self.assertEqual(route["throughput_rps"], 10)
+        self.assertEqual(results["totals"]["server_errors"], 1)
+        json.dumps(results)
+
+        faster = json.loads(json.dumps(results))
+        faster["routes"]["pokemon_detail"]["p50_ms"] = 25.25
+        del faster["routes"]["buy_pokemon"]
+        rows = {row["url_name"]: row for row in compare_results(results, faster)}
+        self.assertEqual(rows["pokemon_detail"]["p50_ms_change"], -50.0)
+        self.assertEqual(rows["buy_pokemon"]["p50_ms"], (200.0, None))
+
+
+@override_settings(
+    REQUEST_TRACE_ENABLED=True,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class RequestTraceTests(TestCase):
+    def setUp(self):
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        # The trace_file handler is bound to the real trace path at startup
+        self.trace_path = (
+            Path(self.enterContext(tempfile.TemporaryDirectory())) / "trace.ndjson"
+        )
+        handler = logging.FileHandler(self.trace_path, delay=True)
+        self.addCleanup(handler.close)
+        self.enterContext(
+            mock.patch.object(logging.getLogger("api.trace"), "handlers", [handler])
+        )
+        self.alice = User.objects.create_user("alice", password="pw")
+        Profile.objects.create(user=self.alice)
+        self.pokemon = create_pokemon(self.alice, 4, count=2)
+
+    def test_traces_are_sanitized_and_replay_as_the_same_user(self):
+        client = Client()
+        with self.assertLogs("api.trace", level="INFO") as logs:
+            client.post(
+                reverse("login"),
+                {"username": "alice", "password": "pw"},
+                content_type="application/json",
+            )
+            client.get(reverse("my_pokemon"))
+            client.get(reverse("filter_marketplace"), {"q": "spec", "type": "fire"})
+            client.get(reverse("pokemon_detail", args=[self.pokemon[1].id]))
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+
+        login, mine, market, detail = entries
+        self.assertEqual(login["body"], {"username": "alice", "password": REDACTED})
+        self.assertEqual(mine["user_id"], self.alice.id)
+        self.assertEqual(market["query"], {"q": ["spec"], "type": ["fire"]})
+        self.assertEqual(detail["kwargs"], {"pokemon_id": self.pokemon[1].id})
+
+        # Not get_wsgi_application(): its django.setup() would reconfigure
+        # logging and put the real trace_file handler back
+        result = replay(entries, WSGIDriver(WSGIHandler()), speed=0)
+        self.assertEqual(result.skipped, {"authentication view": 1})
+        self.assertFalse(result.status_changes)
+        self.assertEqual(
+            set(result.replayed.samples),
+            {"my_pokemon", "filter_marketplace", "pokemon_detail"},
+        )
+        # The replayed requests were traced too, into the temporary file; the
+        # login is skipped
+        self.assertEqual(len(self.trace_path.read_text().splitlines()), 3)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_production_pragmas_are_applied_to_new_connections(self):
+        # The profile is opt-in, so open a connection with it by hand
+        production = connections["default"].__class__(
+            {**connection.settings_dict, **DATABASE_PROFILES["production"]},
+            alias="production",
+        )
+        try:
+            with production.cursor() as cursor:
+                pragmas = {
+                    name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                    for name in ("synchronous", "busy_timeout", "cache_size")
+                }
+        finally:
+            production.close()
+        self.assertEqual(
+            pragmas, {"synchronous": 1, "busy_timeout": 5000, "cache_size": -65536}
+        )
+
+
+class AuthContextCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice")
+        self.profile = Profile.objects.create(user=self.user, money=100)
+        self.client.force_login(self.user)
+
+    def test_warm_user_view_makes_no_queries(self):
+        self.client.get(reverse("user"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("user"))
+        self.assertEqual(response.json()["user"]["money"], 100)
+
+        self.profile.money = 40
+        self.profile.save()
+        self.assertEqual(self.client.get(reverse("user")).json()["user"]["money"], 40)
+
+    def test_password_change_still_ends_cached_sessions(self):
+        self.client.get(reverse("user"))
+        self.user.set_password("new password")
+        self.user.save()
+        self.assertFalse(self.client.get(reverse("user")).json()["isAuthenticated"])
+
+
+class ProfilePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.buyer = User.objects.create_user("buyer")
+        Profile.objects.create(user=self.seller, money=100)
+        Profile.objects.create(user=self.buyer, money=500)
+        self.pokemon = create_pokemon(self.seller, 4, count=2)
+
+    def page(self):
+        return self.client.get(reverse("user profile", args=["seller"])).json()
+
+    def test_repeat_hits_are_one_cache_read(self):
+        self.page()
+        with self.assertNumQueries(0):
+            self.page()
+
+    def test_listing_and_sale_invalidate_the_page(self):
+        self.client.force_login(self.seller)
+        self.page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("create_money_trade", args=[self.pokemon[0].id]),
+                {"amount_asked": 60},
+                content_type="application/json",
+            )
+        self.assertEqual(len(self.page()["open_trades"]["money_trades"]), 1)
+
+        self.client.force_login(self.buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("buy_pokemon", args=[self.pokemon[0].id]))
+        page = self.page()
+        self.assertEqual(page["user"]["money"], 160)
+        self.assertEqual([p["id"] for p in page["pokemon"]], [self.pokemon[1].id])
+        self.assertEqual(page["open_trades"]["money_trades"], [])
+
+
+class BulkListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.pokemon = create_pokemon(self.alice, 4, count=60)
+        self.bob_pokemon = create_pokemon(self.bob, 7)[0]
+        self.client.force_login(self.alice)
+
+    def list_for_money(self, pokemon_ids, amount=50):
+        return self.client.post(
+            reverse("bulk_create_money_trades"),
+            {"items": [{"pokemon_id": i, "amount_asked": amount} for i in pokemon_ids]},
+            content_type="application/json",
+        )
+
+    def test_partial_failures_are_reported_per_item(self):
+        MoneyTrade.objects.create(pokemon=self.pokemon[1], amount_asked=10)
+        ids = [self.pokemon[0].id, self.pokemon[1].id, self.bob_pokemon.id]
+        response = self.list_for_money(ids + [self.pokemon[0].id, "x"]).json()
+
+        self.assertEqual((response["succeeded"], response["failed"]), (1, 4))
+        self.assertEqual(
+            [r.get("error") for r in response["results"]],
+            [
+                None,
+                "Pokemon is already listed in an active trade",
+                "Pokemon not found or not owned by user",
+                "Duplicate pokemon_id in request",
+                "pokemon_id is required",
+            ],
+        )
+        self.assertEqual(
+            response["results"][0]["trade"]["id"],
+            MoneyTrade.objects.get(pokemon=self.pokemon[0]).id,
+        )
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries(pokemon):
+            ids = [p.id for p in pokemon]
+            with CaptureQueriesContext(connection) as listing:
+                self.list_for_money(ids)
+            with CaptureQueriesContext(connection) as cancelling:
+                self.client.post(
+                    reverse("bulk_cancel_trades"),
+                    {"pokemon_ids": ids},
+                    content_type="application/json",
+                )
+            return len(listing), len(cancelling)
+
+        self.client.get(reverse("user"))  # Session and user now come from the cache
+        self.assertEqual(queries(self.pokemon[:5]), queries(self.pokemon[5:]))
+        self.assertFalse(MoneyTrade.objects.exists())
+
+
+class ModerationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", is_staff=True)
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.alice_trades = [
+            MoneyTrade.objects.create(pokemon=p, amount_asked=10)
+            for p in create_pokemon(self.alice, 4, count=3)
+        ]
+        self.bob_trade = BarterTrade.objects.create(
+            pokemon=create_pokemon(self.bob, 7)[0]
+        )
+        self.report = TradeReport.objects.create(
+            reporter=self.bob, reason="spam", money_trade=self.alice_trades[0]
+        )
+        self.client.force_login(self.admin)
+
+    def moderate(self, **data):
+        return self.client.post(
+            reverse("bulk_manage_trades"), data, content_type="application/json"
+        )
+
+    def test_filter_removes_matching_trades_and_resolves_reports(self):
+        response = self.moderate(
+            action="remove", filter={"seller": "alice"}, admin_notes="spam ring"
+        ).json()
+
+        self.assertEqual(
+            (response["money_trades"], response["barter_trades"], response["reports"]),
+            (3, 0, 1),
+        )
+        self.assertEqual(
+            set(MoneyTrade.objects.values_list("status", "admin_notes")),
+            {("removed", "spam ring")},
+        )
+        self.bob_trade.refresh_from_db()
+        self.assertEqual(self.bob_trade.status, "active")
+        self.report.refresh_from_db()
+        self.assertEqual(
+            (self.report.status, self.report.resolved_by), ("resolved", self.admin)
+        )
+        audit = ModerationAudit.objects.get(id=response["audit_id"])
+        self.assertEqual(audit.moderator, self.admin)
+        self.assertEqual(audit.criteria["filter"], {"seller": "alice"})
+
+    def test_ids_flag_both_models(self):
+        response = self.moderate(
+            action="flag",
+            reason="price gouging",
+            ids={"money": [self.alice_trades[1].id], "barter": [self.bob_trade.id]},
+        ).json()
+
+        self.assertEqual((response["money_trades"], response["barter_trades"]), (1, 1))
+        self.assertEqual(
+            list(MoneyTrade.objects.filter(is_flagged=True)), [self.alice_trades[1]]
+        )
+        self.bob_trade.refresh_from_db()
+        self.assertEqual(self.bob_trade.flag_reason, "price gouging")
+
+    def test_invalid_requests_change_nothing(self):
+        for data in (
+            {"action": "remove"},
+            {"action": "ban", "filter": {"seller": "alice"}},
+            {"action": "remove", "filter": {"price": 1}},
+            {"action": "remove", "ids": {"money": ["1"]}},
+        ):
+            self.assertEqual(self.moderate(**data).status_code, 400, data)
+        self.assertFalse(ModerationAudit.objects.exists())
+        self.assertFalse(MoneyTrade.objects.filter(status="removed").exists())
+
+    def test_large_batch_uses_a_fixed_number_of_queries(self):
+        pokemon = create_pokemon(self.bob, 7, count=10000)
+        MoneyTrade.objects.bulk_create(
+            MoneyTrade(pokemon=p, amount_asked=5) for p in pokemon
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.moderate(action="flag", filter={"seller": "bob"}).json()
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(response["money_trades"], 10000)
+        self.assertLess(len(queries), 12)
+        self.assertLess(elapsed, 1)
+
+
+class TradeRollupTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        self.now = timezone.now()
+
+    def trade(self, seller, buyer, amount, hours_ago, trade_type="money"):
+        history = TradeHistory.objects.create(
+            seller=seller, buyer=buyer, amount=amount, trade_type=trade_type
+        )
+        # timestamp is auto_now_add, so it can only be backdated afterwards
+        TradeHistory.objects.filter(id=history.id).update(
+            timestamp=self.now - timedelta(hours=hours_ago)
+        )
+
+    def assert_rollups_match_history(self):
+        for granularity in GRANULARITIES:
+            totals = TradeRollup.objects.filter(granularity=granularity).aggregate(
+                trade_count=Sum("trade_count"),
+                money_trade_count=Sum("money_trade_count"),
+                barter_trade_count=Sum("barter_trade_count"),
+                money_moved=Sum("money_moved"),
+            )
+            self.assertEqual(
+                totals,
+                TradeHistory.objects.aggregate(
+                    trade_count=Count("id"),
+                    money_trade_count=Count("id", filter=~Q(trade_type="barter")),
+                    barter_trade_count=Count("id", filter=Q(trade_type="barter")),
+                    money_moved=Sum("amount"),
+                ),
+            )
+
+    def test_incremental_runs_match_the_history(self):
+        self.trade(self.alice, self.bob, 100, 50)
+        self.trade(self.bob, self.carol, 40, 2)
+        self.trade(self.carol, self.alice, 0, 2, trade_type="barter")
+        self.assertEqual(refresh_trade_rollups(batch_size=2), 3)
+        self.assert_rollups_match_history()
+
+        # Late rows land in buckets that already exist
+        self.trade(self.alice, self.carol, 0, 2, trade_type="barter")
+        self.trade(self.carol, self.bob, 25, 50, trade_type="auction")
+        self.assertEqual(refresh_trade_rollups(batch_size=1), 2)
+        self.assert_rollups_match_history()
+        self.assertEqual(refresh_trade_rollups(), 0)
+
+        hour = TradeRollup.objects.get(
+            granularity="hour",
+            bucket_start=self.now.replace(minute=0, second=0, microsecond=0)
+            - timedelta(hours=2),
+        )
+        self.assertEqual(
+            (hour.money_trade_count, hour.barter_trade_count, hour.unique_sellers),
+            (1, 2, 3),
+        )
+
+    def test_the_summary_reads_the_rollups_as_they_are(self):
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        url = reverse("trade_activity") + "?mode=summary"
+        self.trade(self.alice, self.bob, 100, 1)
+        self.assertEqual(self.client.get(url).json()["totals"]["trade_count"], 0)
+
+        refresh_trade_rollups()
+        self.assertEqual(
+            self.client.get(url).json()["totals"],
+            {
+                "trade_count": 1,
+                "money_trade_count": 1,
+                "barter_trade_count": 0,
+                "money_moved": 100,
+            },
+        )
+
+    def test_admin_views_label_trades_by_type_and_reject_bad_numbers(self):
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        self.trade(self.alice, self.bob, 0, 1)
+        self.trade(self.bob, self.carol, 5, 1, trade_type="barter")
+        recent = self.client.get(reverse("admin_dashboard")).json()["recent_trades"]
+        self.assertEqual(
+            sorted(trade["trade_type"] for trade in recent), ["barter", "money"]
+        )
+
+        for query in ("?days=week", "?page=two", "?per_page=x"):
+            response = self.client.get(reverse("trade_activity") + query)
+            self.assertEqual(response.status_code, 400)
+
+
+class PriceIndexTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.pokemon = create_pokemon(self.alice, 25)[0]
+        self.start = timezone.now().replace(hour=12) - timedelta(days=2)
+
+    def sell(self, amounts, day=0):
+        timestamp = self.start + timedelta(days=day)
+        for amount in amounts:
+            history = TradeHistory.objects.create(
+                seller=self.alice,
+                buyer=self.bob,
+                pokemon=self.pokemon,
+                amount=amount,
+                trade_type="money",
+            )
+            TradeHistory.objects.filter(id=history.id).update(timestamp=timestamp)
+            record_sale(25, amount, timestamp)
+
+    def test_suggested_price_moves_from_last_price_to_the_median(self):
+        self.sell([100, 10])
+        self.assertEqual(format_species_price_data(25)["suggested_price"], 10)
+
+        self.sell([40, 20], day=1)
+        price = format_species_price_data(25)
+        self.assertEqual(
+            {key: price[key] for key in ("suggested_price", "p25_price", "p75_price")},
+            {
+                "suggested_price": round(np.percentile([100, 10, 40, 20], 50)),
+                "p25_price": round(np.percentile([100, 10, 40, 20], 25)),
+                "p75_price": round(np.percentile([100, 10, 40, 20], 75)),
+            },
+        )
+        self.assertEqual(price["sale_count"], 4)
+        self.assertEqual(
+            [
+                (day["sale_count"], day["average_price"], day["close_price"])
+                for day in price["history"]
+            ],
+            [(2, 55, 10), (2, 30, 20)],
+        )
+        self.assertEqual(
+            format_species_price_data(7),
+            {
+                "pokeapi_id": 7,
+                "suggested_price": None,
+                "last_price": None,
+                "median_price": None,
+                "p25_price": None,
+                "p75_price": None,
+                "sale_count": 0,
+                "last_sale_at": None,
+                "history": [],
+            },
+        )
+
+    def test_only_the_latest_sales_count_towards_the_median(self):
+        self.sell([1000] * 5 + [10] * PRICE_WINDOW)
+        stats = SpeciesPrice.objects.get(pokeapi_id=25)
+        self.assertEqual(len(stats.recent_prices), PRICE_WINDOW)
+        self.assertEqual((stats.median_price, stats.sale_count), (10, PRICE_WINDOW + 5))
+
+    def test_backfill_rebuilds_what_record_sale_built(self):
+        self.sell([30, 50, 70])
+        self.sell([90], day=1)
+        incremental = format_species_price_data(25)
+        stats_id = SpeciesPrice.objects.get().id
+        SpeciesPrice.objects.create(
+            pokeapi_id=151,
+            last_price=1,
+            median_price=1,
+            p25_price=1,
+            p75_price=1,
+            last_sale_at=self.start,
+        )
+
+        self.assertEqual(backfill_price_index(), 1)
+        self.assertEqual(format_species_price_data(25), incremental)
+        # Upserted in place, and species without sales are dropped
+        self.assertEqual(
+            list(SpeciesPrice.objects.values_list("id", flat=True)), [stats_id]
+        )
+
+    @mock.patch("api.pricing.ID_BATCH_SIZE", 2)
+    def test_backfill_deletes_buckets_without_sales_in_batches(self):
+        self.sell([30, 50], day=1)
+        SpeciesPriceBucket.objects.bulk_create(
+            SpeciesPriceBucket(
+                pokeapi_id=pokeapi_id,
+                bucket_start=self.start.replace(hour=0) - timedelta(days=day),
+                sale_count=1,
+                total_amount=5,
+                min_price=5,
+                max_price=5,
+                close_price=5,
+            )
+            for pokeapi_id in (25, 151)
+            for day in range(1, 4)
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            backfill_price_index()
+        self.assertEqual(
+            list(SpeciesPriceBucket.objects.values_list("pokeapi_id", "sale_count")),
+            [(25, 2)],
+        )
+        deletes = [
+            q for q in queries if 'DELETE FROM "api_speciespricebucket"' in q["sql"]
+        ]
+        self.assertEqual(len(deletes), 3)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        for user in (self.alice, self.bob, self.carol):
+            Profile.objects.create(user=user, money=1000)
+        create_pokemon(self.alice, 25, count=2)
+        create_pokemon(self.alice, 1)
+        self.bob_pokemon = create_pokemon(self.bob, 25, count=2)
+
+    def valuation(self):
+        return self.client.get(reverse("user_valuation", args=["alice"])).json()[
+            "valuation"
+        ]
+
+    def sell(self, pokemon, amount):
+        MoneyTrade.objects.create(pokemon=pokemon, amount_asked=amount)
+        self.client.force_login(self.carol)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("buy_pokemon", args=[pokemon.id]))
+
+    def test_a_sale_of_an_owned_species_revalues_the_collection(self):
+        self.assertEqual(self.valuation()["total_value"], 0)
+        self.sell(self.bob_pokemon[0], 100)
+        self.assertEqual(
+            {
+                key: value
+                for key, value in self.valuation().items()
+                if key != "computed_at"
+            },
+            {"total_value": 200, "pokemon_count": 3, "priced_pokemon_count": 2},
+        )
+        with self.assertNumQueries(0):
+            get_valuation(self.alice)
+
+        # A small move keeps the cached value; a material one drops it
+        self.sell(self.bob_pokemon[1], 105)
+        self.assertEqual(get_valuation(self.alice)["total_value"], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                record_sale(25, 400, timezone.now())
+                record_sale(25, 400, timezone.now())
+        # The median of 100, 105, 400 and 400
+        self.assertEqual(get_valuation(self.alice)["total_value"], 2 * 252)
+
+
+class SyntheticDataTests(TestCase):
+    def test_small_run_creates_consistent_rows(self):
+        out = StringIO()
+        call_command(
+            "generate_synthetic_data",
+            users=30,
+            chunk_size=12,
+            seed=3,
+            end=timezone.now(),
+            stdout=out,
+        )
+
+        users = User.objects.filter(username__startswith="synth")
+        self.assertEqual(users.count(), 30)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 30)
+        self.assertFalse(Pokemon.objects.exclude(user__in=users).exists())
+        summary = out.getvalue().splitlines()[-1]
+        for model, label in (
+            (Pokemon, "pokemon"),
+            (MoneyTrade, "money listings"),
+            (BarterTrade, "barter listings"),
+            (TradeHistory, "trade history rows"),
+            (TradeRequest, "trade requests"),
+            (Notification, "notifications"),
+            (TradeReport, "reports"),
+        ):
+            self.assertIn(f"{model.objects.count()} {label}", summary)
+
+        # Ids read back after each insert line up with the rows they name
+        self.assertFalse(
+            MoneyTrade.objects.exclude(pokeapi_id=F("pokemon__pokeapi_id")).exists()
+        )
+        self.assertFalse(
+            TradeHistory.objects.exclude(buyer=F("pokemon__user")).exists()
+        )
+        connection.check_constraints()
+
+
+class FraudDetectionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        self.pokemon = create_pokemon(self.alice, 25)[0]
+
+    def sell(self, seller, buyer, amount=100):
+        return TradeHistory.objects.create(
+            seller=seller,
+            buyer=buyer,
+            pokemon=self.pokemon,
+            amount=amount,
+            trade_type="money",
+        )
+
+    def flag_reason(self, history):
+        history.refresh_from_db()
+        return history.flag_reason if history.is_flagged else None
+
+    def test_sales_back_and_around_a_ring_are_flagged(self):
+        first = self.sell(self.alice, self.bob)
+        back = self.sell(self.bob, self.alice)
+        self.assertEqual(detect_fraud(), 2)
+        ring = [
+            self.sell(self.alice, self.carol),
+            self.sell(self.carol, self.bob),
+            self.sell(self.bob, self.carol),
+        ]
+        detect_fraud()
+
+        self.assertIsNone(self.flag_reason(first))
+        self.assertEqual(
+            self.flag_reason(back), "Closes a cycle of 2 sales within 7 days"
+        )
+        # alice -> carol -> bob -> alice, then bob straight back to carol
+        self.assertEqual(
+            [self.flag_reason(h) for h in ring],
+            [
+                None,
+                "Closes a cycle of 3 sales within 7 days",
+                "Closes a cycle of 2 sales within 7 days",
+            ],
+        )
+        self.assertEqual(
+            TradeEdge.objects.get(seller=self.alice, buyer=self.bob).trade_count, 1
+        )
+
+    def test_barters_are_not_cycles(self):
+        TradeHistory.objects.bulk_create(
+            [
+                TradeHistory(
+                    seller=self.alice, buyer=self.bob, amount=0, trade_type="barter"
+                ),
+                TradeHistory(
+                    seller=self.bob, buyer=self.alice, amount=0, trade_type="barter"
+                ),
+            ]
+        )
+        detect_fraud()
+        self.assertFalse(TradeHistory.objects.filter(is_flagged=True).exists())
+
+    def test_price_far_from_the_species_median_is_flagged(self):
+        SpeciesPrice.objects.create(
+            pokeapi_id=25,
+            last_price=100,
+            median_price=100,
+            p25_price=90,
+            p75_price=110,
+            sale_count=10,
+            last_sale_at=timezone.now(),
+        )
+        normal = self.sell(self.alice, self.bob, 150)
+        inflated = self.sell(self.carol, self.alice, 900)
+        detect_fraud()
+
+        self.assertIsNone(self.flag_reason(normal))
+        self.assertEqual(
+            self.flag_reason(inflated), "Price $900 is 9.00x the species median $100"
+        )
+
+    def test_bursts_are_flagged_and_surface_in_list_reports(self):
+        trades = [
+            self.sell(*pair, amount=10)
+            for pair in [(self.bob, self.alice), (self.carol, self.alice)]
+            * (VELOCITY_LIMIT // 2 + 1)
+        ]
+        # Spread over several batches; the window carries across them
+        detect_fraud(batch_size=7)
+
+        flagged = TradeHistory.objects.filter(is_flagged=True).order_by("id")
+        self.assertEqual(list(flagged), trades[VELOCITY_LIMIT:])
+        self.assertIn(
+            f"User {self.alice.id} took part in {VELOCITY_LIMIT + 1} trades",
+            flagged[0].flag_reason,
+        )
+
+        admin = User.objects.create_user("admin", is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse("list_reports")).json()
+        self.assertEqual(
+            [t["id"] for t in response["flagged_trades"]],
+            sorted((t.id for t in trades[VELOCITY_LIMIT:]), reverse=True),
+        )
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries(count):
+            for i in range(count):
+                trader = User.objects.create_user(f"trader{count}-{i}")
+                self.sell(self.alice, trader)
+                self.sell(trader, self.bob)
+            with CaptureQueriesContext(connection) as captured:
+                detect_fraud()
+            return len(captured)
+
+        detect_fraud()  # Creates the checkpoint
+        self.assertEqual(queries(2), queries(20))
+
+
+class BarterMatchingTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol", "dave")
+        )
+
+    def list_for_barter(self, user, name, types, wants):
+        pokemon = Pokemon.objects.create(
+            user=user, pokeapi_id=1, name=name, rarity=1, types=types
+        )
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("create_barter_trade", args=[pokemon.id]),
+            {"trade_preferences": wants},
+            content_type="application/json",
+        )
+        return response.json()["trade"]["id"]
+
+    def proposals(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse("barter_proposals")).json()["proposals"]
+
+    def test_direct_swap_is_proposed(self):
+        charmander = self.list_for_barter(
+            self.alice, "charmander", ["fire"], "Looking for a Squirtle!"
+        )
+        squirtle = self.list_for_barter(self.bob, "squirtle", ["water"], "fire-type")
+
+        proposal = BarterProposal.objects.get()
+        self.assertEqual(proposal.cycle_key, f"{charmander},{squirtle}")
+        self.assertEqual(
+            [
+                (leg["owner"], leg["gives_to"])
+                for leg in self.proposals(self.alice)[0]["legs"]
+            ],
+            [("bob", "alice"), ("alice", "bob")],
+        )
+
+    def test_three_and_four_way_cycles_are_proposed(self):
+        self.list_for_barter(self.alice, "pikachu", ["electric"], "water")
+        self.list_for_barter(self.bob, "squirtle", ["water"], "grass")
+        self.list_for_barter(self.carol, "bulbasaur", ["grass"], "fire")
+        self.assertFalse(BarterProposal.objects.exists())
+        self.list_for_barter(self.dave, "charmander", ["fire"], "electric")
+        self.list_for_barter(self.dave, "oddish", ["grass", "poison"], "electric")
+
+        self.assertEqual(
+            sorted(BarterProposal.objects.values_list("size", flat=True)), [3, 4]
+        )
+        three_way = self.proposals(self.dave)[0]
+        self.assertEqual(
+            [(leg["pokemon_name"], leg["gives_to"]) for leg in three_way["legs"]],
+            [("oddish", "bob"), ("squirtle", "alice"), ("pikachu", "dave")],
+        )
+
+    def test_same_owner_and_closed_listings_are_not_proposed(self):
+        mine = self.list_for_barter(self.alice, "squirtle", ["water"], "fire")
+        self.list_for_barter(self.alice, "charmander", ["fire"], "water")
+        self.assertFalse(BarterProposal.objects.exists())
+
+        theirs = self.list_for_barter(self.bob, "vulpix", ["fire"], "water")
+        self.assertEqual(len(self.proposals(self.bob)), 1)
+        BarterTrade.objects.filter(id=mine).update(status="removed")
+        self.assertEqual(self.proposals(self.bob), [])
+        self.assertEqual(BarterProposalLeg.objects.filter(listing_id=theirs).count(), 1)
+
+    def test_query_count_does_not_grow_with_listings(self):
+        def queries(count):
+            for i in range(count):
+                trader = User.objects.create_user(f"trader{count}-{i}")
+                listing = BarterTrade.objects.create(
+                    pokemon=create_pokemon(trader, 7)[0], trade_preferences="fire"
+                )
+                index_barter_listings([listing])
+            listing = BarterTrade.objects.create(
+                pokemon=create_pokemon(self.alice, 4)[0],
+                trade_preferences=f"species-{count}",
+            )
+            with CaptureQueriesContext(connection) as captured:
+                index_barter_listings([listing])
+            return len(captured)
+
+        self.assertEqual(queries(2), queries(30))
+
+
+class WishlistAlertTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        # species-4, rarity 5, fire/flying
+        self.charmander = create_pokemon(self.alice, 4)[0]
+
+    def add_alert(self, user, **criteria):
+        self.client.force_login(user)
+        return self.client.post(
+            reverse("add_wishlist_alert"), criteria, content_type="application/json"
+        )
+
+    def list_charmander(self, **data):
+        self.client.force_login(self.alice)
+        kind = "money" if "amount_asked" in data else "barter"
+        return self.client.post(
+            reverse(f"create_{kind}_trade", args=[self.charmander.id]),
+            data,
+            content_type="application/json",
+        )
+
+    def test_matching_alerts_notify_each_user_once(self):
+        self.add_alert(self.bob, pokeapi_id=4, max_price=100)
+        self.add_alert(self.bob, pokemon_type="Fire")
+        self.add_alert(self.carol, min_rarity=3, max_price=50)
+        self.add_alert(self.carol, pokemon_type="water")
+        self.add_alert(self.alice, pokeapi_id=4)
+
+        self.list_charmander(amount_asked=80)
+
+        self.assertEqual(
+            list(Notification.objects.values_list("user__username", "message")),
+            [("bob", "species-4 from your wishlist was just listed for $80.")],
+        )
+
+    def test_barter_listings_only_match_alerts_without_a_price(self):
+        self.add_alert(self.bob, pokeapi_id=4, max_price=100)
+        self.add_alert(self.carol, min_rarity=5)
+
+        self.list_charmander(trade_preferences="water")
+
+        self.assertEqual(
+            list(Notification.objects.values_list("user__username", flat=True)),
+            ["carol"],
+        )
+
+    def test_alerts_are_validated_listed_and_deleted(self):
+        for criteria in (
+            {"pokemon_type": "cosmic"},
+            {"min_rarity": 9},
+            {"max_price": -5},
+        ):
+            self.assertEqual(self.add_alert(self.bob, **criteria).status_code, 400)
+        alert = self.add_alert(self.bob, pokemon_type="fire").json()["alert"]
+        self.assertEqual(WishlistAlert.objects.get().match_key, "type:fire")
+
+        response = self.client.get(reverse("wishlist")).json()
+        self.assertEqual([a["id"] for a in response["alerts"]], [alert["id"]])
+        self.client.post(reverse("delete_wishlist_alert", args=[alert["id"]]))
+        self.assertFalse(WishlistAlert.objects.exists())
+
+    def test_query_count_does_not_grow_with_unrelated_alerts(self):
+        def queries():
+            self.client.force_login(self.alice)
+            with CaptureQueriesContext(connection) as captured:
+                self.list_charmander(amount_asked=80)
+            MoneyTrade.objects.all().delete()
+            return len(captured)
+
+        self.add_alert(self.bob, pokeapi_id=4)
+        before = queries()
+        WishlistAlert.objects.bulk_create(
+            WishlistAlert(user=self.carol, pokeapi_id=i, match_key=f"species:{i}")
+            for i in range(5, 5005)
+        )
+        self.assertEqual(before, queries())
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = (
+            User.objects.create_user(name) for name in ("alice", "bob")
+        )
+        self.delivered = {"all": [], "sold": []}
+        handlers = mock.patch.dict(events.HANDLERS, clear=True)
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        events.handles("all")(lambda batch: self.delivered["all"].append(batch))
+        events.handles("sold", "PokemonSold")(
+            lambda batch: self.delivered["sold"].append(batch)
+        )
+
+    def ids(self, handler):
+        return [[event.id for event in batch] for batch in self.delivered[handler]]
+
+    def test_events_are_written_with_the_change(self):
+        pokemon = create_pokemon(self.alice, 25)[0]
+        self.client.force_login(self.alice)
+        self.client.post(
+            reverse("create_money_trade", args=[pokemon.id]),
+            {"amount_asked": 50},
+            content_type="application/json",
+        )
+        event = DomainEvent.objects.get()
+        self.assertEqual(event.event_type, "ListingCreated")
+        self.assertEqual(event.payload["user_ids"], [self.alice.id])
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            events.record_event("PokemonSold", [self.alice.id, self.bob.id])
+            raise RuntimeError
+        self.assertEqual(DomainEvent.objects.count(), 1)
+        with self.assertRaises(ValueError), transaction.atomic():
+            events.record_event("PokemonStolen", [self.alice.id])
+
+    def test_batches_go_to_matching_handlers_and_advance_their_cursors(self):
+        with transaction.atomic():
+            recorded = [
+                events.record_event(event_type, [self.alice.id]).id
+                for event_type in ["ListingCreated", "PokemonSold"] * 3
+            ]
+
+        self.assertEqual(events.dispatch_events(batch_size=4), {"all": 6, "sold": 6})
+        self.assertEqual(self.ids("all"), [recorded[:4], recorded[4:]])
+        self.assertEqual(self.ids("sold"), [recorded[1:4:2], recorded[5:]])
+        self.assertEqual(
+            Checkpoint.objects.get(name="outbox:sold").position, recorded[-1]
+        )
+        self.assertEqual(events.dispatch_events(), {"all": 0, "sold": 0})
+
+    def test_a_failed_batch_is_redelivered(self):
+        with transaction.atomic():
+            sold = events.record_event("PokemonSold", [self.bob.id]).id
+        failing = mock.Mock(side_effect=[RuntimeError("down"), None])
+        events.handles("sold", "PokemonSold")(failing)
+
+        with self.assertLogs("api.events", "ERROR"):
+            self.assertEqual(events.dispatch_events(), {"all": 1, "sold": 0})
+        self.assertEqual(events.dispatch_events(), {"all": 0, "sold": 1})
+        self.assertEqual(
+            [[event.id for event in call.args[0]] for call in failing.call_args_list],
+            [[sold], [sold]],
+        )
+        self.assertEqual(self.ids("all"), [[sold]])
+
+
+@override_settings(
+    RATE_LIMITS={"filter_marketplace": (2, 60, "user"), "signup": (1, 3600, "ip")}
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob = (
+            User.objects.create_user(name) for name in ("alice", "bob")
+        )
+
+    def test_an_empty_bucket_answers_429_with_retry_after(self):
+        self.client.force_login(self.alice)
+        for _ in range(2):
+            self.assertEqual(
+                self.client.get(reverse("filter_marketplace")).status_code, 200
+            )
+        response = self.client.get(reverse("filter_marketplace"))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        # Other routes and other users have their own buckets
+        self.assertEqual(self.client.get(reverse("notifications")).status_code, 200)
+        self.client.force_login(self.bob)
+        self.assertEqual(
+            self.client.get(reverse("filter_marketplace")).status_code, 200
+        )
+
+    def test_anonymous_buckets_are_per_ip(self):
+        def signup(ip):
+            return self.client.post(
+                reverse("signup"),
+                {"username": "alice"},
+                content_type="application/json",
+                REMOTE_ADDR=ip,
+            ).status_code
+
+        self.assertEqual([signup("10.0.0.1"), signup("10.0.0.1")], [400, 429])
+        self.assertEqual(signup("10.0.0.2"), 400)
+
+    @override_settings(RATE_LIMIT_CLIENT_IP_HEADER="X-Forwarded-For")
+    def test_behind_a_proxy_buckets_are_per_forwarded_ip(self):
+        def signup(forwarded_for):
+            return self.client.post(
+                reverse("signup"),
+                {"username": "alice"},
+                content_type="application/json",
+                REMOTE_ADDR="10.0.0.254",
+                HTTP_X_FORWARDED_FOR=forwarded_for,
+            ).status_code
+
+        self.assertEqual([signup("1.1.1.1"), signup("1.1.1.2")], [400, 400])
+        # A client-supplied address before the proxy's doesn't get a new bucket
+        self.assertEqual(signup("9.9.9.9, 1.1.1.1"), 429)
+
+    def test_tokens_refill_evenly(self):
+        self.assertEqual([take_token("bucket", 2, 60, now=0) for _ in range(2)], [0, 0])
+        self.assertEqual(take_token("bucket", 2, 60, now=10), 20)
+        self.assertEqual(take_token("bucket", 2, 60, now=30), 0)
+        self.assertEqual(take_token("bucket", 2, 60, now=30), 30)
+
+    def test_full_buckets_are_deleted_when_a_new_one_is_made(self):
+        take_token("old", 2, 60, now=0)
+        take_token("busy", 1, 3600, now=0)
+
+        self.assertEqual(take_token("new", 2, 60, now=60), 0)
+        self.assertEqual(
+            sorted(RateLimitBucket.objects.values_list("key", flat=True)),
+            ["busy", "new"],
+        )
+
+
+class AuctionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        for user in (self.alice, self.bob, self.carol):
+            Profile.objects.create(user=user, money=1000)
+        self.pokemon = create_pokemon(self.bob, 6)[0]
+        self.client.force_login(self.bob)
+        self.auction = Auction.objects.get(
+            id=self.client.post(
+                reverse("create_auction", args=[self.pokemon.id]),
+                {"starting_price": 100, "duration_hours": 2},
+                content_type="application/json",
+            ).json()["auction"]["id"]
+        )
+
+    def money(self):
+        return dict(Profile.objects.values_list("user__username", "money"))
+
+    def end(self, auction):
+        Auction.objects.filter(id=auction.id).update(ends_at=timezone.now())
+
+    def test_the_leaders_bid_is_held_until_they_are_outbid(self):
+        place_bid(self.auction.id, self.alice, 100)
+        place_bid(self.auction.id, self.carol, 150)
+        place_bid(self.auction.id, self.carol, 200)
+        self.assertEqual(self.money(), {"alice": 1000, "bob": 1000, "carol": 800})
+        self.assertIn(
+            "You were outbid", Notification.objects.get(user=self.alice).message
+        )
+
+        for bidder, amount, error in (
+            (self.alice, 200, "Bids must be at least $201"),
+            (self.alice, 1001, "You don't have enough money for this bid"),
+            (self.bob, 500, "You cannot bid on your own auction"),
+        ):
+            with self.assertRaisesMessage(AuctionError, error):
+                place_bid(self.auction.id, bidder, amount)
+        self.end(self.auction)
+        with self.assertRaisesMessage(AuctionError, "This auction has ended"):
+            place_bid(self.auction.id, self.alice, 300)
+
+    def test_closing_sells_to_the_leader_through_the_sale_path(self):
+        place_bid(self.auction.id, self.alice, 100)
+        place_bid(self.auction.id, self.carol, 250)
+        unsold = Auction.objects.create(
+            pokemon=create_pokemon(self.alice, 7)[0],
+            seller=self.alice,
+            starting_price=10,
+            ends_at=timezone.now(),
+        )
+        self.end(self.auction)
+
+        self.assertEqual(close_expired_auctions(batch_size=1), 2)
+        self.assertEqual(
+            dict(Auction.objects.values_list("id", "status")),
+            {self.auction.id: "sold", unsold.id: "unsold"},
+        )
+        self.pokemon.refresh_from_db()
+        self.assertEqual(self.pokemon.user, self.carol)
+        self.assertEqual(self.money(), {"alice": 1000, "bob": 1250, "carol": 750})
+        history = TradeHistory.objects.get()
+        self.assertEqual((history.trade_type, history.amount), ("auction", 250))
+        self.assertTrue(DomainEvent.objects.filter(event_type="PokemonSold").exists())
+        self.assertEqual(close_expired_auctions(), 0)
+
+    def test_an_auction_whose_pokemon_changed_hands_refunds_the_leader(self):
+        place_bid(self.auction.id, self.alice, 300)
+        self.pokemon.user = self.carol
+        self.pokemon.save()
+        self.end(self.auction)
+
+        close_expired_auctions()
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.status, "cancelled")
+        self.assertEqual(self.money()["alice"], 1000)
+
+    def test_top_bids_are_read_highest_first_in_one_query(self):
+        for bidder, amount in ((self.alice, 100), (self.carol, 120), (self.alice, 150)):
+            place_bid(self.auction.id, bidder, amount)
+
+        with self.assertNumQueries(1):
+            bids = top_bids(self.auction, 2)
+        self.assertEqual(
+            [(bid["bidder"], bid["amount"]) for bid in bids],
+            [("alice", 150), ("carol", 120)],
+        )
+
+
+class BuyOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(name) for name in ("alice", "bob", "carol")
+        )
+        for user in (self.alice, self.bob, self.carol):
+            Profile.objects.create(user=user, money=1000)
+
+    def money(self):
+        return dict(Profile.objects.values_list("user__username", "money"))
+
+    def list_for_money(self, user, pokeapi_id, amount):
+        self.client.force_login(user)
+        return self.client.post(
+            reverse(
+                "create_money_trade", args=[create_pokemon(user, pokeapi_id)[0].id]
+            ),
+            {"amount_asked": amount},
+            content_type="application/json",
+        )
+
+    def test_a_listing_sells_to_the_best_order_at_its_price(self):
+        early = place_buy_order(self.alice, {"pokeapi_id": 4, "price": 80})
+        late = place_buy_order(self.carol, {"pokeapi_id": 4, "price": 80})
+        place_buy_order(self.carol, {"pokeapi_id": 4, "price": 60})
+        self.assertEqual(self.money(), {"alice": 920, "bob": 1000, "carol": 860})
+
+        self.list_for_money(self.bob, 4, 50)
+        early.refresh_from_db()
+        late.refresh_from_db()
+        self.assertEqual((early.status, late.status), ("filled", "open"))
+        self.assertEqual(early.history.amount, 80)
+        self.assertEqual(Pokemon.objects.get(pokeapi_id=4).user, self.alice)
+        self.assertEqual(self.money(), {"alice": 920, "bob": 1080, "carol": 860})
+        self.assertFalse(MoneyTrade.objects.exists())
+
+        # Nothing left at or over the ask, so the listing stays up
+        self.list_for_money(self.bob, 4, 90)
+        self.assertEqual(MoneyTrade.objects.get().status, "active")
+
+    def test_a_listing_filled_at_once_reports_the_sale_not_the_listing(self):
+        order = place_buy_order(self.alice, {"pokeapi_id": 4, "price": 80})
+
+        trade = self.list_for_money(self.bob, 4, 50).json()["trade"]
+
+        order.refresh_from_db()
+        self.assertEqual(
+            (trade["sold"], trade["buyer"], trade["price"], trade["history_id"]),
+            (True, "alice", 80, order.history_id),
+        )
+        self.assertEqual(
+            list(DomainEvent.objects.values_list("event_type", flat=True)),
+            ["PokemonSold"],
+        )
+        self.assertFalse(self.list_for_money(self.bob, 4, 90).json()["trade"]["sold"])
+
+    def test_bulk_listing_reports_each_fill(self):
+        place_buy_order(self.alice, {"pokeapi_id": 4, "price": 80})
+        pokemon = create_pokemon(self.bob, 4, count=2)
+        self.client.force_login(self.bob)
+
+        results = self.client.post(
+            reverse("bulk_create_money_trades"),
+            {"items": [{"pokemon_id": p.id, "amount_asked": 50} for p in pokemon]},
+            content_type="application/json",
+        ).json()["results"]
+
+        self.assertEqual([r["trade"]["sold"] for r in results], [True, False])
+        self.assertEqual(results[0]["trade"]["buyer"], "alice")
+        self.assertEqual(
+            DomainEvent.objects.filter(event_type="ListingCreated")
+            .get()
+            .payload["pokemon_id"],
+            pokemon[1].id,
+        )
+
+    def test_a_listing_passes_over_orders_closed_meanwhile(self):
+        gone = place_buy_order(self.alice, {"pokeapi_id": 4, "price": 80})
+        place_buy_order(self.carol, {"pokeapi_id": 4, "price": 70})
+
+        def claim(order):
+            # The best order is cancelled just after the listing read it
+            if order.id == gone.id:
+                BuyOrder.objects.filter(id=gone.id).update(status="cancelled")
+                return False
+            return bool(
+                BuyOrder.objects.filter(id=order.id, status="open").update(
+                    status="filled"
+                )
+            )
+
+        with mock.patch("api.orders._claim_order", side_effect=claim):
+            trade = self.list_for_money(self.bob, 4, 50).json()["trade"]
+        self.assertEqual((trade["buyer"], trade["price"]), ("carol", 70))
+
+    def test_an_order_reads_past_listings_claimed_meanwhile(self):
+        for amount in range(10, 80, 10):
+            self.list_for_money(self.bob, 7, amount)
+        real_claim = orders._claim_listing
+
+        def claim(listing):
+            # The five cheapest are bought by someone else first
+            if listing.amount_asked <= 50:
+                MoneyTrade.objects.filter(id=listing.id).delete()
+                return False
+            return real_claim(listing)
+
+        with mock.patch("api.orders._claim_listing", side_effect=claim):
+            order = place_buy_order(self.alice, {"pokeapi_id": 7, "price": 100})
+        self.assertEqual(order.history.amount, 60)
+        self.assertEqual(
+            list(MoneyTrade.objects.values_list("amount_asked", flat=True)), [70]
+        )
+
+    def test_an_order_buys_the_cheapest_listing_and_refunds_the_rest(self):
+        for amount in (70, 40, 90):
+            self.list_for_money(self.bob, 7, amount)
+        self.list_for_money(self.carol, 7, 30)
+
+        own = place_buy_order(self.carol, {"pokeapi_id": 7, "price": 100})
+        self.assertEqual(own.history.amount, 40)
+        self.assertEqual(self.money(), {"alice": 1000, "bob": 1040, "carol": 960})
+        self.assertEqual(
+            sorted(MoneyTrade.objects.values_list("amount_asked", flat=True)),
+            [30, 70, 90],
+        )
+
+        order = place_buy_order(self.alice, {"pokeapi_id": 7, "price": 20})
+        self.assertEqual(order.status, "open")
+        self.assertEqual(
+            self.client.get(reverse("species_order_book", args=[7])).json(),
+            {
+                "success": True,
+                "bids": [{"price": 20, "orders": 1}],
+                "asks": [
+                    {"price": 30, "listings": 1},
+                    {"price": 70, "listings": 1},
+                    {"price": 90, "listings": 1},
+                ],
+            },
+        )
+
+    def test_cancelling_releases_the_hold_once(self):
+        order = place_buy_order(self.alice, {"pokeapi_id": 4, "price": 300})
+        cancel_buy_order(self.alice, order.id)
+        self.assertEqual(self.money()["alice"], 1000)
+        with self.assertRaises(BuyOrder.DoesNotExist):
+            cancel_buy_order(self.alice, order.id)
+
+        for data, error in (
+            ({"pokeapi_id": 4, "price": 0}, "price must be a positive integer"),
+            ({"pokeapi_id": "4", "price": 5}, "pokeapi_id must be a positive integer"),
+            (
+                {"pokeapi_id": 4, "price": 1001},
+                "You don't have enough money for this order",
+            ),
+        ):
+            with self.assertRaisesMessage(BuyOrderError, error):
+                place_buy_order(self.alice, data)
+        self.assertEqual(self.money()["alice"], 1000)
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.alice_pokemon = create_pokemon(self.alice, 4, count=3)
+        self.bob_pokemon = create_pokemon(self.bob, 7, count=3)
+        self.requests = [
+            TradeRequest.objects.create(
+                sender=self.alice,
+                receiver=self.bob,
+                sender_pokemon=self.alice_pokemon[i],
+                receiver_pokemon=self.bob_pokemon[i],
+            )
+            for i in range(3)
+        ]
+        self.money = MoneyTrade.objects.create(
+            pokemon=self.bob_pokemon[0], amount_asked=10
+        )
+        self.barter = BarterTrade.objects.create(pokemon=self.bob_pokemon[1])
+
+    def age(self, model, ids, days):
+        model.objects.filter(id__in=ids).update(
+            created_at=timezone.now() - timedelta(days=days)
+        )
+
+    def test_stale_requests_and_listings_expire_in_batches(self):
+        self.age(TradeRequest, [r.id for r in self.requests[:2]], 8)
+        self.age(MoneyTrade, [self.money.id], 31)
+        self.age(BarterTrade, [self.barter.id], 29)
+
+        self.assertEqual(
+            expire_stale(batch_size=1), {"trade_requests": 2, "listings": 1}
+        )
+        self.assertEqual(
+            list(TradeRequest.objects.order_by("id").values_list("status", flat=True)),
+            ["expired", "expired", "pending"],
+        )
+        self.assertEqual(
+            (MoneyTrade.objects.exists(), BarterTrade.objects.exists()), (False, True)
+        )
+        self.assertEqual(Notification.objects.filter(user=self.alice).count(), 2)
+        self.assertIn(
+            "expired and was taken down",
+            Notification.objects.get(user=self.bob).message,
+        )
+        self.assertEqual(
+            DomainEvent.objects.get(event_type="ListingCancelled").payload["reason"],
+            "expired",
+        )
+        self.assertEqual(expire_stale(), {"trade_requests": 0, "listings": 0})
+
+    def test_expired_requests_stop_locking_pokemon_before_the_sweep(self):
+        self.age(TradeRequest, [self.requests[0].id], 8)
+        self.client.force_login(self.bob)
+        response = self.client.post(
+            reverse("respond_trade", args=[self.requests[0].id]),
+            {"action": "accept"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["error"], "This trade request has expired")
+        self.assertEqual(
+            len(self.client.get(reverse("incoming_trades")).json()["trades"]), 2
+        )
+
+        self.client.force_login(self.alice)
+        response = self.client.post(
+            reverse("send_trade"),
+            {
+                "receiver_id": self.bob.id,
+                "sender_pokemon_id": self.alice_pokemon[0].id,
+                "receiver_pokemon_id": self.bob_pokemon[0].id,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(TRADE_REQUEST_EXPIRY_DAYS=0, LISTING_EXPIRY_DAYS=0)
+    def test_zero_days_never_expires(self):
+        self.age(TradeRequest, [r.id for r in self.requests], 400)
+        self.age(MoneyTrade, [self.money.id], 400)
+        self.assertEqual(expire_stale(), {"trade_requests": 0, "listings": 0})
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        thumbnail_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(THUMBNAIL_ROOT=thumbnail_dir))
+        self.get = self.enterContext(
+            mock.patch("api.thumbnails.requests.get", side_effect=fake_sprite_response)
+        )
+        create_pokemon(User.objects.create_user("ash"), 25)
+
+    def test_species_redirects_to_an_immutable_content_hashed_file(self):
+        response = self.client.get(reverse("species_thumbnail", args=[25, 96, "webp"]))
+        self.assertEqual(response.status_code, 302)
+
+        thumbnail = self.client.get(response["Location"])
+        self.assertEqual(thumbnail["Content-Type"], "image/webp")
+        self.assertIn("immutable", thumbnail["Cache-Control"])
+        image = Image.open(BytesIO(thumbnail.content))
+        self.assertEqual((image.format, image.size), ("WEBP", (96, 96)))
+        self.assertLess(len(thumbnail.content), len(sprite_png()) / 4)
+
+        # Warm: no queries, and the source is never fetched again
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse("species_thumbnail", args=[25, 96, "webp"]))
+        self.assertEqual(again["Location"], response["Location"])
+        self.client.get(reverse("species_thumbnail", args=[25, 192, "png"]))
+        self.get.assert_called_once_with("https://example.com/25.png", timeout=mock.ANY)
+
+    def test_unknown_sizes_and_names_are_not_found(self):
+        self.assertEqual(
+            self.client.get(
+                reverse("species_thumbnail", args=[25, 100, "webp"])
+            ).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get(reverse("thumbnail", args=["..-96.png"])).status_code, 404
+        )
+
+    def test_profile_images_come_from_one_sheet_per_collection_version(self):
+        ash = User.objects.get(username="ash")
+        Profile.objects.create(user=ash)
+        create_pokemon(ash, 7, count=3)
+
+        def sprite_atlas():
+            cache.clear()
+            return self.client.get(reverse("user profile", args=["ash"])).json()[
+                "sprite_atlas"
+            ]
+
+        # Until the sheet is rendered, profiles fall back to thumbnails
+        self.assertEqual(sprite_atlas()["tiles"], {})
+        self.get.assert_not_called()
+        self.assertFalse(atlas_root().exists())
+
+        call_command("render_atlases", stdout=mock.Mock())
+        atlas = sprite_atlas()
+        self.assertEqual(len(atlas["sheets"]), 1)
+        self.assertEqual(
+            atlas["tiles"], {"7": [0, 0, 0], "25": [0, ATLAS_TILE_SIZE, 0]}
+        )
+        sheet = Image.open(BytesIO(self.client.get(atlas["sheets"][0]).content))
+        self.assertEqual(sheet.size, (2 * ATLAS_TILE_SIZE, ATLAS_TILE_SIZE))
+        centre = ATLAS_TILE_SIZE // 2
+        self.assertEqual(sheet.getpixel((ATLAS_TILE_SIZE + centre, centre))[3], 255)
+
+        # A new species is a new sheet; only its sprite is fetched
+        create_pokemon(ash, 4)
+        self.assertEqual(sprite_atlas()["tiles"], {})
+        call_command("render_atlases", stdout=mock.Mock())
+        updated = sprite_atlas()
+        self.assertNotEqual(updated["sheets"], atlas["sheets"])
+        self.assertEqual(self.client.get(updated["sheets"][0]).status_code, 200)
+        self.assertEqual(self.get.call_count, 3)
+
+    def test_a_new_source_image_is_a_new_sheet(self):
+        render_atlases([25])
+        sheet = collection_atlas([25])["sheets"][0]
+        Pokemon.objects.filter(pokeapi_id=25).update(
+            image_url="https://example.com/0.png"
+        )
+        self.assertEqual(collection_atlas([25])["sheets"], [])
+        # The view only serves rendered sheets
+        unrendered = reverse("atlas", kwargs={"version": "0" * 16})
+        self.assertEqual(self.client.get(unrendered).status_code, 404)
+
+        self.assertEqual(render_atlases([25]), 1)
+        updated = collection_atlas([25])["sheets"][0]
+        self.assertNotEqual(updated, sheet)
+        self.assertEqual(self.client.get(updated).status_code, 200)
+        self.assertEqual(self.get.call_count, 2)
+        self.get.assert_called_with("https://example.com/0.png", timeout=mock.ANY)
+
+    def test_generate_thumbnails_renders_every_size_and_format(self):
+        call_command("generate_thumbnails", stdout=mock.Mock())
+        rendered = {
+            path.name.split("-")[1]
+            for path in Path(settings.THUMBNAIL_ROOT).glob("*-*")
+        }
+        self.assertEqual(
+            rendered,
+            {f"{size}.{fmt}" for size in (96, 192, 384) for fmt in ("webp", "png")},
+        )
+
+
+@override_settings(DATABASE_READ_REPLICAS=["replica0"], REPLICA_STICKY_SECONDS=30)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.routed = []
+
+    def view(self, status):
+        def view(request):
+            self.routed.append(
+                (self.router.db_for_read(Pokemon), self.router.db_for_read(Session))
+            )
+            return HttpResponse(status=status)
+
+        return view
+
+    def test_reads_use_a_replica_until_the_browser_writes(self):
+        factory = RequestFactory()
+        middleware = ReplicaRoutingMiddleware(self.view(200))
+
+        middleware(factory.get("/"))
+        response = middleware(factory.post("/"))
+        pinned = factory.get("/")
+        pinned.COOKIES[PRIMARY_PIN_COOKIE] = response.cookies[PRIMARY_PIN_COOKIE].value
+        middleware(pinned)
+
+        self.assertEqual(self.routed, [("replica0", None), (None, None), (None, None)])
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]["max-age"], 30)
+        self.assertEqual(self.router.db_for_write(Pokemon), "default")
+
+    def test_failed_writes_do_not_pin(self):
+        response = ReplicaRoutingMiddleware(self.view(400))(RequestFactory().post("/"))
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_reads_inside_a_primary_transaction_stay_on_the_primary(self):
+        with (
+            reading_from("replica0"),
+            mock.patch.object(connections["default"], "in_atomic_block", True),
+        ):
+            self.assertIsNone(self.router.db_for_read(Pokemon))
+
+
+SHARDS = ["shard0", "shard1"]
+
+
+@override_settings(DATABASE_SHARD_ALIASES=SHARDS)
+class ShardingTests(TestCase):
+    # Resolved after setUpClass registers the shards
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        # Shards are registered and migrated before the test transactions open
+        cls.shard_dir = tempfile.TemporaryDirectory()
+        for alias in SHARDS:
+            connections.settings[alias] = {
+                **connections["default"].settings_dict,
+                "NAME": f"{cls.shard_dir.name}/{alias}.sqlite3",
+                "PRAGMAS": {"foreign_keys": "OFF"},
+            }
+        with override_settings(DATABASE_SHARD_ALIASES=SHARDS):
+            call_command("init_shards", verbosity=0, stdout=mock.Mock())
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.shard_dir.cleanup()
+
+    def _should_check_constraints(self, connection):
+        # Shards point at each other's rows by id, without foreign keys
+        return connection.alias not in SHARDS and super()._should_check_constraints(
+            connection
+        )
+
+    def setUp(self):
+        # Users until both shards have one
+        self.users = {}
+        for i in range(100):
+            user = User.objects.create_user(username=f"trainer{i}")
+            self.users.setdefault(shard_for_user(user.id), user)
+            if len(self.users) == len(SHARDS):
+                break
+
+    def catch(self, user, name="pikachu"):
+        # save() routes on the instance; objects.create() only sees the
+        # current shard
+        pokemon = Pokemon(user=user, pokeapi_id=25, name=name, rarity=3)
+        pokemon.save()
+        return pokemon
+
+    def test_rows_are_placed_by_owner_and_found_through_the_directory(self):
+        for shard, user in self.users.items():
+            pokemon = self.catch(user)
+            self.assertEqual(pokemon._state.db, shard)
+            self.assertGreater(pokemon.id, SHARD_ID_SPACE)
+            self.assertEqual(shard_for_username(user.username), shard)
+            self.assertTrue(Pokemon.objects.using(shard).filter(id=pokemon.id).exists())
+            self.assertFalse(Pokemon.objects.using("default").exists())
+            # Users are on every shard so foreign keys resolve locally
+            for alias in SHARDS:
+                self.assertTrue(User.objects.using(alias).filter(id=user.id).exists())
+        self.assertEqual(UserShard.objects.count(), User.objects.count())
+
+    def test_moving_a_pokemon_between_shards_keeps_its_id(self):
+        source, target = (self.users[alias] for alias in SHARDS)
+        pokemon = self.catch(source)
+        MoneyTrade(pokemon=pokemon, amount_asked=50).save()
+        self.assertTrue(MoneyTrade.objects.using("shard0").exists())
+
+        moved = move_pokemon(pokemon, target)
+
+        self.assertEqual((moved.id, moved._state.db), (pokemon.id, "shard1"))
+        self.assertEqual(
+            Pokemon.objects.using("shard1").get(id=pokemon.id).user, target
+        )
+        self.assertFalse(Pokemon.objects.using("shard0").filter(id=pokemon.id).exists())
+        self.assertFalse(MoneyTrade.objects.using("shard0").exists())
+        self.assertEqual(ShardTransaction.objects.get().status, "committed")
+
+    def test_failed_cross_shard_block_rolls_back_on_every_shard(self):
+        with self.assertRaises(ValueError), cross_shard_atomic(*SHARDS):
+            for alias, user in self.users.items():
+                Notification.objects.using(alias).create(user=user, message="hi")
+            raise ValueError
+
+        for alias in SHARDS:
+            self.assertFalse(Notification.objects.using(alias).exists())
+        self.assertEqual(ShardTransaction.objects.get().status, "aborted")
+
+    def test_middleware_routes_unhinted_queries_to_the_users_shard(self):
+        user = next(iter(self.users.values()))
+        self.catch(user)
+        request = RequestFactory().get("/")
+        request.user = user
+        counts = []
+
+        def view(request):
+            counts.append(Pokemon.objects.filter(user=user).count())
+            return HttpResponse()
+
+        ShardMiddleware(view)(request)
+        self.assertEqual(counts, [1])
+        self.assertEqual(Pokemon.objects.using("default").count(), 0)
+
+    def test_buying_from_another_shard_moves_the_pokemon_and_the_money(self):
+        seller, buyer = (self.users[alias] for alias in SHARDS)
+        for user in (seller, buyer):
+            Profile(user=user, money=100).save()
+        pokemon = self.catch(seller)
+        MoneyTrade(pokemon=pokemon, amount_asked=40).save()
+        self.client.force_login(buyer)
+
+        response = self.client.post(reverse("buy_pokemon", args=[pokemon.id]))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        moved = Pokemon.objects.using("shard1").get(id=pokemon.id)
+        self.assertEqual(moved.user, buyer)
+        self.assertFalse(Pokemon.objects.using("shard0").exists())
+        self.assertEqual(Profile.objects.using("shard0").get(user=seller).money, 140)
+        self.assertEqual(Profile.objects.using("shard1").get(user=buyer).money, 60)
+        self.assertTrue(
+            TradeHistory.objects.using("shard1").filter(pokemon_id=moved.id)
+        )
+        for alias, user in self.users.items():
+            self.assertTrue(Notification.objects.using(alias).filter(user=user))
+
+    def test_accepting_a_trade_swaps_pokemon_across_shards(self):
+        sender, receiver = (self.users[alias] for alias in SHARDS)
+        offered, wanted = self.catch(sender), self.catch(receiver, "eevee")
+        # By id: the request lives on the receiver's shard, the offer doesn't
+        trade = TradeRequest(
+            sender=sender,
+            receiver=receiver,
+            sender_pokemon_id=offered.id,
+            receiver_pokemon_id=wanted.id,
+        )
+        trade.save()
+        self.client.force_login(receiver)
+
+        response = self.client.post(
+            reverse("respond_trade", args=[trade.id]),
+            {"action": "accept"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            Pokemon.objects.using("shard1").get(id=offered.id).user, receiver
+        )
+        self.assertEqual(Pokemon.objects.using("shard0").get(id=wanted.id).user, sender)
+        self.assertEqual(TradeRequest.objects.using("shard1").get().status, "accepted")
+        for alias in SHARDS:
+            self.assertEqual(TradeHistory.objects.using(alias).count(), 1)
+
+    def test_profile_pages_read_the_users_shard(self):
+        cache.clear()
+        user = self.users["shard1"]
+        Profile(user=user).save()
+        self.catch(user)
+        # Logged in on the other shard
+        self.client.force_login(self.users["shard0"])
+
+        response = self.client.get(reverse("user profile", args=[user.username]))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()["pokemon"]), 1)
+
+    @mock.patch("api.factories.pb.pokemon_species", side_effect=Exception)
+    @mock.patch("api.views.random_pokemon", side_effect=fake_pokeapi_pokemon)
+    def test_signup_places_the_starter_pokemon_on_the_new_users_shard(self, *mocks):
+        response = self.client.post(
+            reverse("signup"),
+            {"username": "newcomer", "password": "pw", "email": "new@example.com"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201, response.content)
+        shard = shard_for_username("newcomer")
+        self.assertEqual(Pokemon.objects.using(shard).count(), 5)
+        self.assertEqual(Profile.objects.using(shard).count(), 1)
+        self.assertFalse(Pokemon.objects.using("default").exists())
+
+    def test_rollups_and_fraud_checks_read_every_shard_from_its_own_checkpoint(self):
+        def sell(alias, amount):
+            buyer, seller = self.users["shard0"], self.users["shard1"]
+            TradeHistory.objects.using(alias).create(
+                buyer=buyer, seller=seller, amount=amount, trade_type="money"
+            )
+
+        sell("shard0", 100)
+        sell("shard1", 250)
+        sell("shard1", 50)
+        self.assertEqual(refresh_trade_rollups(), 3)
+        self.assertEqual(detect_fraud(), 3)
+        # Lower ids on shard0 still get picked up once shard1 has moved on
+        sell("shard0", 25)
+
+        self.assertEqual(refresh_trade_rollups(), 1)
+        self.assertEqual(detect_fraud(), 1)
+        rollup = TradeRollup.objects.get(granularity="day")
+        self.assertEqual((rollup.trade_count, rollup.money_moved), (4, 425))
+        self.assertEqual((rollup.unique_buyers, rollup.unique_sellers), (1, 1))
+        for name in ("trade_rollups", "fraud_detection"):
+            positions = {
+                alias: Checkpoint.objects.get(name=f"{name}:{alias}").position
+                for alias in SHARDS
+            }
+            for alias in SHARDS:
+                self.assertEqual(
+                    positions[alias], TradeHistory.objects.using(alias).latest("id").id
+                )
+
+    def test_price_backfill_reads_sales_on_every_shard(self):
+        seller, buyer = self.users["shard0"], self.users["shard1"]
+        pokemon = self.catch(buyer)
+        # Bought on shard0 first, then moved to shard1 with its latest sale
+        for alias, amount in (("shard0", 100), ("shard1", 300)):
+            TradeHistory.objects.using(alias).create(
+                buyer=buyer, seller=seller, pokemon_id=pokemon.id, amount=amount
+            )
+
+        self.assertEqual(backfill_price_index(), 1)
+        price = SpeciesPrice.objects.get(pokeapi_id=25)
+        self.assertEqual((price.sale_count, price.last_price), (2, 300))
+
+        TradeHistory.objects.using("shard0").all().delete()
+        TradeHistory.objects.using("shard1").all().delete()
+        # An empty scan leaves the index alone
+        self.assertEqual(backfill_price_index(), 0)
+        self.assertTrue(SpeciesPrice.objects.filter(pokeapi_id=25).exists())
@@ -0,0 +1,150 @@
+"""
+Fixed-size sprite thumbnails, stored on disk under THUMBNAIL_ROOT.
+
+Each source image is downloaded once (sources/<sha256 of URL>) and every
+thumbnail of it is named after a hash of the source bytes, so its URL
+changes whenever the image does and can be cached by browsers forever.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.urls import reverse
+from PIL import Image
+
+from .models import Pokemon
+
+THUMBNAIL_SIZES = (96, 192, 384)
+DEFAULT_THUMBNAIL_SIZE = 192
+# URL extension -> (Pillow format, content type)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+THUMBNAIL_NAME = re.compile(r"[0-9a-f]{16}-\d+\.(webp|png)")
+# Used for species no stored Pokemon has an image for
+OFFICIAL_ARTWORK_URL = (
+    "https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/"
+    "other/official-artwork/{pokeapi_id}.png"
+)
+SOURCE_TIMEOUT = 10
+# species -> thumbnail name; a species' artwork practically never changes
+SPECIES_THUMBNAIL_TIMEOUT = 24 * 60 * 60
+
+
+class ThumbnailError(Exception):
+    """The source image could not be fetched or decoded."""
+
+
+def thumbnail_root() -> Path:
+    return Path(settings.THUMBNAIL_ROOT)
+
+
+def species_thumbnail_url(
+    pokeapi_id: int, size: int = DEFAULT_THUMBNAIL_SIZE, fmt: str = "webp"
+) -> str:
+    return reverse(
+        "species_thumbnail", kwargs={"pokeapi_id": pokeapi_id, "size": size, "fmt": fmt}
+    )
+
+
+def write_atomic(path: Path, data: bytes):
+    """Writes via a temporary file, so concurrent readers never see half a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def fetch_source(url: str) -> bytes:
+    """Returns the source image, downloading it on first use only."""
+    path = thumbnail_root() / "sources" / hashlib.sha256(url.encode()).hexdigest()
+    if path.exists():
+        return path.read_bytes()
+    try:
+        response = requests.get(url, timeout=SOURCE_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise ThumbnailError(f"Could not fetch {url}: {e}") from e
+    write_atomic(path, response.content)
+    return response.content
+
+
+def render_thumbnail(data: bytes, size: int, fmt: str) -> bytes:
+    """Scales an image to fit a size x size box, keeping transparency."""
+    try:
+        image = Image.open(BytesIO(data))
+        image = image.convert("RGBA")
+    except (OSError, ValueError) as e:
+        raise ThumbnailError(f"Could not decode image: {e}") from e
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    out = BytesIO()
+    pil_format = THUMBNAIL_FORMATS[fmt][0]
+    if pil_format == "WEBP":
+        image.save(out, pil_format, quality=80, method=6)
+    else:
+        image.save(out, pil_format, optimize=True)
+    return out.getvalue()
+
+
+def ensure_thumbnail(url: str, size: int, fmt: str) -> str:
+    """Returns the file name of a thumbnail of `url`, rendering it if missing."""
+    data = fetch_source(url)
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{digest}-{size}.{fmt}"
+    path = thumbnail_root() / name
+    if not path.exists():
+        write_atomic(path, render_thumbnail(data, size, fmt))
+    return name
+
+
+def species_source_url(pokeapi_id: int) -> str:
+    # Min, so species_source_urls picks the same image in its grouped query
+    image_url = (
+        Pokemon.objects.filter(pokeapi_id=pokeapi_id)
+        .exclude(image_url__isnull=True)
+        .exclude(image_url="")
+        .aggregate(source=Min("image_url"))["source"]
+    )
+    return image_url or OFFICIAL_ARTWORK_URL.format(pokeapi_id=pokeapi_id)
+
+
+def species_source_urls(pokeapi_ids=None) -> dict[int, str]:
+    """species_source_url for many species (all stored ones by default)."""
+    queryset = Pokemon.objects.exclude(image_url__isnull=True).exclude(image_url="")
+    if pokeapi_ids is not None:
+        queryset = queryset.filter(pokeapi_id__in=pokeapi_ids)
+    sources = dict(
+        queryset.values("pokeapi_id")
+        .annotate(source=Min("image_url"))
+        .values_list("pokeapi_id", "source")
+        .order_by()
+    )
+    for pokeapi_id in pokeapi_ids or ():
+        sources.setdefault(
+            pokeapi_id, OFFICIAL_ARTWORK_URL.format(pokeapi_id=pokeapi_id)
+        )
+    return sources
+
+
+def species_thumbnail_key(pokeapi_id: int, size: int, fmt: str) -> str:
+    return f"species_thumbnail:{pokeapi_id}:{size}:{fmt}"
+
+
+def species_thumbnail(pokeapi_id: int, size: int, fmt: str, source_url=None) -> str:
+    """Thumbnail file name for a species, remembered in the cache."""
+    key = species_thumbnail_key(pokeapi_id, size, fmt)
+    name = cache.get(key)
+    if name is None or not (thumbnail_root() / name).exists():
+        name = ensure_thumbnail(source_url or species_source_url(pokeapi_id), size, fmt)
+        cache.set(key, name, SPECIES_THUMBNAIL_TIMEOUT)
+    return name
@@ -16,10 +16,17 @@ urlpatterns = [
         views.manage_trade,
         name="manage_trade",
     ),
+    path("admin/trades/bulk/", views.bulk_manage_trades, name="bulk_manage_trades"),
     path("admin/report/<int:report_id>/", views.manage_report, name="manage_report"),
     path("admin/reports/", views.list_reports, name="list_reports"),
     path("admin/activity/", views.trade_activity, name="trade_activity"),
+    path("admin/metrics/", views.request_metrics, name="request_metrics"),
     path("user/<str:username>", views.user_username, name="user profile"),
+    path(
+        "user/<str:username>/valuation",
+        views.user_valuation,
+        name="user_valuation",
+    ),
     path("pokemon/<int:pokemon_id>/", views.pokemon_detail, name="pokemon_detail"),
     path(
         "pokemon/<int:pokemon_id>/trade/money/",
@@ -36,7 +43,55 @@ urlpatterns = [
         views.cancel_trade,
         name="cancel_trade",
     ),
+    path(
+        "pokemon/trade/money/bulk/",
+        views.bulk_create_money_trades,
+        name="bulk_create_money_trades",
+    ),
+    path(
+        "pokemon/trade/barter/proposals/",
+        views.barter_proposals,
+        name="barter_proposals",
+    ),
+    path(
+        "pokemon/trade/barter/bulk/",
+        views.bulk_create_barter_trades,
+        name="bulk_create_barter_trades",
+    ),
+    path(
+        "pokemon/trade/cancel/bulk/",
+        views.bulk_cancel_trades,
+        name="bulk_cancel_trades",
+    ),
+    path("species/<int:pokeapi_id>/price/", views.species_price, name="species_price"),
+    path(
+        "species/<int:pokeapi_id>/orders/",
+        views.species_order_book,
+        name="species_order_book",
+    ),
+    path("orders/", views.buy_orders, name="buy_orders"),
+    path("orders/add/", views.create_buy_order, name="create_buy_order"),
+    path(
+        "orders/<int:order_id>/cancel/",
+        views.cancel_buy_order_view,
+        name="cancel_buy_order",
+    ),
+    path(
+        "thumbnails/species/<int:pokeapi_id>/<int:size>.<str:fmt>",
+        views.species_thumbnail_view,
+        name="species_thumbnail",
+    ),
+    path("thumbnails/atlases/<str:version>.webp", views.atlas_view, name="atlas"),
+    path("thumbnails/<str:name>", views.thumbnail_view, name="thumbnail"),
     path("pokemon/<int:pokemon_id>/buy/", views.buy_pokemon, name="buy_pokemon"),
+    path(
+        "pokemon/<int:pokemon_id>/auction/",
+        views.create_auction_view,
+        name="create_auction",
+    ),
+    path("auctions/", views.auctions, name="auctions"),
+    path("auctions/<int:auction_id>/", views.auction_detail, name="auction_detail"),
+    path("auctions/<int:auction_id>/bid/", views.bid_on_auction, name="bid_on_auction"),
     path("marketplace/filter/", views.filter_marketplace, name="filter_marketplace"),
     path("marketplace/history/", views.trade_history_view, name="trade_history"),
     path("featured-pokemon/", views.featured_pokemon, name="featured_pokemon"),
@@ -44,6 +99,13 @@ urlpatterns = [
     path(
         "notifications/read/", views.mark_notifications_read, name="notifications_read"
     ),
+    path("wishlist/", views.wishlist, name="wishlist"),
+    path("wishlist/add/", views.add_wishlist_alert, name="add_wishlist_alert"),
+    path(
+        "wishlist/<int:alert_id>/delete/",
+        views.delete_wishlist_alert,
+        name="delete_wishlist_alert",
+    ),
     path("send-trade/", views.send_trade_request, name="send_trade"),
     path(
         "respond-trade/<int:trade_id>/",
@@ -57,7 +119,7 @@ urlpatterns = [
         name="incoming-trades-pokemon",
     ),
     path("profile/<int:user_id>/", views.user_profile, name="user_profile"),
-    path("my-pokemon/", views.my_pokemon_view),
+    path("my-pokemon/", views.my_pokemon_view, name="my_pokemon"),
     path("chat/", views.chatbot_chat, name="chatbot_chat"),
     path(
         "reset-password-confirm/<uidb64>/<token>/",
@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import Case, Count, F, OuterRef, Subquery, When
+from django.utils import timezone
+
+from .cache import VALUATION_TIMEOUT, species_price_version_key, valuation_key
+from .models import Pokemon, SpeciesPrice, User
+from .pricing import MIN_SALES_FOR_MEDIAN
+
+
+def _species_value():
+    """Per-species unit value, mirroring pricing.suggested_price in SQL."""
+    return Subquery(
+        SpeciesPrice.objects.filter(pokeapi_id=OuterRef("pokeapi_id"))
+        .annotate(
+            value=Case(
+                When(sale_count__gte=MIN_SALES_FOR_MEDIAN, then=F("median_price")),
+                default=F("last_price"),
+            )
+        )
+        .values("value")[:1]
+    )
+
+
+def compute_valuation(user: User) -> tuple[dict, list[int]]:
+    """
+    Values a collection in one grouped query; returns the valuation and the
+    species it covers.
+
+    Pokemon are counted per species and joined to the price table, so the
+    row count is bounded by the number of species, not the collection size.
+    Species that have never sold are counted but contribute nothing.
+    """
+    species_rows = (
+        Pokemon.objects.filter(user=user)
+        .values("pokeapi_id")
+        .annotate(count=Count("id"), unit_value=_species_value())
+        .order_by()
+    )
+
+    total_value = 0
+    pokemon_count = 0
+    priced_count = 0
+    species = []
+    for row in species_rows:
+        species.append(row["pokeapi_id"])
+        pokemon_count += row["count"]
+        if row["unit_value"] is not None:
+            priced_count += row["count"]
+            total_value += row["count"] * row["unit_value"]
+
+    valuation = {
+        "total_value": total_value,
+        "pokemon_count": pokemon_count,
+        "priced_pokemon_count": priced_count,
+        "computed_at": timezone.now().isoformat(),
+    }
+    return valuation, species
+
+
+def get_valuation(user: User) -> dict:
+    """
+    Returns the cached valuation for a user, computing it on a miss.
+
+    The user's own trades drop the entry. A material price move of one of
+    their species bumps that species' version instead, which this compares
+    against when it reads the entry.
+    """
+    key = valuation_key(user.id)
+    entry = cache.get(key)
+    if entry is not None:
+        started_at, species, valuation = entry
+        versions = cache.get_many(
+            [species_price_version_key(pokeapi_id) for pokeapi_id in species]
+        )
+        if all(version < started_at for version in versions.values()):
+            return valuation
+
+    started_at = time.time()
+    valuation, species = compute_valuation(user)
+    cache.set(key, (started_at, species, valuation), VALUATION_TIMEOUT)
+    return valuation
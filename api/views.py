@@ -5,30 +5,51 @@ import requests
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
 
+from .atlases import ATLAS_VERSION, atlas_path, collection_atlas
+from .auctions import create_auction, place_bid, top_bids
+from .barter import index_barter_listings, proposals_for_user
+from .cache import (
+    PROFILE_PAGE_TIMEOUT,
+    invalidate_profile_pages,
+    invalidate_valuations,
+    profile_page_key,
+    user_snapshot,
+)
+from .events import record_event, record_events
+from .expiry import live_trade_requests, trade_request_expired
 from .factories import (
+    format_auction_data,
+    format_barter_proposal_data,
     format_barter_trade_data,
+    format_buy_order_data,
     format_money_trade_data,
+    format_money_trade_sale_data,
     format_notification_data,
     format_pokemon_data,
     format_trade_history_data,
     format_trade_request_data,
     format_user_data,
+    format_wishlist_alert_data,
     notification_factory,
     pokemon_factory,
     trade_history_factory,
 )
 
 # Import models and factories
+from .middleware import route_metrics
 from .models import (
+    Auction,
     BarterTrade,
+    BuyOrder,
     MoneyTrade,
     Notification,
     Pokemon,
@@ -36,8 +57,40 @@ from .models import (
     TradeHistory,
     TradeReport,
     TradeRequest,
+    WishlistAlert,
 )
+from .moderation import ModerationError, moderate_trades, select_trades
+from .orders import cancel_buy_order, match_listings, order_book, place_buy_order
 from .pokeapi import random_pokemon
+from .pricing import format_species_price_data
+from .rollups import GRANULARITIES, rollup_summary
+from .sales import SaleError, hold_funds, sale_atomic, settle_sale
+from .sharding import (
+    bulk_create_on_owner_shards,
+    cross_shard_atomic,
+    get_on_any_shard,
+    move_pokemon,
+    on_shard,
+    shard_aliases,
+    shard_for_user,
+    shard_for_username,
+    shard_of,
+)
+from .thumbnails import (
+    THUMBNAIL_FORMATS,
+    THUMBNAIL_NAME,
+    THUMBNAIL_SIZES,
+    ThumbnailError,
+    species_thumbnail,
+    thumbnail_root,
+)
+from .valuation import get_valuation
+from .wishlist import WishlistError, create_alert, notify_wishlists
+
+MAX_ACTIVITY_DAYS = 365
+# Most Pokemon one bulk listing request may create or cancel
+MAX_BULK_ITEMS = 500
+FLAGGED_TRADES_SHOWN = 20
 
 
 def index(_):
@@ -168,6 +221,46 @@ def mark_notifications_read(request):
     return JsonResponse({"success": True})
 
 
+@require_GET
+@login_required
+def wishlist(request):
+    alerts = WishlistAlert.objects.filter(user=request.user).order_by("-created_at")
+    return JsonResponse(
+        {
+            "success": True,
+            "alerts": [format_wishlist_alert_data(alert) for alert in alerts],
+        }
+    )
+
+
+@require_POST
+@login_required
+def add_wishlist_alert(request):
+    """
+    Registers an alert: {"pokeapi_id", "pokemon_type", "min_rarity",
+    "max_price"}, each optional. Matching new listings send a notification.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise WishlistError("Expected a JSON object")
+        alert = create_alert(request.user, data)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    return JsonResponse(
+        {"success": True, "alert": format_wishlist_alert_data(alert)}, status=201
+    )
+
+
+@require_POST
+@login_required
+def delete_wishlist_alert(request, alert_id):
+    deleted, _ = WishlistAlert.objects.filter(id=alert_id, user=request.user).delete()
+    if not deleted:
+        return JsonResponse({"success": False, "error": "Alert not found"}, status=404)
+    return JsonResponse({"success": True})
+
+
 def filter_marketplace(request):
     query = request.GET.get("q", "").strip().lower()
     rarity = request.GET.get("rarity")
@@ -199,9 +292,10 @@ def filter_marketplace(request):
 
 def user_view(request):
     if request.user.is_authenticated:
-        # Use the formatting helper (which handles profile creation)
-        user_data = format_user_data(request.user)
-        return JsonResponse({"isAuthenticated": True, "user": user_data})
+        # Cached format_user_data, dropped whenever the profile changes
+        return JsonResponse(
+            {"isAuthenticated": True, "user": user_snapshot(request.user)}
+        )
     return JsonResponse({"isAuthenticated": False})
 
 
@@ -221,40 +315,65 @@ def my_pokemon_view(request):
 
 
 def user_username(_, username):
-    user = get_object_or_404(User, username=username)
-    profile = get_object_or_404(Profile, user=user)  # Assume profile exists now
-
-    pokemon_queryset = Pokemon.objects.filter(user=user).prefetch_related(
-        "money_trade_listing", "barter_trade_listing"
-    )
+    """
+    Public profile page. The rendered JSON is cached per username and
+    dropped when the user's Pokemon change owner, a listing of theirs is
+    created, cancelled or moderated, or their money changes.
+    """
+    key = profile_page_key(username)
+    content = cache.get(key)
+    if content is not None:
+        return HttpResponse(content, content_type="application/json")
+
+    # The user's rows are on their shard, whoever is asking
+    with on_shard(shard_for_username(username)):
+        user = get_object_or_404(User, username=username)
+        profile = get_object_or_404(Profile, user=user)  # Assume profile exists now
+
+        pokemon_queryset = (
+            Pokemon.objects.filter(user=user)
+            .select_related("user")
+            .prefetch_related("money_trade_listing", "barter_trade_listing")
+        )
 
-    # Use formatting helpers
-    user_data = format_user_data(user, profile)
-    pokemon_data = [format_pokemon_data(p) for p in pokemon_queryset]
+        # Use formatting helpers
+        user_data = format_user_data(user, profile)
+        pokemon_data = [format_pokemon_data(p) for p in pokemon_queryset]
+        sprite_atlas = collection_atlas(p["pokeapi_id"] for p in pokemon_data)
 
-    # Formatting for open trades can stay simple or be moved to factory if needed
-    money_trades = list(
-        MoneyTrade.objects.filter(pokemon__user=user, status="active").values(
-            "id", "amount_asked", "pokemon__id", "pokemon__name"
+        # Formatting for open trades can stay simple or be moved to factory if needed
+        money_trades = list(
+            MoneyTrade.objects.filter(pokemon__user=user, status="active").values(
+                "id", "amount_asked", "pokemon__id", "pokemon__name"
+            )
         )
-    )
-    barter_trades = list(
-        BarterTrade.objects.filter(pokemon__user=user, status="active").values(
-            "id", "trade_preferences", "pokemon__id", "pokemon__name"
+        barter_trades = list(
+            BarterTrade.objects.filter(pokemon__user=user, status="active").values(
+                "id", "trade_preferences", "pokemon__id", "pokemon__name"
+            )
         )
-    )
 
-    return JsonResponse(
+    response = JsonResponse(
         {
             "success": True,
             "user": user_data,
             "pokemon": pokemon_data,
+            "sprite_atlas": sprite_atlas,
             "open_trades": {
                 "money_trades": money_trades,
                 "barter_trades": barter_trades,
             },
         }
     )
+    cache.set(key, response.content, PROFILE_PAGE_TIMEOUT)
+    return response
+
+
+@require_GET
+def user_valuation(_, username):
+    """Estimated market value of a user's collection, cached per user."""
+    user = get_object_or_404(User, username=username)
+    return JsonResponse({"success": True, "valuation": get_valuation(user)})
 
 
 @require_POST
@@ -270,16 +389,21 @@ def signup_view(request):
         )
 
     user = User.objects.create_user(username=username, email=email, password=password)
-    profile = Profile.objects.create(user=user)
-    user_pokemon_instances = []
-
-    for _ in range(5):
-        pokeapi_data = random_pokemon()
-        # Use the Pokemon factory to create the instance
-        pokemon_instance = pokemon_factory.create_pokemon_instance(user, pokeapi_data)
-        user_pokemon_instances.append(pokemon_instance)
+    # The middleware saw no user: place the new rows on their shard here
+    with on_shard(shard_for_user(user.id)):
+        profile = Profile.objects.create(user=user)
+        user_pokemon_instances = []
+
+        for _ in range(5):
+            pokeapi_data = random_pokemon()
+            # Use the Pokemon factory to create the instance
+            pokemon_instance = pokemon_factory.create_pokemon_instance(
+                user, pokeapi_data
+            )
+            user_pokemon_instances.append(pokemon_instance)
 
-    Pokemon.objects.bulk_create(user_pokemon_instances)
+        Pokemon.objects.bulk_create(user_pokemon_instances)
+    invalidate_valuations(user.id)
 
     # Use the formatting helper
     user_data = format_user_data(user, profile)
@@ -302,24 +426,34 @@ def cancel_trade(request, pokemon_id):
             status=404,
         )
 
-    deleted_trade = False
-    try:
-        trade = pokemon.money_trade_listing
-        trade.delete()
-        deleted_trade = True
-    except (MoneyTrade.DoesNotExist, AttributeError):
-        pass
+    deleted_trades = {}
+    with transaction.atomic():
+        try:
+            trade = pokemon.money_trade_listing
+            deleted_trades["money"] = trade.id
+            trade.delete()
+        except (MoneyTrade.DoesNotExist, AttributeError):
+            pass
 
-    try:
-        trade = pokemon.barter_trade_listing
-        # Clear related offers if needed (model doesn't show this field anymore)
-        # Pokemon.objects.filter(offered_in_trade=trade).update(offered_in_trade=None)
-        trade.delete()
-        deleted_trade = True
-    except (BarterTrade.DoesNotExist, AttributeError):
-        pass
-
-    if deleted_trade:
+        try:
+            trade = pokemon.barter_trade_listing
+            # Clear related offers if needed (model doesn't show this field anymore)
+            # Pokemon.objects.filter(offered_in_trade=trade).update(offered_in_trade=None)
+            deleted_trades["barter"] = trade.id
+            trade.delete()
+        except (BarterTrade.DoesNotExist, AttributeError):
+            pass
+
+        if deleted_trades:
+            record_event(
+                "ListingCancelled",
+                [request.user.id],
+                pokemon_id=pokemon.id,
+                trades=deleted_trades,
+            )
+
+    if deleted_trades:
+        invalidate_profile_pages(request.user.id)
         return JsonResponse(
             {"success": True, "message": "Trade listing deleted successfully."}
         )
@@ -350,10 +484,12 @@ def trade_history_view(request):
 @login_required
 def buy_pokemon(request, pokemon_id):
     try:
-        pokemon = (
-            Pokemon.objects.select_related("user")
-            .prefetch_related("money_trade_listing")
-            .get(id=pokemon_id)
+        # Likely on the seller's shard rather than the buyer's
+        pokemon = get_on_any_shard(
+            Pokemon.objects.select_related("user").prefetch_related(
+                "money_trade_listing"
+            ),
+            id=pokemon_id,
         )
     except Pokemon.DoesNotExist:
         return JsonResponse(
@@ -375,64 +511,31 @@ def buy_pokemon(request, pokemon_id):
         )
 
     buyer_profile = get_object_or_404(Profile, user=request.user)
-    seller_profile = get_object_or_404(Profile, user=pokemon.user)
-
+    insufficient = "You don't have enough money for this purchase"
     if buyer_profile.money < money_trade.amount_asked:
-        return JsonResponse(
-            {
-                "success": False,
-                "error": "You don't have enough money for this purchase",
-            },
-            status=400,
-        )
+        return JsonResponse({"success": False, "error": insufficient}, status=400)
 
-    with transaction.atomic():
-        buyer_profile.money -= money_trade.amount_asked
-        seller_profile.money += money_trade.amount_asked
-        buyer_profile.save()
-        seller_profile.save()
-
-        old_owner = pokemon.user
-        pokemon.user = request.user
-        pokemon.save()
-
-        # Mark the trade as completed instead of deleting it
-        money_trade_id = money_trade.id
-        money_trade.status = "completed"
-        money_trade.save()
-
-        TradeHistory.objects.create(
-            buyer=request.user,
-            seller=old_owner,
-            pokemon=pokemon,
-            amount=money_trade.amount_asked,
-            trade_type="money",
-            trade_ref_id=money_trade_id,
-        )
-
-        # Mark trade as completed instead of deleting? Or delete is fine.
-        money_trade.delete()  # Or money_trade.status = 'completed'; money_trade.save()
-
-        # Use the Notification factory
-        notification_to_seller = notification_factory.create_notification(
-            user=old_owner,
-            message=(
-                f"Your Pokémon {pokemon.name} was sold to "
-                f"{request.user.username} for ${money_trade.amount_asked}."
-            ),
-            link=f"/pokemon/{pokemon.id}",
-        )
-        notification_to_buyer = notification_factory.create_notification(
-            user=request.user,
-            message=(
-                f"You bought {pokemon.name} from "
-                f"{old_owner.username} for ${money_trade.amount_asked}."
-            ),
-            link=f"/pokemon/{pokemon.id}",
-        )
-        Notification.objects.bulk_create(
-            [notification_to_seller, notification_to_buyer]
-        )
+    try:
+        with sale_atomic(pokemon, request.user):
+            # Checked again by the UPDATE, in case the money was spent meanwhile
+            if not hold_funds(request.user.id, money_trade.amount_asked):
+                raise SaleError(insufficient)
+            # Only one of two buyers racing for the listing gets to delete it
+            money_trade_id = money_trade.id
+            deleted, _ = (
+                MoneyTrade.objects.using(shard_of(pokemon))
+                .filter(id=money_trade_id, status="active")
+                .delete()
+            )
+            if not deleted:
+                raise SaleError("This Pokemon is not for sale")
+            old_owner = pokemon.user
+            settle_sale(
+                pokemon, request.user, money_trade.amount_asked, "money", money_trade_id
+            )
+    except SaleError as error:
+        # Raised rather than returned, to roll back every database involved
+        return JsonResponse({"success": False, "error": str(error)}, status=400)
 
     return JsonResponse(
         {
@@ -443,7 +546,7 @@ def buy_pokemon(request, pokemon_id):
                 "name": pokemon.name,
                 "previous_owner": old_owner.username,
             },
-            "money_remaining": buyer_profile.money,
+            "money_remaining": buyer_profile.money - money_trade.amount_asked,
         }
     )
 
@@ -467,6 +570,56 @@ def pokemon_detail(request, pokemon_id):
     )
 
 
+@require_GET
+def species_price(_, pokeapi_id):
+    """Market price summary, daily history and suggested asking price for a species."""
+    return JsonResponse(
+        {"success": True, "price": format_species_price_data(pokeapi_id)}
+    )
+
+
+@require_GET
+def species_thumbnail_view(_, pokeapi_id, size, fmt):
+    """Redirects to the current content-hashed thumbnail of a species."""
+    if size not in THUMBNAIL_SIZES or fmt not in THUMBNAIL_FORMATS:
+        raise Http404("Unknown thumbnail size or format")
+    try:
+        name = species_thumbnail(pokeapi_id, size, fmt)
+    except ThumbnailError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=502)
+    response = redirect("thumbnail", name=name)
+    # Short, so a changed sprite is picked up within the day
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+@require_GET
+def thumbnail_view(_, name):
+    """Serves a rendered thumbnail; its name changes with its content."""
+    path = thumbnail_root() / name
+    if not THUMBNAIL_NAME.fullmatch(name) or not path.exists():
+        raise Http404("Thumbnail not found")
+    # A few KB at most, so read whole rather than streamed
+    response = HttpResponse(
+        path.read_bytes(), content_type=THUMBNAIL_FORMATS[path.suffix[1:]][1]
+    )
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@require_GET
+def atlas_view(_, version):
+    """Serves a collection sprite sheet rendered by render_atlases."""
+    path = atlas_path(version)
+    if not ATLAS_VERSION.fullmatch(version) or not path.exists():
+        raise Http404("Atlas not found")
+    data = path.read_bytes()
+    response = HttpResponse(data, content_type="image/webp")
+    # The version is a hash of the species on the sheet
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 @require_POST
 @login_required
 def create_money_trade(request, pokemon_id):
@@ -490,6 +643,7 @@ def create_money_trade(request, pokemon_id):
     if (
         MoneyTrade.objects.filter(pokemon=pokemon, status="active").exists()
         or BarterTrade.objects.filter(pokemon=pokemon, status="active").exists()
+        or Auction.objects.filter(pokemon=pokemon, status="active").exists()
     ):
         return JsonResponse(
             {"success": False, "error": "Pokemon is already listed in an active trade"},
@@ -497,22 +651,64 @@ def create_money_trade(request, pokemon_id):
         )
 
     # Direct creation is simple enough here, no complex logic needed yet
-    trade = MoneyTrade.objects.create(
-        pokemon=pokemon,
-        amount_asked=amount_asked,
-        status="active",  # Explicitly set status
-    )
+    with transaction.atomic():
+        trade = MoneyTrade.objects.create(
+            pokemon=pokemon,
+            amount_asked=amount_asked,
+            pokeapi_id=pokemon.pokeapi_id,
+            status="active",  # Explicitly set status
+        )
+        _money_listings_created([trade])
+        _record_listings_created(MoneyTrade, [trade])
+    invalidate_profile_pages(request.user.id)
 
     return JsonResponse(
         {
             "success": True,
             # Use formatting helper for consistency
-            "trade": format_money_trade_data(trade) | {"pokemon_id": pokemon.id},
+            "trade": _format_new_money_trade(trade) | {"pokemon_id": pokemon.id},
         },
         status=201,
     )
 
 
+def _format_new_money_trade(trade):
+    # A buy order may have taken the listing as soon as it was created
+    if trade.status == "completed":
+        return format_money_trade_sale_data(trade)
+    return format_money_trade_data(trade) | {"sold": False}
+
+
+def _record_listings_created(model, trades):
+    # Not for listings already sold to a buy order in the same transaction
+    trades = [trade for trade in trades if trade.status == "active"]
+    if not trades:
+        return
+    record_events(
+        "ListingCreated",
+        [
+            {
+                "user_ids": [trade.pokemon.user_id],
+                "pokemon_id": trade.pokemon_id,
+                "trade_type": "money" if model is MoneyTrade else "barter",
+                "trade_id": trade.id,
+            }
+            for trade in trades
+        ],
+    )
+
+
+def _money_listings_created(trades):
+    # Listings a standing buy order takes at once are never announced
+    match_listings(trades)
+    notify_wishlists(trades)
+
+
+def _barter_listings_created(trades):
+    index_barter_listings(trades)
+    notify_wishlists(trades)
+
+
 @require_POST
 @login_required
 def create_barter_trade(request, pokemon_id):
@@ -531,6 +727,7 @@ def create_barter_trade(request, pokemon_id):
     if (
         MoneyTrade.objects.filter(pokemon=pokemon, status="active").exists()
         or BarterTrade.objects.filter(pokemon=pokemon, status="active").exists()
+        or Auction.objects.filter(pokemon=pokemon, status="active").exists()
     ):
         return JsonResponse(
             {"success": False, "error": "Pokemon is already listed in an active trade"},
@@ -538,11 +735,15 @@ def create_barter_trade(request, pokemon_id):
         )
 
     # Direct creation is simple
-    trade = BarterTrade.objects.create(
-        pokemon=pokemon,
-        trade_preferences=trade_preferences,
-        status="active",
-    )
+    with transaction.atomic():
+        trade = BarterTrade.objects.create(
+            pokemon=pokemon,
+            trade_preferences=trade_preferences,
+            status="active",
+        )
+        _record_listings_created(BarterTrade, [trade])
+        _barter_listings_created([trade])
+    invalidate_profile_pages(request.user.id)
 
     return JsonResponse(
         {
@@ -554,6 +755,377 @@ def create_barter_trade(request, pokemon_id):
     )
 
 
+def _bulk_items(request, key):
+    """Parses {key: [...]} from a bulk request body; returns (items, error response)."""
+    try:
+        items = json.loads(request.body).get(key)
+    except (ValueError, AttributeError):
+        items = None
+    if not isinstance(items, list) or not items:
+        return None, JsonResponse(
+            {"success": False, "error": f"A non-empty list of {key} is required"},
+            status=400,
+        )
+    if len(items) > MAX_BULK_ITEMS:
+        return None, JsonResponse(
+            {"success": False, "error": f"At most {MAX_BULK_ITEMS} {key} per request"},
+            status=400,
+        )
+    return items, None
+
+
+def _bulk_failure(pokemon_id, error):
+    return {"pokemon_id": pokemon_id, "success": False, "error": error}
+
+
+def _bulk_ids(pokemon_ids):
+    """
+    Returns per-item results with malformed and repeated ids already failed,
+    and {pokemon_id: index} for the rest.
+    """
+    results = [None] * len(pokemon_ids)
+    wanted = {}
+    for index, pokemon_id in enumerate(pokemon_ids):
+        if not isinstance(pokemon_id, int):
+            results[index] = _bulk_failure(pokemon_id, "pokemon_id is required")
+        elif pokemon_id in wanted:
+            results[index] = _bulk_failure(
+                pokemon_id, "Duplicate pokemon_id in request"
+            )
+        else:
+            wanted[pokemon_id] = index
+    return results, wanted
+
+
+def _owned_with_listings(user, pokemon_ids):
+    """The user's Pokemon among `pokemon_ids` with their listings, in one query."""
+    return (
+        Pokemon.objects.filter(user=user)
+        .select_related("money_trade_listing", "barter_trade_listing")
+        .in_bulk(pokemon_ids)
+    )
+
+
+def _bulk_response(results):
+    created = sum(result["success"] for result in results)
+    return JsonResponse(
+        {
+            "success": created > 0,
+            "succeeded": created,
+            "failed": len(results) - created,
+            "results": results,
+        }
+    )
+
+
+def _listings(pokemon):
+    """The Pokemon's listings by model, from select_related or prefetch caches."""
+    listings = {}
+    for model, attr in (
+        (MoneyTrade, "money_trade_listing"),
+        (BarterTrade, "barter_trade_listing"),
+    ):
+        listing = getattr(pokemon, attr, None)
+        if listing is not None:
+            listings[model] = listing
+    return listings
+
+
+def _bulk_create_trades(request, model, validate, build, format_trade, created=None):
+    """
+    Lists many of the user's Pokemon at once, reporting a result per item.
+
+    Ownership and existing listings of every requested Pokemon are read in
+    one query, valid items are inserted with one bulk_create, and both run
+    in a single transaction so no listing can slip in between. `created`
+    is then called once with all new listings.
+    """
+    items, error = _bulk_items(request, "items")
+    if error:
+        return error
+
+    results, wanted = _bulk_ids(
+        [item.get("pokemon_id") if isinstance(item, dict) else None for item in items]
+    )
+    for pokemon_id, index in list(wanted.items()):
+        item_error = validate(items[index])
+        if item_error:
+            results[index] = _bulk_failure(pokemon_id, item_error)
+            del wanted[pokemon_id]
+
+    with transaction.atomic():
+        owned = _owned_with_listings(request.user, list(wanted))
+        auctioned = set(
+            Auction.objects.filter(pokemon__in=owned, status="active").values_list(
+                "pokemon_id", flat=True
+            )
+        )
+        to_create = []
+        for pokemon_id, index in wanted.items():
+            pokemon = owned.get(pokemon_id)
+            if pokemon is None:
+                item_error = "Pokemon not found or not owned by user"
+            elif pokemon_id in auctioned or any(
+                listing.status == "active" for listing in _listings(pokemon).values()
+            ):
+                item_error = "Pokemon is already listed in an active trade"
+            # Listings are one-to-one, so a closed one of the same kind blocks
+            # a new one until it is cancelled
+            elif model in _listings(pokemon):
+                item_error = "Cancel this Pokemon's closed listing first"
+            else:
+                to_create.append(build(pokemon, items[index]))
+                continue
+            results[index] = _bulk_failure(pokemon_id, item_error)
+
+        trades = model.objects.bulk_create(to_create)
+        if trades and created:
+            created(trades)
+        _record_listings_created(model, trades)
+        for trade in trades:
+            results[wanted[trade.pokemon_id]] = {
+                "pokemon_id": trade.pokemon_id,
+                "success": True,
+                "trade": format_trade(trade),
+            }
+        if to_create:
+            invalidate_profile_pages(request.user.id)
+    return _bulk_response(results)
+
+
+def _validate_amount(item):
+    amount_asked = item.get("amount_asked")
+    if not amount_asked or not isinstance(amount_asked, int) or amount_asked <= 0:
+        return "Valid positive amount required"
+    return None
+
+
+def _validate_preferences(item):
+    if not isinstance(item.get("trade_preferences", ""), str):
+        return "trade_preferences must be a string"
+    return None
+
+
+@require_POST
+@login_required
+def bulk_create_money_trades(request):
+    """Lists many Pokemon for money: {"items": [{"pokemon_id", "amount_asked"}]}."""
+    return _bulk_create_trades(
+        request,
+        MoneyTrade,
+        _validate_amount,
+        lambda pokemon, item: MoneyTrade(
+            pokemon=pokemon,
+            amount_asked=item["amount_asked"],
+            pokeapi_id=pokemon.pokeapi_id,
+            status="active",
+        ),
+        _format_new_money_trade,
+        created=_money_listings_created,
+    )
+
+
+@require_POST
+@login_required
+def bulk_create_barter_trades(request):
+    """Lists many Pokemon for barter: {"items": [{"pokemon_id", "trade_preferences"}]}."""
+    return _bulk_create_trades(
+        request,
+        BarterTrade,
+        _validate_preferences,
+        lambda pokemon, item: BarterTrade(
+            pokemon=pokemon,
+            trade_preferences=item.get("trade_preferences", ""),
+            status="active",
+        ),
+        format_barter_trade_data,
+        created=_barter_listings_created,
+    )
+
+
+@require_GET
+@login_required
+def barter_proposals(request):
+    """
+    Swaps and trade cycles the matching engine found for the user's barter
+    listings, newest first.
+    """
+    return JsonResponse(
+        {
+            "success": True,
+            "proposals": [
+                format_barter_proposal_data(proposal, legs)
+                for proposal, legs in proposals_for_user(request.user)
+            ],
+        }
+    )
+
+
+@require_POST
+@login_required
+def bulk_cancel_trades(request):
+    """
+    Deletes the listings of many Pokemon: {"pokemon_ids": [...]}. Like
+    cancel_trade, a Pokemon without a listing succeeds with cancelled false.
+    """
+    pokemon_ids, error = _bulk_items(request, "pokemon_ids")
+    if error:
+        return error
+
+    results, wanted = _bulk_ids(pokemon_ids)
+    with transaction.atomic():
+        owned = _owned_with_listings(request.user, list(wanted))
+        to_delete = {MoneyTrade: [], BarterTrade: []}
+        cancelled = []
+        for pokemon_id, index in wanted.items():
+            pokemon = owned.get(pokemon_id)
+            if pokemon is None:
+                results[index] = _bulk_failure(
+                    pokemon_id, "Pokemon not found or not owned by user"
+                )
+                continue
+            listings = _listings(pokemon)
+            for model, listing in listings.items():
+                to_delete[model].append(listing.id)
+            if listings:
+                cancelled.append(
+                    {
+                        "user_ids": [request.user.id],
+                        "pokemon_id": pokemon_id,
+                        "trades": {
+                            "money" if model is MoneyTrade else "barter": listing.id
+                            for model, listing in listings.items()
+                        },
+                    }
+                )
+            results[index] = {
+                "pokemon_id": pokemon_id,
+                "success": True,
+                "cancelled": bool(listings),
+            }
+
+        for model, ids in to_delete.items():
+            if ids:
+                model.objects.filter(id__in=ids).delete()
+        if cancelled:
+            record_events("ListingCancelled", cancelled)
+            invalidate_profile_pages(request.user.id)
+    return _bulk_response(results)
+
+
+@require_POST
+@login_required
+def create_auction_view(request, pokemon_id):
+    """Auctions one of the user's Pokemon: {"starting_price", "duration_hours"}."""
+    try:
+        pokemon = Pokemon.objects.get(id=pokemon_id, user=request.user)
+    except Pokemon.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "Pokemon not found or not owned by user"},
+            status=404,
+        )
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        auction = create_auction(pokemon, data)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    auction.seller = request.user
+    return JsonResponse(
+        {"success": True, "auction": format_auction_data(auction)}, status=201
+    )
+
+
+@require_GET
+def auctions(request):
+    """Open auctions, ending soonest first."""
+    open_auctions = (
+        Auction.objects.filter(status="active", ends_at__gt=timezone.now())
+        .select_related("pokemon", "seller", "leader")
+        .order_by("ends_at")[:50]
+    )
+    return JsonResponse(
+        {
+            "success": True,
+            "auctions": [format_auction_data(auction) for auction in open_auctions],
+        }
+    )
+
+
+@require_GET
+def auction_detail(request, auction_id):
+    auction = get_object_or_404(
+        Auction.objects.select_related("pokemon", "seller", "leader"), id=auction_id
+    )
+    return JsonResponse(
+        {"success": True, "auction": format_auction_data(auction, top_bids(auction))}
+    )
+
+
+@require_POST
+@login_required
+def bid_on_auction(request, auction_id):
+    """Bids on an auction: {"amount"}. The amount is held until outbid."""
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        bid = place_bid(auction_id, request.user, data.get("amount"))
+    except Auction.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "Auction not found"}, status=404
+        )
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    return JsonResponse({"success": True, "bid_id": bid.id, "amount": bid.amount})
+
+
+@require_GET
+@login_required
+def buy_orders(request):
+    orders = BuyOrder.objects.filter(user=request.user).order_by("-created_at")[:100]
+    return JsonResponse(
+        {"success": True, "orders": [format_buy_order_data(o) for o in orders]}
+    )
+
+
+@require_POST
+@login_required
+def create_buy_order(request):
+    """
+    Offers to buy any Pokemon of a species: {"pokeapi_id", "price"}. The
+    price is held until the order fills or is cancelled.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        order = place_buy_order(request.user, data)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    return JsonResponse(
+        {"success": True, "order": format_buy_order_data(order)}, status=201
+    )
+
+
+@require_POST
+@login_required
+def cancel_buy_order_view(request, order_id):
+    try:
+        order = cancel_buy_order(request.user, order_id)
+    except BuyOrder.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "Open order not found"}, status=404
+        )
+    return JsonResponse({"success": True, "order": format_buy_order_data(order)})
+
+
+@require_GET
+def species_order_book(_, pokeapi_id):
+    return JsonResponse({"success": True, **order_book(pokeapi_id)})
+
+
 # --- Admin Views ---
 # These views are less repetitive and don't benefit as much from factories
 # for their core logic, but could use formatting helpers if returning complex data.
@@ -572,7 +1144,9 @@ def admin_dashboard(request):
         status__in=["pending", "investigating"]
     ).count()  # Count pending/investigating reports as "flagged" for admin attention
     pending_reports = TradeReport.objects.filter(status="pending").count()
-    recent_trades = TradeHistory.objects.order_by("-timestamp")[:5]
+    recent_trades = TradeHistory.objects.select_related(
+        "pokemon", "buyer", "seller"
+    ).order_by("-timestamp")[:5]
 
     # Simple formatting is okay here
     recent_trades_data = [
@@ -583,7 +1157,7 @@ def admin_dashboard(request):
             "seller": t.seller.username,
             "amount": t.amount,
             "timestamp": t.timestamp.isoformat(),
-            "trade_type": "money" if t.amount > 0 else "barter",
+            "trade_type": t.trade_type,
         }
         for t in recent_trades
     ]
@@ -604,7 +1178,7 @@ def manage_trade(request, trade_type, trade_id):
     """Update trade status (flag/unflag/remove) - Logic remains"""
     try:
         model = MoneyTrade if trade_type == "money" else BarterTrade
-        trade = model.objects.get(id=trade_id)
+        trade = model.objects.select_related("pokemon").get(id=trade_id)
         data = json.loads(request.body)
         action = data.get("action")
 
@@ -623,7 +1197,15 @@ def manage_trade(request, trade_type, trade_id):
             trade.is_flagged = False
 
         trade.admin_notes = data.get("admin_notes", trade.admin_notes)
-        trade.save()
+        with transaction.atomic():
+            trade.save()
+            record_event(
+                "TradeModerated",
+                [trade.pokemon.user_id],
+                action=action,
+                trades={"money" if model is MoneyTrade else "barter": [trade.id]},
+            )
+        invalidate_profile_pages(trade.pokemon.user_id)
         return JsonResponse({"status": "success"})
     except (MoneyTrade.DoesNotExist, BarterTrade.DoesNotExist):
         return JsonResponse({"error": "Trade not found"}, status=404)
@@ -631,6 +1213,44 @@ def manage_trade(request, trade_type, trade_id):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@user_passes_test(is_admin)
+@require_POST
+def bulk_manage_trades(request):
+    """
+    Flag, unflag or remove many trades at once, chosen by id or by filter.
+    Open reports on them move on with the action and an audit row is kept.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ModerationError("Expected a JSON object")
+        selected = select_trades(data)
+        criteria = (
+            {"ids": data["ids"]}
+            if "ids" in data
+            else {"filter": data["filter"], "types": data.get("types")}
+        )
+        audit = moderate_trades(
+            request.user,
+            data.get("action"),
+            selected,
+            criteria,
+            reason=data.get("reason"),
+            notes=data.get("admin_notes"),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(
+        {
+            "status": "success",
+            "audit_id": audit.id,
+            "money_trades": audit.money_trades_updated,
+            "barter_trades": audit.barter_trades_updated,
+            "reports": audit.reports_updated,
+        }
+    )
+
+
 @user_passes_test(is_admin)
 @require_POST
 def manage_report(request, report_id):
@@ -711,9 +1331,24 @@ def list_reports(request):
             }
         )
 
+    # Trades the fraud detector flagged, alongside what users reported
+    flagged_trades = (
+        TradeHistory.objects.filter(is_flagged=True)
+        .select_related("pokemon", "buyer", "seller")
+        .order_by("-timestamp")[:FLAGGED_TRADES_SHOWN]
+    )
+
     return JsonResponse(
         {
             "reports": reports_data,
+            "flagged_trades": [
+                {
+                    "id": history.id,
+                    **format_trade_history_data(history),
+                    "flag_reason": history.flag_reason,
+                }
+                for history in flagged_trades
+            ],
             "total_pages": total_pages,
             "current_page": page,
             "total_count": total_count,
@@ -723,20 +1358,81 @@ def list_reports(request):
 
 @user_passes_test(is_admin)
 def trade_activity(request):
-    """Get recent trade activity for monitoring - Using formatting helper"""
-    days = int(request.GET.get("days", 7))
+    """
+    Get recent trade activity for monitoring.
+
+    `mode=summary` serves hourly or daily totals from the rollup tables as
+    they stand; the rollup_trades command and the trade_rollups event handler
+    keep them current. The default raw mode pages through individual
+    TradeHistory rows.
+    """
+    try:
+        days = int(request.GET.get("days", 7))
+        page = int(request.GET.get("page", 1))
+        per_page = int(request.GET.get("per_page", 50))
+    except ValueError:
+        return JsonResponse(
+            {"error": "days, page and per_page must be integers"}, status=400
+        )
+    days = min(max(days, 1), MAX_ACTIVITY_DAYS)
     since = timezone.now() - timezone.timedelta(days=days)
 
+    if request.GET.get("mode") == "summary":
+        granularity = request.GET.get("granularity", "day")
+        if granularity not in GRANULARITIES:
+            return JsonResponse({"error": "Invalid granularity"}, status=400)
+
+        buckets = rollup_summary(granularity, since)
+        totals = {
+            field: sum(bucket[field] for bucket in buckets)
+            for field in ("trade_count", "money_trade_count", "barter_trade_count")
+        }
+        totals["money_moved"] = sum(bucket["money_moved"] for bucket in buckets)
+        return JsonResponse(
+            {"granularity": granularity, "buckets": buckets, "totals": totals}
+        )
+
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 100)
+
     trades = (
         TradeHistory.objects.filter(timestamp__gte=since)
         .select_related("pokemon", "buyer", "seller")
         .order_by("-timestamp")
     )
 
+    start = (page - 1) * per_page
+    end = start + per_page
+    total_count = trades.count()
+    total_pages = (total_count + per_page - 1) // per_page
+
     # Use the formatting helper
-    trades_data = [format_trade_history_data(t) for t in trades]
+    trades_data = [format_trade_history_data(t) for t in trades[start:end]]
 
-    return JsonResponse({"trades": trades_data})
+    return JsonResponse(
+        {
+            "trades": trades_data,
+            "total_pages": total_pages,
+            "current_page": page,
+            "total_count": total_count,
+        }
+    )
+
+
+@user_passes_test(is_admin)
+@require_GET
+def request_metrics(request):
+    """Per-URL request metrics collected by RequestMetricsMiddleware in this process"""
+    from django.conf import settings
+
+    if request.GET.get("reset"):
+        route_metrics.reset()
+    return JsonResponse(
+        {
+            "enabled": getattr(settings, "REQUEST_METRICS_ENABLED", False),
+            "routes": route_metrics.snapshot(),
+        }
+    )
 
 
 # --- Trade Request Views ---
@@ -763,11 +1459,12 @@ def send_trade_request(request):
         )
 
     # Check if either Pokemon is already in an active trade request
-    # Simplified check:
-    if TradeRequest.objects.filter(
-        Q(sender_pokemon=sender_pokemon) | Q(receiver_pokemon=sender_pokemon),
-        status="pending",
-    ).exists():
+    # Simplified check; requests past their expiry no longer count
+    if (
+        live_trade_requests()
+        .filter(Q(sender_pokemon=sender_pokemon) | Q(receiver_pokemon=sender_pokemon))
+        .exists()
+    ):
         return JsonResponse(
             {
                 "success": False,
@@ -775,10 +1472,13 @@ def send_trade_request(request):
             },
             status=400,
         )
-    if TradeRequest.objects.filter(
-        Q(sender_pokemon=receiver_pokemon) | Q(receiver_pokemon=receiver_pokemon),
-        status="pending",
-    ).exists():
+    if (
+        live_trade_requests()
+        .filter(
+            Q(sender_pokemon=receiver_pokemon) | Q(receiver_pokemon=receiver_pokemon)
+        )
+        .exists()
+    ):
         return JsonResponse(
             {
                 "success": False,
@@ -819,10 +1519,15 @@ def respond_trade_request(request, trade_id):
     if action not in ["accept", "decline"]:
         return JsonResponse({"success": False, "error": "Invalid action"}, status=400)
 
-    # Ensure the trade exists and belongs to the user as receiver
+    # Ensure the trade exists and belongs to the user as receiver. Requests
+    # live on the receiver's shard; the sender's Pokemon may be elsewhere.
+    sharded = bool(shard_aliases())
     trade = get_object_or_404(
         TradeRequest.objects.select_related(
-            "sender", "receiver", "sender_pokemon", "receiver_pokemon"
+            "sender",
+            "receiver",
+            "receiver_pokemon",
+            *(() if sharded else ("sender_pokemon",)),
         ),
         id=trade_id,
         receiver=request.user,
@@ -832,54 +1537,79 @@ def respond_trade_request(request, trade_id):
         return JsonResponse(
             {"success": False, "error": "Trade already resolved"}, status=400
         )
+    if trade_request_expired(trade):
+        return JsonResponse(
+            {"success": False, "error": "This trade request has expired"}, status=400
+        )
 
-    with transaction.atomic():
+    receiver_pokemon = trade.receiver_pokemon
+    sender_pokemon = None
+    shards = [shard_of(trade)]
+    if action == "accept":
+        try:
+            sender_pokemon = (
+                get_on_any_shard(Pokemon.objects, id=trade.sender_pokemon_id)
+                if sharded
+                else trade.sender_pokemon
+            )
+        except Pokemon.DoesNotExist:
+            pass
+        if (
+            sender_pokemon is None
+            or sender_pokemon.user_id != trade.sender_id
+            or receiver_pokemon.user_id != trade.receiver_id
+        ):
+            return JsonResponse(
+                {"success": False, "error": "One of these Pokemon has changed hands"},
+                status=400,
+            )
+        shards.append(shard_of(sender_pokemon))
+
+    with cross_shard_atomic(*shards):
         new_status = "accepted" if action == "accept" else "declined"
         trade.status = new_status
         trade.save()
 
-        sender_pokemon = trade.sender_pokemon
-        receiver_pokemon = trade.receiver_pokemon
         sender = trade.sender
         receiver = trade.receiver  # == request.user
 
         notifications_to_create = []
 
         if action == "accept":
-            # Cancel any active *barter* listings for these specific Pokemon
-            # Money listings might remain, depending on desired logic
-            BarterTrade.objects.filter(
-                pokemon__in=[sender_pokemon, receiver_pokemon], status="active"
-            ).delete()
-
-            # Swap ownership
-            sender_pokemon.user = receiver
-            receiver_pokemon.user = sender
-            sender_pokemon.save()
-            receiver_pokemon.save()
+            # Swap ownership, moving each Pokemon to its new owner's shard.
+            # Their money and barter listings are cancelled.
+            sender_pokemon = move_pokemon(sender_pokemon, receiver)
+            receiver_pokemon = move_pokemon(receiver_pokemon, sender)
 
             # Decline other *pending* trades involving these specific Pokemon
             # Important: Exclude the current trade being accepted
-            conflicting_trades = TradeRequest.objects.filter(
-                Q(sender_pokemon=sender_pokemon)
-                | Q(receiver_pokemon=sender_pokemon)
-                | Q(sender_pokemon=receiver_pokemon)
-                | Q(receiver_pokemon=receiver_pokemon),
-                status="pending",
-            ).exclude(id=trade.id)
+            conflicting_trades = (
+                TradeRequest.objects.filter(
+                    Q(sender_pokemon=sender_pokemon)
+                    | Q(receiver_pokemon=sender_pokemon)
+                    | Q(sender_pokemon=receiver_pokemon)
+                    | Q(receiver_pokemon=receiver_pokemon),
+                    status="pending",
+                )
+                .exclude(id=trade.id)
+                .select_related("sender", "receiver")
+            )
 
             # Notify users whose trades were auto-declined
+            # Compare FK ids so the loop doesn't fetch each related row
             for conflicting_trade in conflicting_trades:
                 other_user = (
                     conflicting_trade.receiver
-                    if conflicting_trade.sender == sender
-                    or conflicting_trade.sender == receiver
+                    if conflicting_trade.sender_id in (sender.id, receiver.id)
                     else conflicting_trade.sender
                 )
                 involved_pokemon = (
                     sender_pokemon.name
-                    if conflicting_trade.sender_pokemon == sender_pokemon
-                    or conflicting_trade.receiver_pokemon == sender_pokemon
+                    if sender_pokemon.id
+                    in (
+                        conflicting_trade.sender_pokemon_id,
+                        conflicting_trade.receiver_pokemon_id,
+                    )
                     else receiver_pokemon.name
                 )
                 notifications_to_create.append(
@@ -897,7 +1627,15 @@ def respond_trade_request(request, trade_id):
             history_entries = trade_history_factory.create_barter_trade_history(
                 sender, receiver, sender_pokemon, receiver_pokemon
             )
-            TradeHistory.objects.bulk_create(history_entries)
+            # Each next to the Pokemon it records, on the receiving side's shard
+            bulk_create_on_owner_shards(TradeHistory, history_entries, "buyer_id")
+            record_event(
+                "TradeAccepted",
+                [sender.id, receiver.id],
+                trade_request_id=trade.id,
+                pokemon_ids=[sender_pokemon.id, receiver_pokemon.id],
+            )
+            transaction.on_commit(lambda: invalidate_valuations(sender.id, receiver.id))
 
             # Create notifications for acceptance
             notifications_to_create.append(
@@ -935,8 +1673,7 @@ def respond_trade_request(request, trade_id):
             )
 
         # Bulk create all notifications generated in this transaction
-        if notifications_to_create:
-            Notification.objects.bulk_create(notifications_to_create)
+        bulk_create_on_owner_shards(Notification, notifications_to_create)
 
     return JsonResponse({"success": True, "new_status": new_status})
 
@@ -944,10 +1681,10 @@ def respond_trade_request(request, trade_id):
 @require_GET
 @login_required
 def incoming_trades_view(request):
-    trades = TradeRequest.objects.filter(
-        receiver=request.user, status="pending"
-    ).select_related(
-        "sender", "sender_pokemon", "receiver", "receiver_pokemon"
+    trades = (
+        live_trade_requests()
+        .filter(receiver=request.user)
+        .select_related("sender", "sender_pokemon", "receiver", "receiver_pokemon")
     )  # Added receiver
 
     # Use the formatting helper
@@ -962,11 +1699,14 @@ def incoming_trades_for_pokemon(request, pokemon_id):
     # Ensure the pokemon belongs to the logged-in user
     pokemon = get_object_or_404(Pokemon, id=pokemon_id, user=request.user)
 
-    trades = TradeRequest.objects.filter(
-        receiver=request.user,  # Redundant check, but safe
-        receiver_pokemon=pokemon,
-        status="pending",
-    ).select_related("sender", "sender_pokemon")
+    trades = (
+        live_trade_requests()
+        .filter(
+            receiver=request.user,  # Redundant check, but safe
+            receiver_pokemon=pokemon,
+        )
+        .select_related("sender", "sender_pokemon")
+    )
 
     # Simpler formatting is sufficient here, or use format_trade_request_data
     trades_data = [
@@ -991,7 +1731,7 @@ def user_profile(request, user_id):
     # Renamed from user_profile to avoid conflict with username view if routes overlap
     target_user = get_object_or_404(User, id=user_id)
     profile = get_object_or_404(Profile, user=target_user)
-    pokemons = Pokemon.objects.filter(user=target_user)
+    pokemons = list(Pokemon.objects.filter(user=target_user))
 
     # Use formatting helpers
     user_data = format_user_data(target_user, profile)
@@ -1012,6 +1752,7 @@ def user_profile(request, user_id):
             "success": True,
             "user": user_data,
             "collection": collection_data,
+            "sprite_atlas": collection_atlas(p.pokeapi_id for p in pokemons),
         }
     )
 
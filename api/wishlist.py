@@ -0,0 +1,138 @@
+"""
+Wishlist alerts: users ask to be told when a Pokemon they want is listed.
+
+Each alert is stored under one match key, its most selective criterion
+("species:25", then "type:fire", then "rarity:4", else "any"). A new
+listing can only match alerts under the few keys its Pokemon produces, so
+matching reads those alerts through the (match_key, max_price) index and
+never looks at the rest, however many there are.
+"""
+
+from django.db.models import Q
+
+from .barter import POKEMON_TYPES
+from .models import MoneyTrade, Notification, WishlistAlert
+
+MAX_ALERTS_PER_USER = 100
+RARITIES = range(1, 6)
+
+
+class WishlistError(ValueError):
+    """The alert's criteria are not valid."""
+
+
+def alert_match_key(pokeapi_id, pokemon_type, min_rarity) -> str:
+    if pokeapi_id is not None:
+        return f"species:{pokeapi_id}"
+    if pokemon_type is not None:
+        return f"type:{pokemon_type}"
+    if min_rarity is not None:
+        return f"rarity:{min_rarity}"
+    return "any"
+
+
+def listing_match_keys(pokemon) -> list[str]:
+    """Every match key an alert wanting this Pokemon could be stored under."""
+    return [
+        f"species:{pokemon.pokeapi_id}",
+        *(f"type:{pokemon_type}" for pokemon_type in pokemon.types),
+        # An alert for "rarity 3 or better" matches rarities 3 to 5
+        *(f"rarity:{rarity}" for rarity in RARITIES if rarity <= pokemon.rarity),
+        "any",
+    ]
+
+
+def create_alert(user, data: dict) -> WishlistAlert:
+    """Validates {pokeapi_id, pokemon_type, min_rarity, max_price} and saves an alert."""
+    pokeapi_id = data.get("pokeapi_id")
+    pokemon_type = data.get("pokemon_type")
+    min_rarity = data.get("min_rarity")
+    max_price = data.get("max_price")
+
+    if pokeapi_id is not None and (not isinstance(pokeapi_id, int) or pokeapi_id <= 0):
+        raise WishlistError("pokeapi_id must be a positive integer")
+    if pokemon_type is not None:
+        if (
+            not isinstance(pokemon_type, str)
+            or pokemon_type.lower() not in POKEMON_TYPES
+        ):
+            raise WishlistError("pokemon_type must be a Pokemon type")
+        pokemon_type = pokemon_type.lower()
+    if min_rarity is not None and min_rarity not in RARITIES:
+        raise WishlistError("min_rarity must be between 1 and 5")
+    if max_price is not None and (not isinstance(max_price, int) or max_price <= 0):
+        raise WishlistError("max_price must be a positive integer")
+    if WishlistAlert.objects.filter(user=user).count() >= MAX_ALERTS_PER_USER:
+        raise WishlistError(f"At most {MAX_ALERTS_PER_USER} alerts per user")
+
+    return WishlistAlert.objects.create(
+        user=user,
+        pokeapi_id=pokeapi_id,
+        pokemon_type=pokemon_type,
+        min_rarity=min_rarity,
+        max_price=max_price,
+        match_key=alert_match_key(pokeapi_id, pokemon_type, min_rarity),
+    )
+
+
+def _matches(alert, pokemon, price) -> bool:
+    return (
+        alert.user_id != pokemon.user_id
+        and alert.pokeapi_id in (None, pokemon.pokeapi_id)
+        and alert.pokemon_type in (None, *pokemon.types)
+        and (alert.min_rarity is None or alert.min_rarity <= pokemon.rarity)
+        and (
+            alert.max_price is None or (price is not None and price <= alert.max_price)
+        )
+    )
+
+
+def notify_wishlists(listings) -> int:
+    """
+    Emits a notification for each new listing (MoneyTrade or BarterTrade,
+    with its Pokemon loaded) to every user with a matching alert, once per
+    user however many of their alerts match. Barter listings have no price,
+    so they only match alerts without a max_price. Returns the number of
+    notifications created.
+    """
+    listings = [listing for listing in listings if listing.status == "active"]
+    if not listings:
+        return 0
+
+    prices = {
+        listing.pokemon_id: listing.amount_asked
+        if isinstance(listing, MoneyTrade)
+        else None
+        for listing in listings
+    }
+    keys = set()
+    for listing in listings:
+        keys.update(listing_match_keys(listing.pokemon))
+    # Alerts priced below every listing can never match
+    cheapest = min(
+        (price for price in prices.values() if price is not None), default=None
+    )
+    price_q = Q(max_price__isnull=True)
+    if cheapest is not None:
+        price_q |= Q(max_price__gte=cheapest)
+    alerts = WishlistAlert.objects.filter(price_q, match_key__in=keys).only(
+        "user_id", "pokeapi_id", "pokemon_type", "min_rarity", "max_price"
+    )
+
+    notifications = {}
+    for alert in alerts.iterator(chunk_size=2000):
+        for listing in listings:
+            if (alert.user_id, listing.pokemon_id) in notifications:
+                continue
+            price = prices[listing.pokemon_id]
+            if _matches(alert, listing.pokemon, price):
+                notifications[alert.user_id, listing.pokemon_id] = Notification(
+                    user_id=alert.user_id,
+                    message=(
+                        f"{listing.pokemon.name} from your wishlist was just listed "
+                        + (f"for ${price}." if price is not None else "for barter.")
+                    ),
+                    link=f"/pokemon/{listing.pokemon_id}",
+                )
+    Notification.objects.bulk_create(notifications.values(), batch_size=1000)
+    return len(notifications)
@@ -52,6 +52,17 @@ interface CreateBarterTradeParams {
 // Define specific response types if not fully covered or need refinement
 interface AdminReportsResponse {
   reports: Report[]
+  // Trades flagged by the fraud detector, newest first
+  flagged_trades: {
+    id: number
+    trade_type: 'money' | 'barter'
+    pokemon_name: string
+    amount: number
+    buyer: string
+    seller: string
+    timestamp: string
+    flag_reason: string
+  }[]
   total_pages: number
   current_page: number
 }
@@ -175,6 +186,13 @@ interface UserProfileResponse {
     money_trade: { id: number; amount_asked: number } | null
     barter_trade: { id: number; trade_preferences: string } | null
   })[]
+  // One sprite sheet per page of species; tiles map pokeapi_id to
+  // [sheet index, x, y]
+  sprite_atlas: {
+    tile_size: number
+    sheets: string[]
+    tiles: Record<string, [number, number, number]>
+  }
   open_trades: {
     money_trades: { id: number; amount_asked: number; pokemon__name: string }[]
     barter_trades: {
@@ -18,6 +18,7 @@ export interface Pokemon {
   name: string
   rarity: number
   image_url?: string
+  thumbnail_url?: string
   types: string[]
   offered_in_trade?: BarterTrade
 }
@@ -127,6 +128,7 @@ export interface FeaturedPokemon {
   name: string
   rarity: number
   image_url: string
+  thumbnail_url: string
   types: string[]
   owner: {
     id: number
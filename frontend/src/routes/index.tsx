@@ -230,7 +230,7 @@ function HomePage() {
                 >
                   <div className="bg-gray-100 p-6 flex justify-center">
                     <img
-                      src={pokemon.image_url}
+                      src={pokemon.thumbnail_url ?? pokemon.image_url}
                       alt={pokemon.name}
                       className="h-48 object-contain hover:scale-110 transition-transform duration-300"
                     />
@@ -82,7 +82,7 @@ export default function SearchMarketplace() {
                   <div className="md:w-1/3 bg-gray-100 flex items-center justify-center p-4">
                     {t.image_url ? (
                       <img
-                        src={t.image_url}
+                        src={t.thumbnail_url ?? t.image_url}
                         alt={t.name}
                         className="w-full max-w-[120px] h-auto object-contain"
                       />
@@ -9,6 +9,20 @@ export const Route = createFileRoute('/user/$username')({
   },
 })
 
+// Draws one tile of the profile's sprite sheet, so the whole collection
+// loads as a single image
+function atlasTileStyle(
+  atlas: { tile_size: number; sheets: string[] },
+  [sheet, x, y]: [number, number, number],
+) {
+  return {
+    width: atlas.tile_size,
+    height: atlas.tile_size,
+    backgroundImage: `url(${atlas.sheets[sheet]})`,
+    backgroundPosition: `-${x}px -${y}px`,
+  }
+}
+
 function RouteComponent() {
   const data = Route.useLoaderData()
 
@@ -39,11 +53,23 @@ function RouteComponent() {
               key={pokemon.id}
               className="border rounded-lg p-4 shadow-sm"
             >
-              <img
-                src={pokemon.image_url}
-                alt={pokemon.name}
-                className="h-48 w-48 mx-auto mb-2"
-              />
+              {data.sprite_atlas.tiles[pokemon.pokeapi_id] ? (
+                <div
+                  role="img"
+                  aria-label={pokemon.name}
+                  className="h-48 w-48 mx-auto mb-2"
+                  style={atlasTileStyle(
+                    data.sprite_atlas,
+                    data.sprite_atlas.tiles[pokemon.pokeapi_id],
+                  )}
+                />
+              ) : (
+                <img
+                  src={pokemon.thumbnail_url ?? pokemon.image_url}
+                  alt={pokemon.name}
+                  className="h-48 w-48 mx-auto mb-2"
+                />
+              )}
               <h3 className="font-medium text-lg">{pokemon.name}</h3>
               <p className="text-sm text-gray-500">ID: {pokemon.pokeapi_id}</p>
 
@@ -15,6 +15,8 @@ from pathlib import Path
 
 import environ
 
+from .db import DATABASE_PROFILES
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,14 +53,49 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "api.middleware.RequestMetricsMiddleware",
+    "api.middleware.RequestTraceMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.middleware.ShardMiddleware",
+    "api.middleware.RateLimitMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request SQL/external-call timing (Server-Timing headers, api.metrics log)
+REQUEST_METRICS_ENABLED = env.bool("REQUEST_METRICS_ENABLED", default=False)
+
+# Sanitized request traces for replay_trace (api.trace log, rotating NDJSON)
+REQUEST_TRACE_ENABLED = env.bool("REQUEST_TRACE_ENABLED", default=False)
+REQUEST_TRACE_SAMPLE_RATE = env.float("REQUEST_TRACE_SAMPLE_RATE", default=1.0)
+REQUEST_TRACE_PATH = env("REQUEST_TRACE_PATH", default=str(BASE_DIR / "trace.ndjson"))
+
+# Token buckets per URL name: (requests, seconds, "user" or "ip"). "user"
+# buckets fall back to the client IP for anonymous requests. Buckets are rows
+# in the default database, shared by every worker.
+RATE_LIMITS = (
+    {
+        "signup": (5, 3600, "ip"),
+        "password_reset": (5, 3600, "ip"),
+        "chatbot_chat": (20, 60, "user"),
+        "filter_marketplace": (120, 60, "user"),
+    }
+    if env.bool("RATE_LIMITING_ENABLED", default=True)
+    else {}
+)
+# Header a trusted reverse proxy sets to the client's address (for example
+# X-Forwarded-For or X-Real-IP), for "ip" rate limits; unset uses REMOTE_ADDR
+RATE_LIMIT_CLIENT_IP_HEADER = env("RATE_LIMIT_CLIENT_IP_HEADER", default=None)
+
+# Days before a pending trade request or an active listing expires (see
+# api/expiry.py and the expire_stale command); 0 never expires them
+TRADE_REQUEST_EXPIRY_DAYS = env.int("TRADE_REQUEST_EXPIRY_DAYS", default=7)
+LISTING_EXPIRY_DAYS = env.int("LISTING_EXPIRY_DAYS", default=30)
+
 ROOT_URLCONF = "pokemon.urls"
 
 TEMPLATES = [
@@ -82,13 +119,45 @@ WSGI_APPLICATION = "pokemon.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# "production" (WAL, tuned pragmas, persistent connections) or "default"
+DATABASE_PROFILE = env("DATABASE_PROFILE", default="default")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": env("DATABASE_PATH", default=str(BASE_DIR / "db.sqlite3")),
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
 
+# Read-only copies of the default database (kept current by sync_replicas).
+# Safe-method requests read from them through api.routers.ReadReplicaRouter.
+DATABASE_READ_REPLICAS = []
+for i, path in enumerate(env.list("DATABASE_REPLICAS", default=[])):
+    DATABASES[f"replica{i}"] = {
+        **DATABASES["default"],
+        "NAME": path,
+        "PRAGMAS": {**DATABASES["default"]["PRAGMAS"], "query_only": "ON"},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_READ_REPLICAS.append(f"replica{i}")
+
+# Shards for user-owned rows, placed by user id hash (see api/sharding.py).
+# Set up with init_shards. Rows on different shards reference each other by
+# id only, so SQLite foreign key enforcement is off there.
+DATABASE_SHARD_ALIASES = []
+for i, path in enumerate(env.list("DATABASE_SHARDS", default=[])):
+    DATABASES[f"shard{i}"] = {
+        **DATABASES["default"],
+        "NAME": path,
+        "PRAGMAS": {**DATABASES["default"]["PRAGMAS"], "foreign_keys": "OFF"},
+    }
+    DATABASE_SHARD_ALIASES.append(f"shard{i}")
+
+DATABASE_ROUTERS = ["api.routers.ShardRouter", "api.routers.ReadReplicaRouter"]
+# How long a browser reads from the primary after it writes
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=30)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -109,6 +178,15 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Per-process by default; set CACHE_URL (e.g. redis://...) to share cache
+# invalidations between workers
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+
+# Sessions and the logged-in user are read from the cache on each request,
+# falling back to the database on a miss
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+AUTHENTICATION_BACKENDS = ["api.backends.CachedModelBackend"]
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -126,6 +204,9 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Rendered sprite thumbnails and their downloaded sources (api/thumbnails.py)
+THUMBNAIL_ROOT = env("THUMBNAIL_ROOT", default=str(BASE_DIR / "thumbnails"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,3 +225,23 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = "2340movies1234@gmail.com"
 EMAIL_HOST_PASSWORD = env("GMAIL_PASSWORD")
 EMAIL_USE_TLS = True
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "trace_file": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": REQUEST_TRACE_PATH,
+            "maxBytes": env.int("REQUEST_TRACE_MAX_BYTES", default=50 * 1024 * 1024),
+            "backupCount": env.int("REQUEST_TRACE_BACKUP_COUNT", default=5),
+            # The file is only created once the first trace is written
+            "delay": True,
+        },
+    },
+    "loggers": {
+        "api.metrics": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "api.trace": {"handlers": ["trace_file"], "level": "INFO", "propagate": False},
+    },
+}